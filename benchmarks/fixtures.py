@@ -0,0 +1,128 @@
+"""Build reproducible repositories for the benchmarks to chew on.
+
+Every fixture is made with the same names, contents and commit dates, so
+two runs of the benchmarks measure the same repositories.  Building a fleet
+copies one repository rather than running git for every member of it.
+"""
+import os
+import shutil
+import subprocess
+
+__author__ = 'wolf'
+
+GIT_ENVIRONMENT = {
+    "GIT_AUTHOR_NAME": "Bench Mark",
+    "GIT_AUTHOR_EMAIL": "bench@example.com",
+    "GIT_AUTHOR_DATE": "2015-09-22T12:00:00Z",
+    "GIT_COMMITTER_NAME": "Bench Mark",
+    "GIT_COMMITTER_EMAIL": "bench@example.com",
+    "GIT_COMMITTER_DATE": "2015-09-22T12:00:00Z",
+    "GIT_CONFIG_NOSYSTEM": "1",
+}
+
+
+def git(cwd, *args, **kwargs):
+    environment = dict(os.environ)
+    environment.update(GIT_ENVIRONMENT)
+    return subprocess.check_output(('git', '-c', 'init.defaultBranch=master') + args,
+                                   cwd=cwd,
+                                   env=environment,
+                                   stderr=subprocess.STDOUT,
+                                   **kwargs)
+
+
+def write(path, contents):
+    with open(path, "w") as f:
+        f.write(contents)
+
+
+def make_repository(path, remote=True):
+    """A small project with a README, a LICENSE and one commit, pushed to a bare remote next to it."""
+    os.makedirs(path)
+    git(path, "init", "-q")
+    write(os.path.join(path, "README.rst"), "Saluton, Mundo!\n")
+    write(os.path.join(path, "LICENSE.txt"), "insert MIT license text here\n")
+    git(path, "add", "README.rst", "LICENSE.txt")
+    git(path, "commit", "-q", "-m", "Initial commit.")
+    if remote:
+        remote_path = path + ".remote.git"
+        git(os.path.dirname(path), "init", "-q", "--bare", remote_path)
+        git(path, "remote", "add", "origin", remote_path)
+        git(path, "push", "-q", "origin", "master")
+    return path
+
+
+def add_branches(path, count, pushed=True):
+    """Make count branches, as packed refs, all pointing at HEAD."""
+    head = git(path, "rev-parse", "HEAD").strip().decode("ascii")
+    commands = "".join("create refs/heads/branch-{0:05d} {1}\n".format(n, head) for n in range(count))
+    if pushed:
+        commands += "".join("create refs/remotes/origin/branch-{0:05d} {1}\n".format(n, head)
+                            for n in range(count))
+    git(path, "update-ref", "--stdin", input=commands.encode("ascii"))
+    git(path, "pack-refs", "--all")
+    return path
+
+
+def add_untracked_files(path, count, per_directory=1000):
+    """Litter the working tree with count untracked files, per_directory to a directory."""
+    for n in range(count):
+        directory = os.path.join(path, "build", "{0:04d}".format(n // per_directory))
+        if n % per_directory == 0:
+            os.makedirs(directory)
+        write(os.path.join(directory, "artifact-{0:06d}.o".format(n)), "not source\n")
+    return path
+
+
+def add_tracked_files(path, count, per_directory=1000):
+    """Commit count files, per_directory to a directory, and push them."""
+    for n in range(count):
+        directory = os.path.join(path, "src", "{0:04d}".format(n // per_directory))
+        if n % per_directory == 0:
+            os.makedirs(directory)
+        write(os.path.join(directory, "module-{0:06d}.c".format(n)), "int x{0};\n".format(n))
+    git(path, "add", "src")
+    git(path, "commit", "-q", "-m", "Add {0} files.".format(count))
+    if os.path.isdir(path + ".remote.git"):
+        git(path, "push", "-q", "origin", "master")
+    return path
+
+
+def add_stashes(path, count):
+    """Push count entries onto the stash."""
+    readme = os.path.join(path, "README.rst")
+    for n in range(count):
+        with open(readme, "a") as f:
+            f.write("stash {0}\n".format(n))
+        sha = git(path, "stash", "create", "stash {0}".format(n)).strip().decode("ascii")
+        git(path, "stash", "store", "-m", "stash {0}".format(n), sha)
+        git(path, "checkout", "-q", "--", "README.rst")
+    return path
+
+
+def fall_behind(path, count):
+    """Push count more commits, then move master back to where it was, so it's behind its remote."""
+    head = git(path, "rev-parse", "HEAD").strip().decode("ascii")
+    for n in range(count):
+        git(path, "commit", "-q", "--allow-empty", "-m", "Upstream {0}.".format(n))
+    git(path, "push", "-q", "origin", "master")
+    git(path, "reset", "-q", "--hard", head)
+    return path
+
+
+def write_commit_graph(path):
+    git(path, "commit-graph", "write", "--reachable")
+    return path
+
+
+def make_fleet(path, count, template=None):
+    """Make count copies of template (a fresh make_repository() if None) under path."""
+    os.makedirs(path)
+    if template is None:
+        template = make_repository(os.path.join(path, "template"))
+    members = []
+    for n in range(count):
+        member = os.path.join(path, "repositories", "{0:05d}".format(n))
+        shutil.copytree(template, member, symlinks=True)
+        members.append(member)
+    return members
@@ -0,0 +1,81 @@
+"""Measure how much memory it takes to keep a report for every project in a big run.
+
+Run it from the top of the source tree::
+
+    python -m benchmarks.memory
+    python -m benchmarks.memory --projects 100000 --show-changes 3
+
+--diff, the cache and anything summarizing a run hold a report per project.
+This builds the reports the built-in checks make for a mix of projects
+(clean ones, ones with uncommitted changes, ones with no remotes), keeps
+them all, and reports what tracemalloc says they take, both as Reports and
+as the dicts of (passed, message) tuples they replaced.
+"""
+import argparse
+import gc
+import sys
+import tracemalloc
+from check_project.gitproject import nonempty_file_result, remotes_result, stash_result, \
+    uncommitted_changes_result, unpushed_commits_result
+from check_project.report import Report
+
+__author__ = 'wolf'
+
+
+def make_report(n, show_changes):
+    """Return the report the built-in checks would make for the n'th project."""
+    remotes = [b"origin"] if n % 5 else []
+    changes = ["src/module_{0}/file_{1}.py".format(n, i).encode("utf-8") for i in range(n % 4)]
+    report = Report()
+    report["has a readme"] = nonempty_file_result("README", "README.md" if n % 3 else "README")
+    report["has a license"] = nonempty_file_result("LICENSE", "LICENSE" if n % 7 else None)
+    report["has remotes"] = remotes_result(remotes)
+    report["has no stash"] = stash_result(n % 11 == 0)
+    report["has no uncommitted changes"] = uncommitted_changes_result(changes, show_changes)
+    report["has no unpushed commits"] = unpushed_commits_result(remotes, [b"abc"] if n % 13 == 0 else [])
+    return report
+
+
+def as_dict(report):
+    # What a report was before Report: every message formatted up front.
+    return dict((category, (result.passed, result.message)) for category, result in report.items())
+
+
+def measure(build, projects):
+    """Return the bytes allocated to keep build(n) for n in range(projects)."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = [build(n) for n in range(projects)]
+        gc.collect()
+        used = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del kept
+    return used
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Measure the memory taken by reports.")
+    parser.add_argument("--projects", type=int, default=100000,
+                        help="How many projects' reports to keep.  Defaults to 100000.")
+    parser.add_argument("--show-changes", type=int, default=0, metavar="N",
+                        help="Name up to N uncommitted changes in the messages, like --show-changes.")
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    options = parse_args(args)
+    results = [("Report", measure(lambda n: make_report(n, options.show_changes), options.projects)),
+               ("dict of tuples", measure(lambda n: as_dict(make_report(n, options.show_changes)),
+                                          options.projects))]
+    print("{0:<16} {1:>14} {2:>14}".format("reports", "MB", "bytes/project"))
+    for name, used in results:
+        print("{0:<16} {1:>14.1f} {2:>14.0f}".format(name, used / 1e6, float(used) / options.projects))
+
+
+if __name__ == "__main__":
+    main()
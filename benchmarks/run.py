@@ -0,0 +1,331 @@
+"""Time check_project against synthetic repositories.
+
+Run it from the top of the source tree::
+
+    python -m benchmarks.run
+    python -m benchmarks.run --scenario fleet --fleet 10 100 1000 10000 --json results.json
+
+For every scenario this reports how many times git was started per run,
+the median and 99th percentile time of each operation, and the peak
+memory use of the benchmark and of the git processes it started.
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from benchmarks import fixtures
+import check_project.cli
+from check_project.cli import start_process
+from check_project.gitproject import GitProject, status_arguments
+
+__author__ = 'wolf'
+
+
+class ForkCounter(object):
+    """Count every process started while it's installed, by wrapping subprocess.Popen."""
+
+    def __init__(self):
+        self.count = 0
+        self.lock = threading.Lock()
+        self.original_popen = subprocess.Popen
+
+    def __enter__(self):
+        counter = self
+
+        class CountingPopen(self.original_popen):
+            def __init__(self, *args, **kwargs):
+                with counter.lock:
+                    counter.count += 1
+                super(CountingPopen, self).__init__(*args, **kwargs)
+
+        subprocess.Popen = CountingPopen
+        return self
+
+    def __exit__(self, *exc_info):
+        subprocess.Popen = self.original_popen
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(scenario, operation, samples, forks, runs):
+    return {"scenario": scenario,
+            "operation": operation,
+            "runs": runs,
+            "forks_per_run": float(forks) / runs if runs else 0.0,
+            "p50_ms": percentile(samples, 0.50) * 1000,
+            "p99_ms": percentile(samples, 0.99) * 1000,
+            "wall_s": sum(samples)}
+
+
+def measure(scenario, operation, function, repeat):
+    samples = []
+    with ForkCounter() as forks:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            samples.append(time.perf_counter() - start)
+    return summarize(scenario, operation, samples, forks.count, repeat)
+
+
+def project_operations(path):
+    """The operations timed for every single-repository scenario, as (name, function) pairs."""
+    project = GitProject(path)
+    return [
+        ("GitProject()", lambda: GitProject(path)),
+        ("check_remotes", project.check_remotes),
+        ("check_for_nonempty_file", lambda: project.check_for_nonempty_file("README")),
+        ("check_git_stash", project.check_git_stash),
+        ("check_uncommitted_changes", project.check_uncommitted_changes),
+        ("check_unpushed_commits", project.check_unpushed_commits),
+        ("start_process", lambda: start_process(["-d", path, "--quiet", "--no-cache"])),
+    ]
+
+
+def clean(workdir, options):
+    return fixtures.make_repository(os.path.join(workdir, "clean"))
+
+
+def many_branches(workdir, options):
+    path = fixtures.make_repository(os.path.join(workdir, "many_branches"))
+    return fixtures.add_branches(path, options.branches)
+
+
+def unpushed_branches(workdir, options):
+    path = fixtures.make_repository(os.path.join(workdir, "unpushed_branches"))
+    fixtures.write(os.path.join(path, "unpushed.txt"), "Not pushed yet.\n")
+    fixtures.git(path, "add", "unpushed.txt")
+    fixtures.git(path, "commit", "-q", "-m", "Not pushed.")
+    return fixtures.add_branches(path, options.branches, pushed=False)
+
+
+def dirty(workdir, options):
+    path = fixtures.make_repository(os.path.join(workdir, "dirty"))
+    return fixtures.add_untracked_files(path, options.files)
+
+
+def big_tree(workdir, options):
+    path = fixtures.make_repository(os.path.join(workdir, "big_tree"))
+    return fixtures.add_tracked_files(path, options.files)
+
+
+def stashes(workdir, options):
+    path = fixtures.make_repository(os.path.join(workdir, "stashes"))
+    return fixtures.add_stashes(path, options.stashes)
+
+
+def behind(workdir, options):
+    path = fixtures.make_repository(os.path.join(workdir, "behind"))
+    return fixtures.fall_behind(path, options.commits)
+
+
+def behind_with_commit_graph(workdir, options):
+    path = fixtures.make_repository(os.path.join(workdir, "behind_with_commit_graph"))
+    return fixtures.write_commit_graph(fixtures.fall_behind(path, options.commits))
+
+
+REPOSITORY_SCENARIOS = {
+    "clean": clean,
+    "many-branches": many_branches,
+    "unpushed-branches": unpushed_branches,
+    "dirty": dirty,
+    "big-tree": big_tree,
+    "stashes": stashes,
+    "behind": behind,
+    "behind-commit-graph": behind_with_commit_graph,
+}
+
+
+def run_repository_scenario(name, workdir, options):
+    path = REPOSITORY_SCENARIOS[name](workdir, options)
+    return [measure(name, operation, function, options.repeat)
+            for operation, function in project_operations(path)]
+
+
+# How check_uncommitted_changes can ask git status, for the status-modes scenario.
+STATUS_MODES = [
+    ("git status", {}),
+    ("git status -uno", {"untracked": "no"}),
+    ("--fast-status", {"fast": True}),
+    ("--fast-status -uno", {"untracked": "no", "fast": True}),
+]
+
+
+def run_status_modes(workdir, options):
+    """Time the uncommitted changes check in a big, clean working tree with an ignored build directory."""
+    path = fixtures.make_repository(os.path.join(workdir, "status_modes"))
+    fixtures.add_untracked_files(fixtures.add_tracked_files(path, options.files), options.files)
+    fixtures.write(os.path.join(path, ".gitignore"), "build/\n")
+    fixtures.git(path, "add", ".gitignore")
+    fixtures.git(path, "commit", "-q", "-m", "Ignore the build.")
+
+    results = []
+    for name, mode in STATUS_MODES:
+        project = GitProject(path)
+        status = status_arguments(**mode)
+
+        def check():
+            project.take_snapshot(status)
+            project.check_uncommitted_changes()
+        check()  # the first run with --fast-status writes the caches the others use
+        results.append(measure("status-modes", name, check, options.repeat))
+    return results
+
+
+def run_fleet(workdir, options):
+    results = []
+    template = fixtures.make_repository(os.path.join(workdir, "fleet_template"))
+    for size in options.fleet:
+        root = os.path.join(workdir, "fleet_{0}".format(size))
+        fixtures.make_fleet(root, size, template)
+
+        latencies = []
+        lock = threading.Lock()
+        check_directory = check_project.cli.check_directory
+
+        def timed_check_directory(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return check_directory(*args, **kwargs)
+            finally:
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+
+        args = ["--root", os.path.join(root, "repositories"), "--quiet", "--no-cache"]
+        if options.jobs:
+            args += ["--jobs", str(options.jobs)]
+        if options.engine:
+            args += ["--engine", options.engine]
+        check_project.cli.check_directory = timed_check_directory
+        try:
+            with ForkCounter() as forks:
+                start = time.perf_counter()
+                start_process(args)
+                wall = time.perf_counter() - start
+        finally:
+            check_project.cli.check_directory = check_directory
+
+        # With --engine processes, the checks are timed in the workers, out of our sight.
+        if latencies:
+            results.append(summarize("fleet-{0}".format(size), "per repository", latencies, forks.count, size))
+        results.append(dict(summarize("fleet-{0}".format(size), "start_process", [wall], forks.count, 1),
+                            forks_per_run=float(forks.count) / size))
+    return results
+
+
+def run_skewed_fleet(workdir, options):
+    """Time a fleet with one big, dirty repository in it, found last, with and without --schedule."""
+    root = os.path.join(workdir, "skewed_fleet")
+    fixtures.make_fleet(root, options.fleet[0], fixtures.make_repository(os.path.join(workdir, "skewed_template")))
+    big = fixtures.make_repository(os.path.join(root, "repositories", "zzzzz"))
+    fixtures.add_untracked_files(fixtures.add_tracked_files(big, options.files), options.files)
+    durations_file = os.path.join(workdir, "durations.sqlite")
+
+    results = []
+    args = ["--root", os.path.join(root, "repositories"), "--quiet", "--no-cache"]
+    if options.jobs:
+        args += ["--jobs", str(options.jobs)]
+    for name, extra in (("in the order found", []),
+                        ("--schedule", ["--schedule", "--durations-file", durations_file])):
+        start_process(args + extra)  # so --schedule knows what's slow
+        samples = []
+        with ForkCounter() as forks:
+            for _ in range(options.repeat):
+                start = time.perf_counter()
+                start_process(args + extra)
+                samples.append(time.perf_counter() - start)
+        results.append(summarize("skewed-fleet", name, samples, forks.count, options.repeat))
+    return results
+
+
+def peak_rss_kb():
+    # ru_maxrss is in kilobytes on Linux, but bytes on OS X.  Only our own:
+    # RUSAGE_CHILDREN's is the biggest child ever waited for, which is as
+    # likely to be the python the fixtures ran as any git.
+    scale = 1024 if sys.platform == "darwin" else 1
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // scale
+
+
+def format_table(results):
+    lines = ["{0:<22} {1:<26} {2:>6} {3:>10} {4:>10} {5:>10} {6:>10}".format(
+        "scenario", "operation", "runs", "forks/run", "p50 ms", "p99 ms", "wall s")]
+    for result in results:
+        lines.append("{scenario:<22} {operation:<26} {runs:>6} {forks_per_run:>10.1f} "
+                     "{p50_ms:>10.2f} {p99_ms:>10.2f} {wall_s:>10.3f}".format(**result))
+    return lines
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Time check_project against synthetic repositories.")
+    parser.add_argument("--scenario",
+                        action="append",
+                        choices=sorted(REPOSITORY_SCENARIOS) + ["fleet", "skewed-fleet", "status-modes"],
+                        help="Which scenarios to run.  May be given more than once.  Defaults to all of them.")
+    parser.add_argument("--repeat", type=int, default=20,
+                        help="How many times to time each operation.")
+    parser.add_argument("--branches", type=int, default=5000,
+                        help="How many branches the branch scenarios make.")
+    parser.add_argument("--files", type=int, default=20000,
+                        help="How many files the dirty, big-tree and status-modes scenarios make.")
+    parser.add_argument("--stashes", type=int, default=200,
+                        help="How many entries the stashes scenario pushes onto the stash.")
+    parser.add_argument("--commits", type=int, default=1000,
+                        help="How many commits the behind scenarios are behind their remote by.")
+    parser.add_argument("--fleet", type=int, nargs="+", default=[10, 100, 1000],
+                        help="The fleet sizes to check.  The skewed-fleet scenario uses the first.")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="Passed to check_project --jobs for the fleet scenarios.")
+    parser.add_argument("--engine", choices=["threads", "asyncio", "processes"], default=None,
+                        help="Passed to check_project --engine for the fleet scenarios.")
+    parser.add_argument("--workdir",
+                        help="Where to build the fixtures.  Defaults to a temporary directory that's "
+                             "removed afterwards.")
+    parser.add_argument("--json", dest="json_file",
+                        help="Also write the results to this file as JSON.")
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    options = parse_args(args)
+    scenarios = options.scenario or sorted(REPOSITORY_SCENARIOS) + ["fleet", "skewed-fleet", "status-modes"]
+
+    workdir = options.workdir or tempfile.mkdtemp(prefix="check_project_benchmark_")
+    try:
+        results = []
+        for name in scenarios:
+            if name == "fleet":
+                results.extend(run_fleet(workdir, options))
+            elif name == "skewed-fleet":
+                results.extend(run_skewed_fleet(workdir, options))
+            elif name == "status-modes":
+                results.extend(run_status_modes(workdir, options))
+            else:
+                results.extend(run_repository_scenario(name, workdir, options))
+    finally:
+        if not options.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    for line in format_table(results):
+        print(line)
+    rss = peak_rss_kb()
+    print("peak RSS: {0} kB".format(rss))
+
+    if options.json_file:
+        with open(options.json_file, "w") as f:
+            json.dump({"results": results, "peak_rss_kb": rss}, f, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Time how long check_project takes to start.
+
+Run it from the top of the source tree::
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --repeat 50 --budget-ms 60 --json startup.json
+
+This reports how long `import check_project.cli` takes according to
+`python -X importtime` (the median of several runs), how long `python -m
+check_project --help` and a check of one small repository take from start
+to finish, next to an empty interpreter for comparison, and the slowest
+modules the import pulls in.  With --budget-ms, it exits with status 1 if
+the import takes longer than that, so it can guard against regressions.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks import fixtures
+
+__author__ = 'wolf'
+
+SOURCE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def environment():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = SOURCE + os.pathsep + env.get("PYTHONPATH", "")
+    env.pop("PYTHONPROFILEIMPORTTIME", None)
+    return env
+
+
+def import_times(module="check_project.cli"):
+    """Return {module: (self microseconds, cumulative microseconds)} for everything importing module imports."""
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                            stderr=subprocess.PIPE, env=environment(), check=True).stderr.decode("utf-8")
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def wall_time(args):
+    start = time.perf_counter()
+    subprocess.run([sys.executable] + args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                   env=environment(), cwd=SOURCE)
+    return time.perf_counter() - start
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Time how long check_project takes to start.")
+    parser.add_argument("--repeat", type=int, default=20,
+                        help="How many times to time each thing.")
+    parser.add_argument("--slowest", type=int, default=10,
+                        help="How many of the slowest modules to show.")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="Exit with status 1 if importing check_project.cli takes longer than this.")
+    parser.add_argument("--json", dest="json_file",
+                        help="Also write the results to this file as JSON.")
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    options = parse_args(args)
+
+    imports = [import_times() for _ in range(options.repeat)]
+    import_ms = statistics.median(times["check_project.cli"][1] for times in imports) / 1000.0
+
+    workdir = tempfile.mkdtemp(prefix="check_project_startup_")
+    try:
+        repository = fixtures.make_repository(os.path.join(workdir, "repository"))
+        commands = [
+            ("python -c pass", ["-c", "pass"]),
+            ("check_project --help", ["-m", "check_project", "--help"]),
+            ("check_project -d repository", ["-m", "check_project", "-d", repository, "--no-cache"]),
+        ]
+        wall_ms = dict((name, statistics.median(wall_time(command) for _ in range(options.repeat)) * 1000)
+                       for name, command in commands)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print("import check_project.cli: {0:.1f} ms (median of {1})".format(import_ms, options.repeat))
+    for name, command in commands:
+        print("{0:<30} {1:>8.1f} ms".format(name, wall_ms[name]))
+    print("")
+    print("slowest modules imported, cumulative:")
+    slowest = sorted(imports[-1].items(), key=lambda item: item[1][1], reverse=True)[:options.slowest]
+    for name, (own, cumulative) in slowest:
+        print("{0:>10.1f} ms  {1}".format(cumulative / 1000.0, name))
+
+    if options.json_file:
+        with open(options.json_file, "w") as f:
+            json.dump({"import_ms": import_ms, "wall_ms": wall_ms,
+                       "modules": sorted(imports[-1])}, f, indent=2, sort_keys=True)
+
+    if options.budget_ms is not None and import_ms > options.budget_ms:
+        print("import check_project.cli took {0:.1f} ms, over the budget of {1:.1f} ms.".format(
+            import_ms, options.budget_ms))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""Check projects with asyncio subprocesses instead of threads.
+
+All the git commands one project needs are started at once, and a
+semaphore shared by every project caps how many git processes are running
+at any moment, so hundreds of them can be in flight from a single thread.
+"""
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import os
+import queue
+import subprocess
+import threading
+from check_project.cache import cached
+from check_project.checks import enabled_checks
+from check_project.files import find_nonempty_files, scan_directory
+from check_project.instrument import instrumented, instrumented_async, timed
+from check_project.report import CheckId, CheckResult, Report
+from check_project.snapshot import parse_porcelain_v2
+from check_project.gitproject import GitCommandError, GitProjectException, \
+    parse_layout, REV_PARSE_LAYOUT, status_arguments, \
+    nonempty_file_result, \
+    stash_result, \
+    uncommitted_changes_result, \
+    remotes_result, \
+    unpushed_commits_result
+
+__author__ = 'wolf'
+
+
+def default_git_processes():
+    return 4 * (os.cpu_count() or 1)
+
+
+class AsyncGitProject(object):
+    """Like GitProject, but the methods that run git are coroutines.
+
+    The remotes are only asked for once per AsyncGitProject, since both
+    check_remotes and check_unpushed_commits need them.  validate() has to
+    be awaited before anything else.
+    """
+
+    def __init__(self, path, semaphore=None):
+        self.path = os.path.abspath(os.path.expanduser(path))
+
+        if not os.path.isdir(self.path):
+            raise GitProjectException("Path {0} doesn't exist.".format(self.path))
+
+        self.semaphore = semaphore or asyncio.Semaphore(default_git_processes())
+        self.repository = None
+        self._remotes = None
+
+    async def validate(self):
+        """Make sure path is in a git repository, and set repository, like GitProject.validate."""
+        try:
+            output = await self.git(*REV_PARSE_LAYOUT)
+        except GitCommandError as e:
+            if "not a git repository" in (e.stderr or b"").decode('utf-8', 'replace').lower():
+                raise GitProjectException("Path {0} is not a git repository.".format(self.path))
+            raise
+        self.repository = parse_layout(output, self.path)
+
+    def __str__(self):
+        return "<AsyncProject '{0}'>".format(self.path)
+
+    async def git(self, *args):
+        async with self.semaphore:
+            with timed("git", ('git',) + args, self.path) as event:
+                process = await asyncio.create_subprocess_exec('git', *args,
+                                                               stdout=subprocess.PIPE,
+                                                               stderr=subprocess.PIPE,
+                                                               cwd=self.path)
+                try:
+                    output, errors = await process.communicate()
+                except asyncio.CancelledError:
+                    process.kill()
+                    await process.wait()
+                    raise
+                if process.returncode:
+                    raise GitCommandError(process.returncode, ('git',) + args, output=output, stderr=errors)
+                event.output_bytes = len(output)
+                event.exit_status = 0
+        return output
+
+    def has_file_starting_with(self, prefix):
+        names = find_nonempty_files(scan_directory(self.path), [prefix])[prefix]
+        return names[0] if names else False
+
+    async def has_git_stash(self):
+        # Not `git stash list`, which needs a work tree.
+        return bool(await self.git('for-each-ref', 'refs/stash'))
+
+    async def get_uncommitted_changes(self):
+        if self.repository is not None and self.repository.bare:
+            return []  # there's no working tree to have changes in
+        return parse_porcelain_v2(await self.git(*status_arguments()))
+
+    async def get_commits_not_pushed_to_existing_remotes(self):
+        output = await self.git('log', '--branches', '--not', '--remotes',
+                                '--simplify-by-decoration', '--decorate', '--oneline')
+        return output.splitlines()
+
+    async def get_remotes(self):
+        if self._remotes is None:
+            self._remotes = asyncio.ensure_future(self.git('remote'))
+        return (await self._remotes).splitlines()
+
+    @instrumented("check")
+    def check_for_nonempty_file(self, name):
+        return nonempty_file_result(name, self.has_file_starting_with(name))
+
+    @instrumented_async("check")
+    async def check_git_stash(self):
+        return stash_result(await self.has_git_stash())
+
+    @instrumented_async("check")
+    async def check_uncommitted_changes(self, sample=0):
+        return uncommitted_changes_result(await self.get_uncommitted_changes(), sample)
+
+    @instrumented_async("check")
+    async def check_remotes(self):
+        return remotes_result(await self.get_remotes())
+
+    @instrumented_async("check")
+    async def check_unpushed_commits(self):
+        unpushed_commits, remotes = await asyncio.gather(self.get_commits_not_pushed_to_existing_remotes(),
+                                                         self.get_remotes())
+        return unpushed_commits_result(remotes, unpushed_commits)
+
+
+@instrumented_async("project")
+async def check_project_async(project, skip_checks, ignore_unpushed_if_no_remotes, fail_fast=False,
+                              show_changes=0, only=None):
+    """Build the same report as cli.check_project, running the project's git commands all at once.
+
+    The checks are the ones enabled_checks() gives (just the categories in
+    only, if it's given), run with their
+    run_async; a ValueError is raised if any of them doesn't have one.
+    With fail_fast, the first failure cancels the git commands still
+    running.
+    """
+    report = Report()
+    checks = enabled_checks(skip_checks, only)
+    unsupported = [check.category for check in checks if check.run_async is None]
+    if unsupported:
+        raise ValueError("The asyncio engine can't run {0}.".format(", ".join(unsupported)))
+    options = {"ignore_unpushed_if_no_remotes": ignore_unpushed_if_no_remotes,
+               "show_changes": show_changes,
+               "remote_tips": None}
+
+    def failed():
+        return not all(success for success, message in report.values())
+
+    async def run(check):
+        with timed("category", check.category, project.path):
+            return await check.run_async(project, options)
+
+    # Looking for files doesn't need git, so those checks run before starting any.
+    for check in checks:
+        if check.cost > 0:
+            break
+        result = await run(check)
+        if result is not None:
+            report[check.category] = result
+        if fail_fast and failed():
+            return report
+
+    pending = dict((check.category, run(check)) for check in checks if check.cost > 0)
+
+    if not fail_fast:
+        results = await asyncio.gather(*pending.values())
+        for category, result in zip(pending, results):
+            if result is not None:
+                report[category] = result
+        return report
+
+    categories = dict((asyncio.ensure_future(coroutine), category) for category, coroutine in pending.items())
+    remaining = set(categories)
+    while remaining:
+        done, remaining = await asyncio.wait(remaining, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            result = task.result()
+            if result is not None:
+                report[categories[task]] = result
+        if failed():
+            for task in remaining:
+                task.cancel()
+            await asyncio.gather(*remaining, return_exceptions=True)
+            break
+    return report
+
+
+async def check_directory_async(directory, skip_checks, ignore_unpushed_if_no_remotes, semaphore=None,
+                                fail_fast=False, show_changes=0, only=None):
+    project = AsyncGitProject(directory, semaphore)
+    await project.validate()
+    return await check_project_async(project, skip_checks, ignore_unpushed_if_no_remotes, fail_fast, show_changes,
+                                     only)
+
+
+async def scan(directories, skip_checks, ignore_unpushed_if_no_remotes, git_processes, results,
+               cache=None, options=None, fail_fast=False, stop=None, show_changes=0, ordered=True):
+    semaphore = asyncio.Semaphore(git_processes)
+    loop = asyncio.get_running_loop()
+    recall = None
+    if cache is not None:
+        # cache.cached() isn't a coroutine, so it runs on threads of its own,
+        # each waiting on this loop for the checks it asks for.
+        recall = concurrent.futures.ThreadPoolExecutor(git_processes)
+
+    async def check(directory):
+        report = await check_or_recall(directory)
+        if stop is not None and not all(success for success, message in report.values()):
+            stop.set()
+        return report
+
+    def check_directory(directory, only=None):
+        return check_directory_async(directory, skip_checks, ignore_unpushed_if_no_remotes, semaphore,
+                                     fail_fast, show_changes, only)
+
+    def check_directory_from_thread(directory, only=None):
+        return asyncio.run_coroutine_threadsafe(check_directory(directory, only), loop).result()
+
+    async def check_or_recall(directory):
+        directory = os.path.abspath(os.path.expanduser(directory))
+        try:
+            if cache is None:
+                return await check_directory(directory)
+            return await loop.run_in_executor(recall, cached, cache, check_directory_from_thread, directory, options)
+        except (GitProjectException, subprocess.CalledProcessError) as e:
+            return Report([(CheckId.IS_A_GIT_REPOSITORY, CheckResult(False, str(e)))])
+
+    try:
+        pending = collections.deque()
+        for directory in directories:
+            if stop is not None:
+                # Start no more projects than can run git at once, so a failure stops the rest before they start.
+                running = [task for _, task in pending if not task.done()]
+                if len(running) >= git_processes:
+                    await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                if stop.is_set():
+                    break
+            task = asyncio.ensure_future(check(directory))
+            if not ordered:
+                task.add_done_callback(functools.partial(put_result, results, directory))
+            pending.append((directory, task))
+            # Let the checks we've started get going while we look for more.
+            await asyncio.sleep(0)
+            while ordered and pending and pending[0][1].done():
+                directory, task = pending.popleft()
+                results.put((directory, task.result()))
+        if not ordered:
+            await asyncio.gather(*[task for directory, task in pending])
+            return
+        while pending:
+            directory, task = pending.popleft()
+            results.put((directory, await task))
+
+    finally:
+        if recall is not None:
+            recall.shutdown(wait=False)
+
+
+def put_result(results, directory, task):
+    if not task.cancelled() and task.exception() is None:
+        results.put((directory, task.result()))
+
+
+def scan_directories_with_asyncio(directories, skip_checks, ignore_unpushed_if_no_remotes, git_processes=None,
+                                  cache=None, options=None, fail_fast=False, stop=None, show_changes=0,
+                                  ordered=True):
+    """Yield (directory, report) for each directory, in order, checking them all on one event loop.
+
+    The event loop runs in its own thread, so this can be used anywhere
+    scan.scan_directories can.  git_processes caps how many git commands
+    run at once across all the projects.  Once the threading.Event stop is
+    set, no more projects are started.  If ordered is False, reports are
+    yielded as soon as they're ready instead.
+    """
+    if git_processes is None:
+        git_processes = default_git_processes()
+    results = queue.Queue()
+    finished = object()
+
+    def run():
+        try:
+            asyncio.run(scan(directories, skip_checks, ignore_unpushed_if_no_remotes, git_processes, results,
+                             cache, options, fail_fast, stop, show_changes, ordered))
+        except BaseException as e:
+            results.put((finished, e))
+        else:
+            results.put((finished, None))
+
+    # This needs Python 3.8 or later, whose child watcher works for an event loop outside the main thread.
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    while True:
+        directory, report = results.get()
+        if directory is finished:
+            thread.join()
+            if report is not None:
+                raise report
+            return
+        yield directory, report
@@ -0,0 +1,42 @@
+"""Read the list of projects for --batch.
+
+Each record is a directory, optionally followed by a tab and options that
+apply to that directory only, written as they would be on the command
+line::
+
+    /home/me/src/project
+    /home/me/src/scratch	--ignore-no-remotes --ignore-unpushed
+
+Records are separated by newlines, or by NUL characters with --null, to
+go with `find -print0`.  They're read as they arrive, so checking can
+start before whatever is writing them has finished.
+"""
+import os
+import shlex
+
+__author__ = 'wolf'
+
+
+def read_records(f, separator=b"\n", chunk_size=65536):
+    """Yield the non-empty records in the binary file f, as they're read."""
+    read = getattr(f, "read1", f.read)  # read1 doesn't wait for a whole chunk
+    buffered = b""
+    while True:
+        chunk = read(chunk_size)
+        if not chunk:
+            break
+        records = (buffered + chunk).split(separator)
+        buffered = records.pop()
+        for record in records:
+            record = record.rstrip(b"\r\n") if separator == b"\n" else record
+            if record:
+                yield os.fsdecode(record)
+    buffered = buffered.strip(b"\r\n")
+    if buffered:
+        yield os.fsdecode(buffered)
+
+
+def parse_record(record):
+    """Return (directory, [option, ...]) for a record."""
+    directory, _, options = record.partition("\t")
+    return directory, shlex.split(options)
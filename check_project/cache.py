@@ -0,0 +1,188 @@
+"""Remember reports for repositories that haven't changed since we last checked them.
+
+A repository's fingerprint is built from the stat() of the files git
+changes whenever something we check could have changed: HEAD, the refs,
+the stash log and the config, plus the top-level listing we look for
+README and LICENSE in.  None of this needs git to run.
+
+Nothing short of `git status` notices an edit to a file below the top
+level, so the checks that need it (see live_categories()) are run again
+even when the cache has a report, and their results replace the
+remembered ones.
+"""
+import os
+import threading
+import time
+from check_project.checks import checks_needing
+from check_project.gitdir import find_git_dir, UnreadableGitDir
+from check_project.report import as_pairs, CheckResult, Report
+
+__author__ = 'wolf'
+
+DEFAULT_MAX_ENTRIES = 20000
+
+
+def default_cache_file():
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "check_project", "results.sqlite")
+
+
+def default_state_file():
+    return os.path.join(os.path.dirname(default_cache_file()), "state.sqlite")
+
+
+def default_durations_file():
+    return os.path.join(os.path.dirname(default_cache_file()), "durations.sqlite")
+
+
+def connect(filename, **kwargs):
+    """Return a sqlite3 connection to filename, making the directory it's in if need be."""
+    directory = os.path.dirname(filename)
+    if directory and not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+    import sqlite3  # not at the top, so --no-cache doesn't pay for it
+    return sqlite3.connect(filename, timeout=30, **kwargs)
+
+
+def stat_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def fingerprint(directory):
+    """Return a string that changes whenever directory's report might, or None if we can't tell."""
+    directory = os.path.abspath(os.path.expanduser(directory))
+    try:
+        git_dir = find_git_dir(directory)
+    except (IOError, OSError, UnreadableGitDir):
+        return None
+    if git_dir is None:
+        return None
+
+    state = [("HEAD", stat_key(os.path.join(git_dir.git_dir, "HEAD")))]
+    for name in ("packed-refs", "config", os.path.join("logs", "refs", "stash"), "reftable"):
+        state.append((name, stat_key(git_dir.path(name))))
+    for dirpath, dirnames, filenames in os.walk(git_dir.path("refs")):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            full_path = os.path.join(dirpath, filename)
+            state.append((full_path, stat_key(full_path)))
+    try:
+        listing = sorted(os.listdir(directory))
+    except OSError:
+        return None
+    for filename in listing:
+        # .git itself changes whenever git writes the index, which `git status` does.
+        if filename == ".git":
+            continue
+        state.append((filename, stat_key(os.path.join(directory, filename))))
+
+    import hashlib
+    return hashlib.sha1(repr(state).encode("utf-8")).hexdigest()
+
+
+class ResultCache(object):
+    """Reports keyed by directory and options, stored in sqlite so parallel runs can share them.
+
+    Each thread gets its own connection, and close() closes all of them.
+    Once there are more than max_entries reports, close() also throws out
+    the ones used least recently, unless it's told not to evict.
+    """
+
+    def __init__(self, filename=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.filename = filename or default_cache_file()
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        with self.connection() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS results ("
+                               "directory TEXT, options TEXT, fingerprint TEXT, report TEXT, used REAL, "
+                               "PRIMARY KEY (directory, options))")
+            connection.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+
+    def connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Only ever used by this thread, but close() may be called from another.
+            connection = connect(self.filename, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def get(self, directory, options, current_fingerprint):
+        if current_fingerprint is None:
+            return None
+        with self.connection() as connection:
+            row = connection.execute("SELECT report FROM results "
+                                     "WHERE directory = ? AND options = ? AND fingerprint = ?",
+                                     (directory, options, current_fingerprint)).fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE results SET used = ? WHERE directory = ? AND options = ?",
+                               (time.time(), directory, options))
+        import json
+        return Report((category, CheckResult(*result)) for category, result in json.loads(row[0]).items())
+
+    def put(self, directory, options, current_fingerprint, report):
+        if current_fingerprint is None:
+            return
+        import json
+        with self.connection() as connection:
+            connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                               (directory, options, current_fingerprint, json.dumps(as_pairs(report)), time.time()))
+
+    def evict(self):
+        with self.connection() as connection:
+            connection.execute("DELETE FROM results WHERE rowid IN "
+                               "(SELECT rowid FROM results ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                               (self.max_entries,))
+
+    def close(self, evict=True):
+        if evict:
+            self.evict()
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for connection in connections:
+            connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def live_categories():
+    """Return the categories that can't be taken from the cache, because the fingerprint can't see them change."""
+    return checks_needing(["uncommitted_changes"])
+
+
+def cached(cache, check, directory, options):
+    """Return check(directory), or the report cache remembers for it if nothing has changed.
+
+    Only the live categories are checked again for a remembered report,
+    with check(directory, only=categories).
+    """
+    directory = os.path.abspath(os.path.expanduser(directory))
+    # Taken before checking, so a change made while the check runs isn't remembered as checked.
+    current_fingerprint = fingerprint(directory)
+    report = cache.get(directory, options, current_fingerprint)
+    if report is None:
+        report = check(directory)
+        cache.put(directory, options, current_fingerprint, report)
+        return report
+    live = [category for category in live_categories() if category in report]
+    if live:
+        report.update(check(directory, only=live))
+    return report
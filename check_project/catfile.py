@@ -0,0 +1,132 @@
+"""Look up many objects with one long-lived `git cat-file`.
+
+Starting git costs far more than asking it about one object, so a project
+keeps a CatFile, which starts `git cat-file --batch-check` (for types and
+sizes) and `git cat-file --batch` (for contents) the first time each is
+needed, and sends every later question down the same pipe.
+
+    with CatFile(path) as cat_file:
+        cat_file.info([b"HEAD", b"HEAD:README"])
+        # [(b"9fceb02...", b"commit", 232), (b"e69de29...", b"blob", 0)]
+        sha, kind, data = cat_file.read(b"HEAD:README")
+
+Closing a CatFile (or its project) ends the git processes.
+"""
+import subprocess
+import threading
+from check_project.instrument import timed
+
+__author__ = 'wolf'
+
+# How many names to send before reading the answers, so that neither pipe fills up while the other waits.
+CHUNK_SIZE = 256
+
+
+class CatFileError(Exception):
+    pass
+
+
+class _Batch(object):
+    """One `git cat-file` process, and a lock so that only one thread talks to it at a time."""
+
+    def __init__(self, path, option):
+        self.command = ('git', 'cat-file', option)
+        self.path = path
+        self.process = subprocess.Popen(self.command,
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL,
+                                        cwd=path)
+        self.lock = threading.Lock()
+
+    def send(self, names):
+        self.process.stdin.write(b"".join(name + b"\n" for name in names))
+        self.process.stdin.flush()
+
+    def read_header(self, name):
+        line = self.process.stdout.readline()
+        if not line:
+            raise CatFileError("git cat-file stopped while looking up {0!r}.".format(name))
+        line = line.rstrip(b"\n")
+        if line.endswith(b" missing") or line.endswith(b" ambiguous"):
+            return None
+        sha, kind, size = line.split(b" ")
+        return sha, kind, int(size)
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except (IOError, OSError):
+            pass
+        self.process.stdout.close()
+        self.process.wait()
+
+
+class CatFile(object):
+    """The `git cat-file` processes for one repository, started when they're first needed."""
+
+    def __init__(self, path):
+        self.path = path
+        self._check = None
+        self._contents = None
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def _batch(self, attribute, option):
+        with self.lock:
+            if self.closed:
+                raise CatFileError("{0} has been closed.".format(self))
+            if getattr(self, attribute) is None:
+                setattr(self, attribute, _Batch(self.path, option))
+            return getattr(self, attribute)
+
+    def __str__(self):
+        return "<CatFile '{0}'>".format(self.path)
+
+    def info(self, names):
+        """Return (sha, type, size) for each of names, or None for the ones that don't name an object.
+
+        names are anything git can turn into an object, like a sha,
+        b"HEAD" or b"HEAD:README", as bytes.
+        """
+        names = list(names)
+        if not names:
+            return []
+        batch = self._batch("_check", "--batch-check")
+        answers = []
+        with batch.lock, timed("git", batch.command, self.path) as event:
+            for start in range(0, len(names), CHUNK_SIZE):
+                chunk = names[start:start + CHUNK_SIZE]
+                batch.send(chunk)
+                answers.extend(batch.read_header(name) for name in chunk)
+            event.exit_status = 0
+        return answers
+
+    def read(self, name):
+        """Return (sha, type, contents) for the object name, or None if there's no such object."""
+        batch = self._batch("_contents", "--batch")
+        with batch.lock, timed("git", batch.command, self.path) as event:
+            batch.send([name])
+            header = batch.read_header(name)
+            if header is None:
+                return None
+            sha, kind, size = header
+            data = batch.process.stdout.read(size + 1)[:size]  # and the newline after it
+            event.output_bytes = size
+            event.exit_status = 0
+        return sha, kind, data
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            batches = [batch for batch in (self._check, self._contents) if batch is not None]
+            self._check = self._contents = None
+        for batch in batches:
+            with batch.lock:
+                batch.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,201 @@
+"""The checks check_project runs, and how to add your own.
+
+Each Check says which facts about a repository it needs.  Facts are the
+attributes of the project's GitSnapshot, like "remotes" or
+"uncommitted_changes", and a snapshot only works a fact out the first time
+something asks for it.  So however many checks need the remotes, git
+remote runs at most once per project, and not at all if none of the
+enabled checks need them.
+
+A check is a function taking the project and a dict of options
+(ignore_unpushed_if_no_remotes, show_changes and remote_tips), and returning a
+(success, message) tuple, or None to leave itself out of the report::
+
+    def has_changelog(project, options):
+        changelog = project.snapshot.nonempty_files(["CHANGELOG", "HISTORY"], tracked=True)
+        if changelog["CHANGELOG"] or changelog["HISTORY"]:
+            return True, "There's a changelog."
+        return False, "There's no changelog."
+
+    register(Check("has a changelog", has_changelog, needs=["listing"]))
+
+Checks added with register() are run by the threads engine and by
+--watch.  The asyncio engine runs a check with run_async, a coroutine
+function taking an AsyncGitProject and the same options, and --engine
+asyncio is refused if any check that would run doesn't have one.
+
+A check that's off unless asked for, like "has every branch on a remote",
+names the option that turns it on with requires, and skipped_by_options()
+leaves it out without that option.
+"""
+
+__author__ = 'wolf'
+
+# Roughly what it costs to find each fact out, so the cheap checks can go
+# first and --fail-fast can stop before the expensive ones.
+FACT_COSTS = {
+    "listing": 0,
+    "remotes": 1,
+    "remote_urls": 1,
+    "refs": 1,
+    "has_stash": 1,
+    "uncommitted_changes": 2,
+    "unpushed_commits": 3,
+}
+
+
+class Check(object):
+    """A check, the facts it needs, and how to turn it off.
+
+    skip is what's put in skip_checks to leave it out, and option is the
+    name of the command line option that does that, if there is one.  A
+    check that costs more than the facts it needs, like one that goes over
+    the network, can say so with cost.  A check that's only run when an
+    option is given, like verify_remotes, names it with requires.
+    run_async is what --engine asyncio runs instead of run, if it can.
+    """
+
+    def __init__(self, category, run, needs=(), skip=None, option=None, cost=None, requires=None,
+                 run_async=None):
+        self.category = category
+        self.run = run
+        self.needs = frozenset(needs)
+        self.skip = skip or "ignore_" + category.replace(" ", "_")
+        self.option = option or self.skip
+        self._cost = cost
+        self.requires = requires
+        self.run_async = run_async
+
+    def __repr__(self):
+        return "<Check {0!r}>".format(self.category)
+
+    @property
+    def cost(self):
+        if self._cost is not None:
+            return self._cost
+        return max([FACT_COSTS.get(fact, max(FACT_COSTS.values())) for fact in self.needs] or [0])
+
+
+CHECKS = []
+
+
+def register(check):
+    """Add check to the checks that are run, replacing any with the same category."""
+    CHECKS[:] = [existing for existing in CHECKS if existing.category != check.category] + [check]
+    return check
+
+
+def unregister(category):
+    CHECKS[:] = [check for check in CHECKS if check.category != category]
+
+
+def enabled_checks(skip_checks=(), only=None):
+    """Return the checks not in skip_checks (and in only, if given), cheapest first."""
+    return sorted((check for check in CHECKS
+                   if check.skip not in skip_checks and (only is None or check.category in only)),
+                  key=lambda check: check.cost)
+
+
+def checks_needing(facts):
+    """Return the categories of the checks that need any of facts."""
+    return set(check.category for check in CHECKS if check.needs & set(facts))
+
+
+def check_groups(skip_checks=()):
+    """Return the categories of the checks not in skip_checks, in groups that need none of the same facts.
+
+    Checks in different groups can be run on different copies of a
+    project without working anything out twice.
+    """
+    groups = []
+    for check in enabled_checks(skip_checks):
+        sharing = [group for group in groups if group[0] & check.needs]
+        needs, categories = set(check.needs), [check.category]
+        for group in sharing:
+            groups.remove(group)
+            needs |= group[0]
+            categories = group[1] + categories
+        groups.append((needs, categories))
+    return [categories for needs, categories in groups]
+
+
+def skipped_by_options(options):
+    """Return skip_checks for the parsed command line options."""
+    return [check.skip for check in CHECKS
+            if getattr(options, check.option, False)
+            or check.requires is not None and not getattr(options, check.requires, False)]
+
+
+def check_readme(project, options):
+    return project.check_for_nonempty_file("README")
+
+
+def check_license(project, options):
+    return project.check_for_nonempty_file("LICENSE")
+
+
+def check_remotes(project, options):
+    return project.check_remotes()
+
+
+def check_stash(project, options):
+    return project.check_git_stash()
+
+
+def check_uncommitted_changes(project, options):
+    return project.check_uncommitted_changes(sample=options.get("show_changes", 0))
+
+
+def check_unpushed_commits(project, options):
+    if options.get("ignore_unpushed_if_no_remotes") and not project.get_remotes():
+        return None
+    return project.check_unpushed_commits()
+
+
+async def check_readme_async(project, options):
+    return project.check_for_nonempty_file("README")
+
+
+async def check_license_async(project, options):
+    return project.check_for_nonempty_file("LICENSE")
+
+
+async def check_remotes_async(project, options):
+    return await project.check_remotes()
+
+
+async def check_stash_async(project, options):
+    return await project.check_git_stash()
+
+
+async def check_uncommitted_changes_async(project, options):
+    return await project.check_uncommitted_changes(sample=options.get("show_changes", 0))
+
+
+async def check_unpushed_commits_async(project, options):
+    if options.get("ignore_unpushed_if_no_remotes") and not await project.get_remotes():
+        return None
+    return await project.check_unpushed_commits()
+
+
+def check_remote_branches(project, options):
+    if options.get("remote_tips") is None:
+        return None
+    return project.check_remote_branches(options["remote_tips"])
+
+
+register(Check("has a readme", check_readme, needs=["listing"],
+               skip="ignore_missing_readme", run_async=check_readme_async))
+register(Check("has a license", check_license, needs=["listing"],
+               skip="ignore_missing_license", run_async=check_license_async))
+register(Check("has remotes", check_remotes, needs=["remotes"],
+               skip="ignore_remotes", option="ignore_no_remotes", run_async=check_remotes_async))
+register(Check("has no stash", check_stash, needs=["has_stash"],
+               skip="ignore_stash", run_async=check_stash_async))
+register(Check("has no uncommitted changes", check_uncommitted_changes, needs=["uncommitted_changes"],
+               skip="ignore_uncommitted_changes", option="ignore_uncommitted",
+               run_async=check_uncommitted_changes_async))
+register(Check("has no unpushed commits", check_unpushed_commits, needs=["remotes", "unpushed_commits"],
+               skip="ignore_unpushed_commits", option="ignore_unpushed", run_async=check_unpushed_commits_async))
+register(Check("has every branch on a remote", check_remote_branches, needs=["refs", "remote_urls"],
+               skip="ignore_remote_branches", cost=max(FACT_COSTS.values()) + 1, requires="verify_remotes"))
@@ -1,11 +1,46 @@
 from __future__ import print_function
 import argparse
+import contextlib
+import functools
 import os
 import sys
-from check_project.gitproject import GitProject
+import threading
+from check_project.cache import cached, default_cache_file, default_durations_file, default_state_file, \
+    ResultCache, DEFAULT_MAX_ENTRIES
+from check_project.checks import check_groups, enabled_checks, skipped_by_options
+from check_project.instrument import instrumented, Profiler, timed, Timings
+from check_project.report import CheckId, CheckResult, Report
+
+# Everything else is imported where it's first needed, so that check_project
+# starts quickly, and `check_project --help` doesn't wait on asyncio, sqlite3,
+# json or even subprocess.
 
 __author__ = 'wolf'
 
+BACKENDS = {"git": "GitProject",
+            "filesystem": "FilesystemGitProject"}
+
+
+def project_class_for(backend):
+    from check_project import gitproject
+    return getattr(gitproject, BACKENDS[backend])
+
+
+def positive_int(value):
+    """An argparse type for counts, like --jobs, that only make sense above zero."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("{0} isn't a positive number.".format(value))
+    return number
+
+
+class AppendDirectory(argparse.Action):
+    """Store the directory like a plain option, but also remember every -d given."""
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        setattr(namespace, self.dest, values)
+        namespace.directories = getattr(namespace, "directories", []) + [values]
+
 
 def parse_args(args):
     parser = argparse.ArgumentParser(
@@ -15,7 +50,55 @@ def parse_args(args):
     group.add_argument("-q", "--quiet", action="store_true")
     parser.add_argument("-d", "--directory",
                         default=os.getcwd(),
-                        help="Base of the project.  Defaults to current directory.")
+                        action=AppendDirectory,
+                        help="Base of the project.  Defaults to current directory.  "
+                             "May be given more than once to check several projects.")
+    parser.add_argument("-r", "--root",
+                        dest="roots",
+                        action="append",
+                        default=[],
+                        help="Check every git repository found under ROOT.  May be given more than once.")
+    parser.add_argument("--exclude",
+                        action="append",
+                        default=[],
+                        metavar="GLOB",
+                        help="Don't look for repositories in directories whose name, or path relative to "
+                             "the root, matches GLOB.  May be given more than once.")
+    parser.add_argument("--max-depth",
+                        type=int,
+                        default=None,
+                        help="Don't look for repositories more than this many directories below a root.")
+    parser.add_argument("--nested",
+                        action="store_true",
+                        help="Also look for repositories inside repositories, like submodules.")
+    parser.add_argument("-j", "--jobs",
+                        type=positive_int,
+                        default=None,
+                        help="How many projects to check at once when checking several projects.")
+    parser.add_argument("--engine",
+                        choices=["threads", "asyncio", "processes"],
+                        default="threads",
+                        help="How to run the checks.  'asyncio' starts all of a project's git commands at "
+                             "once, and --jobs then limits how many git commands run at once rather than "
+                             "how many projects.  'processes' checks several projects on a pool of --jobs "
+                             "processes, for when there are too many for one core to keep up with.  "
+                             "Defaults to 'threads'.")
+    parser.add_argument("--schedule",
+                        action="store_true",
+                        help="Remember how long each project and check takes, and start the slowest "
+                             "projects first next time, splitting the checks of any that would hold up the "
+                             "rest between several workers.  Nothing is checked until every project has "
+                             "been found.")
+    parser.add_argument("--durations-file",
+                        default=None,
+                        help="Where --schedule remembers how long things took.  Defaults to {0}.".format(
+                            default_durations_file()))
+    parser.add_argument("--backend",
+                        choices=sorted(BACKENDS),
+                        default="git",
+                        help="How to look at repositories.  'filesystem' reads refs, remotes and the stash "
+                             "straight from .git, and only runs git to search history or check the "
+                             "working tree.  Defaults to 'git'.")
     parser.add_argument("--ignore-unpushed",
                         help="Don't check for unpushed commits.",
                         action="store_true")
@@ -38,7 +121,127 @@ def parse_args(args):
                         action="store_true",
                         help="Don't check for unpushed commits if there are no remotes. "
                              "You probably also want --ignore-no-remotes.")
-    return parser.parse_args(args)
+    parser.add_argument("--verify-remotes",
+                        action="store_true",
+                        help="Also ask each remote, with git ls-remote, whether it has every branch, instead "
+                             "of trusting the remote-tracking branches, which are only as new as the last fetch.")
+    parser.add_argument("--remote-timeout",
+                        type=float,
+                        default=10.0,
+                        metavar="SECONDS",
+                        help="With --verify-remotes, how long to wait for each remote.  Defaults to 10 seconds.")
+    parser.add_argument("--remote-connections",
+                        type=positive_int,
+                        default=8,
+                        metavar="N",
+                        help="With --verify-remotes, how many remotes to ask at once, across all the "
+                             "projects.  Defaults to 8.")
+    parser.add_argument("--untracked",
+                        choices=["all", "normal", "no"],
+                        default=None,
+                        help="How hard to look for untracked files, like git status --untracked-files.  'no' "
+                             "doesn't count them as uncommitted changes, and is much faster in big working "
+                             "trees; 'normal' doesn't look inside untracked directories.  Defaults to git's "
+                             "own setting.")
+    parser.add_argument("--fast-status",
+                        action="store_true",
+                        help="Let git keep an untracked cache and a split index in each repository, and use "
+                             "its own file system monitor where it has one, so that finding uncommitted "
+                             "changes doesn't mean looking at every file every time.")
+    parser.add_argument("--format",
+                        choices=["text", "json", "jsonl"],
+                        default="text",
+                        help="How to write the reports.  'jsonl' writes one JSON object per project, on "
+                             "its own line, as soon as the project's been checked; 'json' writes the same "
+                             "objects as one JSON array.  Defaults to 'text'.")
+    parser.add_argument("--show-changes",
+                        type=int,
+                        default=0,
+                        metavar="N",
+                        help="With --verbose, name up to N of the uncommitted changes.")
+    parser.add_argument("--fail-fast",
+                        action="store_true",
+                        help="Stop checking a project at its first failure.  The cheapest checks go first, "
+                             "so a missing README fails without running git.")
+    parser.add_argument("--stop-on-failure",
+                        action="store_true",
+                        help="When checking several projects, don't start any more once one fails.")
+    parser.add_argument("--no-cache",
+                        action="store_true",
+                        help="Check every project, even if nothing in it has changed since it was last checked.  "
+                             "Uncommitted changes are looked for every time either way.")
+    parser.add_argument("--cache-file",
+                        default=None,
+                        help="Where to remember reports between runs.  Defaults to {0}.".format(default_cache_file()))
+    parser.add_argument("--cache-size",
+                        type=positive_int,
+                        default=DEFAULT_MAX_ENTRIES,
+                        help="How many reports to remember.  Defaults to {0}.".format(DEFAULT_MAX_ENTRIES))
+    parser.add_argument("--diff",
+                        action="store_true",
+                        help="Only report what's changed since the last --diff run over the same projects: "
+                             "checks that fail now but didn't, checks that pass now but didn't, and projects "
+                             "that are new or have gone away.")
+    parser.add_argument("--state-file",
+                        default=None,
+                        help="Where --diff remembers the last run.  Defaults to {0}.".format(default_state_file()))
+    parser.add_argument("--new-failures-only",
+                        action="store_true",
+                        help="With --diff, exit with status 3 only if something fails that didn't last time.")
+    parser.add_argument("--profile",
+                        action="store_true",
+                        help="After the results, show how long each git command and check took, "
+                             "and which projects were slowest.  This goes to stderr.")
+    parser.add_argument("--profile-json",
+                        metavar="FILE",
+                        help="Write how long every git command, check and project took to FILE, as JSON.")
+    parser.add_argument("--batch",
+                        metavar="FILE",
+                        help="Check every directory listed in FILE ('-' for standard input), one per line.  "
+                             "A directory can be followed by a tab and options for it alone.")
+    parser.add_argument("-0", "--null",
+                        action="store_true",
+                        help="The directories in --batch are separated by NUL characters, not newlines.")
+    parser.add_argument("--watch",
+                        action="store_true",
+                        help="Don't stop after checking: keep watching the projects, and whenever one "
+                             "changes, re-run the checks that might have changed and show its report again.")
+    parser.add_argument("--watch-interval",
+                        type=float,
+                        default=1.0,
+                        metavar="SECONDS",
+                        help="Where inotify isn't available, how often --watch looks for changes.  "
+                             "Defaults to 1 second.")
+    parser.set_defaults(directories=[])
+    parsed = parser.parse_args(args)
+    if parsed.engine == "asyncio" and parsed.backend != "git":
+        parser.error("--engine asyncio only works with --backend git.")
+    if parsed.watch and (parsed.fail_fast or parsed.stop_on_failure):
+        parser.error("--watch always runs every check.")
+    if parsed.watch and parsed.batch:
+        parser.error("--watch can't be used with --batch.")
+    if parsed.batch and parsed.engine == "processes":
+        parser.error("--batch checks its directories on threads, so it can't be used with --engine processes.")
+    if parsed.diff and (parsed.watch or parsed.stop_on_failure):
+        parser.error("--diff needs every project checked once, so it can't be used with --watch or "
+                     "--stop-on-failure.")
+    if parsed.new_failures_only and not parsed.diff:
+        parser.error("--new-failures-only only works with --diff.")
+    if parsed.verify_remotes and parsed.engine != "threads":
+        parser.error("--verify-remotes only works with --engine threads.")
+    if (parsed.untracked or parsed.fast_status) and parsed.engine == "asyncio":
+        parser.error("--untracked and --fast-status only work with --engine threads.")
+    if parsed.schedule and (parsed.engine != "threads" or parsed.watch or parsed.batch):
+        parser.error("--schedule only works with --engine threads, and not with --watch or --batch.")
+    if parsed.verify_remotes and parsed.watch:
+        parser.error("--watch can't see remotes change, so it can't be used with --verify-remotes.")
+    if parsed.engine == "asyncio":
+        unsupported = [check.category for check in enabled_checks(skipped_by_options(parsed))
+                       if check.run_async is None]
+        if unsupported:
+            parser.error("--engine asyncio can't run these checks: {0}.".format(", ".join(unsupported)))
+    parsed.args = list(args)
+    return parsed
 
 
 def generate_exit_code(report):
@@ -48,43 +251,126 @@ def generate_exit_code(report):
     return 0
 
 
+@instrumented("project")
 def check_project(project,
                   skip_checks,
                   ignore_unpushed_if_no_remotes,
+                  fail_fast=False,
+                  show_changes=0,
+                  only=None,
+                  remote_tips=None,
+                  status=None,
                   ):
-    report = {}
+    """Run the checks on project and return the report.
 
-    # I hate this.  This should probably be plugin-y and not gross like this.
+    If only is given, just the checks in those categories are run.  With
+    a RemoteTips, the remotes are asked where their branches are.  status
+    is how to ask git status, if not the usual way (see status_for()).
+    """
+    report = Report()
 
-    if "ignore_remotes" not in skip_checks:
-        report["has remotes"] = project.check_remotes()
+    # Share one look at the repository between all the checks below.
+    project.take_snapshot(status)
 
-    if "ignore_missing_readme" not in skip_checks:
-        report["has a readme"] = project.check_for_nonempty_file("README")
+    # The checks come cheapest first, so that fail_fast can stop before
+    # running git at all, when it can.
+    options = {"ignore_unpushed_if_no_remotes": ignore_unpushed_if_no_remotes,
+               "show_changes": show_changes,
+               "remote_tips": remote_tips}
+    for check in enabled_checks(skip_checks, only):
+        with timed("category", check.category, project.path):
+            result = check.run(project, options)
+        if result is None:
+            continue
+        report[check.category] = result
+        if fail_fast and not result[0]:
+            break
 
-    if "ignore_missing_license" not in skip_checks:
-        report["has a license"] = project.check_for_nonempty_file("LICENSE")
+    return report
 
-    if "ignore_stash" not in skip_checks:
-        report["has no stash"] = project.check_git_stash()
 
-    if "ignore_uncommitted_changes" not in skip_checks:
-        report["has no uncommitted changes"] = project.check_uncommitted_changes()
+def check_directory(directory, skip_checks, ignore_unpushed_if_no_remotes, project_class=None,
+                    fail_fast=False, show_changes=0, remote_tips=None, status=None, only=None):
+    with (project_class or project_class_for("git"))(directory) as project:
+        return check_project(project, skip_checks, ignore_unpushed_if_no_remotes, fail_fast, show_changes,
+                             only=only, remote_tips=remote_tips, status=status)
 
-    if "ignore_unpushed_commits" in skip_checks or \
-            (ignore_unpushed_if_no_remotes and not project.get_remotes()):
-        pass
-    else:
-        report["has no unpushed commits"] = project.check_unpushed_commits()
 
-    return report
+def report_not_a_repository(check, directory, **options):
+    """Return check(directory, **options), or a failing report if directory isn't a git repository.
 
+    A git command that fails, say because git won't work in a repository
+    owned by someone else, fails the project the same way, rather than
+    the whole run.
+    """
+    import subprocess
+    from check_project.gitproject import GitProjectException
+    try:
+        return check(directory, **options)
+    except (GitProjectException, subprocess.CalledProcessError) as e:
+        return Report([(CheckId.IS_A_GIT_REPOSITORY, CheckResult(False, str(e)))])
 
-def generate_output(issues, verbose, quiet, directory):
+
+def changes_to_show(parser):
+    # The changes only end up in the messages, which only --verbose shows.
+    return parser.show_changes if parser.verbose else 0
+
+
+def status_for(parser):
+    """Return the git status arguments --untracked and --fast-status ask for, or None for the usual ones."""
+    if not parser.untracked and not parser.fast_status:
+        return None
+    from check_project.gitproject import status_arguments
+    return status_arguments(parser.untracked, parser.fast_status)
+
+
+def cache_options(parser):
+    # Anything that changes what goes in a report has to be part of its cache key.
+    options = dict((name, value) for name, value in parser.__dict__.items() if name.startswith("ignore_"))
+    options["backend"] = parser.backend
+    options["fail_fast"] = parser.fail_fast
+    options["show_changes"] = changes_to_show(parser)
+    options["verify_remotes"] = parser.verify_remotes
+    options["untracked"] = parser.untracked
+    import json
+    return json.dumps(options, sort_keys=True)
+
+
+def check_directory_with_asyncio(directory, skip_checks, ignore_unpushed_if_no_remotes, fail_fast=False,
+                                 show_changes=0, only=None):
+    import asyncio
+    from check_project.asyncproject import check_directory_async
+    return asyncio.run(check_directory_async(directory, skip_checks, ignore_unpushed_if_no_remotes,
+                                             fail_fast=fail_fast, show_changes=show_changes, only=only))
+
+
+def build_check(parser, checks, cache=None, remote_tips=None):
+    if parser.engine == "asyncio":
+        check = functools.partial(check_directory_with_asyncio,
+                                  skip_checks=checks,
+                                  ignore_unpushed_if_no_remotes=parser.ignore_unpushed_if_no_remotes,
+                                  fail_fast=parser.fail_fast,
+                                  show_changes=changes_to_show(parser))
+    else:
+        check = functools.partial(check_directory,
+                                  skip_checks=checks,
+                                  ignore_unpushed_if_no_remotes=parser.ignore_unpushed_if_no_remotes,
+                                  project_class=project_class_for(parser.backend),
+                                  fail_fast=parser.fail_fast,
+                                  show_changes=changes_to_show(parser),
+                                  remote_tips=remote_tips if parser.verify_remotes else None,
+                                  status=status_for(parser))
+    # What the remotes have isn't part of the cache key, so don't trust old answers about it.
+    if cache is not None and not parser.verify_remotes:
+        check = functools.partial(cached, cache, check, options=cache_options(parser))
+    return check
+
+
+def generate_output(issues, verbose, quiet, directory, show_directory=False):
     output = []
     if quiet:
         return output
-    if verbose:
+    if verbose or show_directory:
         output.append("Project {0}".format(os.path.abspath(directory)))
     for category in sorted(issues.keys()):
         success, message = issues[category]
@@ -100,25 +386,399 @@ def generate_output(issues, verbose, quiet, directory):
     return output
 
 
-def start_process(args):
-    parser = parse_args(args)
+def generate_record(issues, directory, timings=None):
+    """Return a report as a dict that can be written out as JSON.
+
+    timings is how long each check took, in seconds, if we know.
+    """
+    return {"path": os.path.abspath(os.path.expanduser(directory)),
+            "passed": not generate_exit_code(issues),
+            "report": dict((category, {"passed": bool(success), "message": message})
+                           for category, (success, message) in issues.items()),
+            "failures": [{"check": category, "message": issues[category][1]}
+                         for category in sorted(issues) if not issues[category][0]],
+            "timings": timings or {}}
+
+
+class OutputWriter(object):
+    """Turn reports into lines in the chosen --format, and hand each line to write as soon as it's ready."""
+
+    def __init__(self, parser, write, timings=None, show_directory=False):
+        self.parser = parser
+        self.write = write
+        self.timings = timings
+        self.show_directory = show_directory
+        self.written = 0
+
+    def report(self, issues, directory):
+        if self.parser.quiet:
+            return
+        if self.parser.format == "text":
+            for line in generate_output(issues, self.parser.verbose, self.parser.quiet, directory,
+                                        self.show_directory):
+                self.write(line)
+            return
+        self.write_record(generate_record(issues, directory, self.pop_timings(directory)))
+
+    def pop_timings(self, directory):
+        if self.timings is None:
+            return None
+        return self.timings.pop(os.path.abspath(os.path.expanduser(directory)))
+
+    def write_record(self, record):
+        import json
+        line = json.dumps(record, sort_keys=True)
+        if self.parser.format == "json":
+            line = ("," if self.written else "[") + line
+        self.write(line)
+        self.written += 1
+
+    def close(self):
+        if self.parser.format == "json" and not self.parser.quiet:
+            self.write("]" if self.written else "[]")
+
+
+def state_scope(parser):
+    """Return what --diff keeps the last run's reports under: which projects, and how they were checked."""
+    import json
+    directories = parser.directories or ([] if parser.roots or parser.batch else [parser.directory])
+    return json.dumps({"directories": sorted(os.path.abspath(os.path.expanduser(d)) for d in directories),
+                       "roots": sorted(os.path.abspath(os.path.expanduser(root)) for root in parser.roots),
+                       "batch": parser.batch,
+                       "options": cache_options(parser)}, sort_keys=True)
+
 
-    checks = [entry for entry in parser.__dict__ if entry.startswith("check_")]
-    project = GitProject(parser.directory)
-    report = check_project(project,
-                           checks,
-                           parser.ignore_unpushed_if_no_remotes)
-    output = generate_output(report, parser.verbose, parser.quiet, parser.directory)
+class DiffWriter(object):
+    """Write only what's changed since the last run in state, through writer, and remember this run.
 
-    exit_code = generate_exit_code(report)
+    new_failures counts the checks failing now that weren't before.
+    """
 
+    def __init__(self, parser, writer, state):
+        from check_project.state import compare
+        self.compare = compare
+        self.parser = parser
+        self.writer = writer
+        self.state = state
+        self.previous = state.previous()
+        self.reports = {}
+        self.new_failures = 0
+        self.show_directory = True
+
+    def report(self, issues, directory):
+        self.writer.pop_timings(directory)
+        directory = os.path.abspath(os.path.expanduser(directory))
+        self.reports[directory] = issues
+        previous = self.previous.get(directory)
+        new_failures, fixed = self.compare(previous, issues)
+        self.new_failures += len(new_failures)
+        if previous is None:
+            self.write(directory, "appeared", issues, new_failures, fixed)
+        elif new_failures or fixed:
+            self.write(directory, "changed", issues, new_failures, fixed)
+
+    def write(self, directory, change, issues, new_failures, fixed):
+        if self.parser.quiet:
+            return
+        if self.parser.format != "text":
+            self.writer.write_record({
+                "path": directory,
+                "change": change,
+                "passed": not generate_exit_code(issues) if change != "vanished" else None,
+                "new_failures": [{"check": category, "message": issues[category][1]} for category in new_failures],
+                "fixed": [{"check": category, "message": issues[category][1]} for category in fixed]})
+            return
+        suffix = {"appeared": " (new)", "vanished": " (gone)"}.get(change, "")
+        self.writer.write("Project {0}{1}".format(directory, suffix))
+        for prefix, categories in (("*** FAIL: ", new_failures), ("   fixed: ", fixed)):
+            for category in categories:
+                line = "{0}{1}".format(prefix, category)
+                if self.parser.verbose:
+                    line = "{0} -- {1}".format(line, issues[category][1])
+                self.writer.write(line)
+
+    def close(self):
+        for directory in sorted(set(self.previous) - set(self.reports)):
+            self.write(directory, "vanished", {}, [], [])
+        self.writer.close()
+        self.state.save(self.reports)
+        self.state.close()
+
+
+def get_directories(parser):
+    for directory in parser.directories:
+        yield directory
+    if parser.roots:
+        from check_project.discover import find_repositories
+    for root in parser.roots:
+        for directory in find_repositories(root,
+                                           exclude=parser.exclude,
+                                           max_depth=parser.max_depth,
+                                           nested=parser.nested):
+            yield directory
+
+
+def stop_on_failure(check, stop, directory, **options):
+    """Return check(directory, **options), setting the threading.Event stop if it fails."""
+    report = check(directory, **options)
+    if generate_exit_code(report):
+        stop.set()
+    return report
+
+
+def scan_process(parser, checks, cache, writer, remote_tips=None):
+    stop = threading.Event() if parser.stop_on_failure else None
+    # Machine-readable reports go out as each project finishes, in whatever order.
+    ordered = parser.format == "text"
+    if parser.engine == "asyncio":
+        from check_project.asyncproject import scan_directories_with_asyncio
+        results = scan_directories_with_asyncio(get_directories(parser),
+                                                checks,
+                                                parser.ignore_unpushed_if_no_remotes,
+                                                parser.jobs,
+                                                cache,
+                                                cache_options(parser),
+                                                parser.fail_fast,
+                                                stop,
+                                                changes_to_show(parser),
+                                                ordered)
+    elif parser.engine == "processes":
+        from check_project.processes import scan_directories_with_processes
+        results = scan_directories_with_processes(get_directories(parser), parser, checks, parser.jobs, stop,
+                                                  ordered)
+    elif parser.schedule:
+        return schedule_process(parser, checks, cache, writer, remote_tips)
+    else:
+        from check_project.scan import scan_directories
+        check = functools.partial(report_not_a_repository, build_check(parser, checks, cache, remote_tips))
+        if stop is not None:
+            check = functools.partial(stop_on_failure, check, stop)
+        results = scan_directories(get_directories(parser), check, parser.jobs, stop, ordered)
+
+    exit_code = 0
+    for directory, report in results:
+        writer.report(report, directory)
+        exit_code = max(exit_code, generate_exit_code(report))
+        if stop is not None and exit_code:
+            stop.set()  # the workers of --engine processes can't
+    return exit_code
+
+
+def schedule_process(parser, checks, cache, writer, remote_tips=None):
+    """Like scan_process, but the projects expected to take longest are started first (see --schedule)."""
+    from check_project.schedule import Durations, scan_directories_scheduled
+    stop = threading.Event() if parser.stop_on_failure else None
+    check = functools.partial(report_not_a_repository, build_check(parser, checks, cache, remote_tips))
+    # The parts of a split project are put in the cache together, once they're all in.
+    check_part = functools.partial(report_not_a_repository, build_check(parser, checks, None, remote_tips))
+    if stop is not None:
+        check = functools.partial(stop_on_failure, check, stop)
+        check_part = functools.partial(stop_on_failure, check_part, stop)
+    # --fail-fast stops at the first failure in the whole project, so its checks can't be split.
+    groups = [sum(check_groups(checks), [])] if parser.fail_fast else check_groups(checks)
+    directories = [os.path.abspath(os.path.expanduser(directory)) for directory in get_directories(parser)]
+
+    exit_code = 0
+    durations = Durations(parser.durations_file)
+    try:
+        with durations:
+            results = scan_directories_scheduled(directories, check, check_part,
+                                                 durations.remembered(directories), groups, parser.jobs, stop,
+                                                 ordered=parser.format == "text",
+                                                 cache=None if parser.verify_remotes else cache,
+                                                 options=cache_options(parser))
+            for directory, report in results:
+                writer.report(report, directory)
+                exit_code = max(exit_code, generate_exit_code(report))
+    finally:
+        durations.close()
+    return exit_code
+
+
+# What a directory in a --batch can't ask for, because the whole batch shares it.
+BATCH_WIDE_OPTIONS = ["batch", "cache_file", "cache_size", "diff", "directories", "durations_file", "exclude",
+                      "format", "jobs", "max_depth", "nested", "new_failures_only", "no_cache", "null", "profile",
+                      "profile_json", "quiet", "remote_connections", "remote_timeout", "roots", "schedule",
+                      "state_file", "stop_on_failure", "verbose", "watch", "watch_interval"]
+
+
+def batch_item(parser, parsed, record):
+    """Return (directory, parsed options) for a --batch record, or (directory, None) if its options are bad.
+
+    Each directory gets the options the whole batch was given (parser),
+    followed by its own, which can't change any of BATCH_WIDE_OPTIONS.
+    Records with the same options of their own share what parsed, a dict,
+    remembers for them, so the command line isn't parsed again for each.
+    """
+    import io
+    from check_project.batch import parse_record
+    try:
+        directory, overrides = parse_record(record)
+    except ValueError:  # like an unbalanced quote
+        return record.partition("\t")[0], None
+    if not overrides:
+        return directory, parser
+    overrides = tuple(overrides)
+    if overrides not in parsed:
+        try:
+            with contextlib.redirect_stderr(io.StringIO()):
+                options = parse_args(parser.args + list(overrides))
+        except SystemExit:
+            options = None
+        if options is not None and any(getattr(options, name) != getattr(parser, name)
+                                       for name in BATCH_WIDE_OPTIONS):
+            options = None
+        parsed[overrides] = options
+    return directory, parsed[overrides]
+
+
+INVALID_OPTIONS = CheckResult(False, "The options given for this directory in the batch aren't valid.")
+
+
+def check_batch_item(cache, remote_tips, item):
+    directory, parser = item
+    if parser is None:
+        return Report([(CheckId.HAS_VALID_OPTIONS, INVALID_OPTIONS)])
+    check = build_check(parser, skipped_by_options(parser), cache, remote_tips)
+    return report_not_a_repository(check, directory)
+
+
+def batch_process(parser, cache, writer, remote_tips=None):
+    """Check every directory in the --batch file on one pool of threads, writing reports as they come.
+
+    Directories that ask for --verify-remotes share remote_tips, and with
+    it the batch's --remote-timeout and --remote-connections.
+    """
+    from check_project.batch import read_records
+    from check_project.scan import scan_directories
+    stop = threading.Event() if parser.stop_on_failure else None
+    if parser.batch == "-":
+        f = getattr(sys.stdin, "buffer", sys.stdin)
+    else:
+        f = open(parser.batch, "rb")
+    try:
+        records = read_records(f, b"\0" if parser.null else b"\n")
+        parsed = {}
+        items = (batch_item(parser, parsed, record) for record in records)
+        check = functools.partial(check_batch_item, cache, remote_tips)
+        if stop is not None:
+            check = functools.partial(stop_on_failure, check, stop)
+        exit_code = 0
+        for (directory, _), report in scan_directories(items, check, parser.jobs, stop,
+                                                       ordered=parser.format == "text"):
+            writer.report(report, directory)
+            exit_code = max(exit_code, generate_exit_code(report))
+    finally:
+        if parser.batch != "-":
+            f.close()
+    return exit_code
+
+
+def start_process(args, write=None, write_profile=None):
+    """Check the projects args asks for, and return the exit code and the lines of output.
+
+    If write is given, each line is passed to it as soon as it's ready
+    instead.  The --profile summary comes after the reports, unless
+    write_profile is given, when it's passed to that a line at a time, so
+    it can be kept apart from them.
+    """
+    parser = parse_args(args)
+    output = []
+    timings = Timings() if parser.format != "text" else None
+    writer = OutputWriter(parser, write or output.append, timings, show_directory=True)
+    if parser.diff:
+        from check_project.state import RunState
+        writer = DiffWriter(parser, writer, RunState(parser.state_file, state_scope(parser)))
+
+    with contextlib.ExitStack() as listeners:
+        if timings is not None:
+            listeners.enter_context(timings)
+        if parser.profile or parser.profile_json:
+            profiler = listeners.enter_context(Profiler())
+        exit_code = run_process(parser, writer)
+        writer.close()
+    if parser.new_failures_only:
+        exit_code = 3 if writer.new_failures else 0
+
+    if parser.profile:
+        summary = [""] + profiler.summary()
+        if write_profile is None:
+            output = output + summary
+        else:
+            for line in summary:
+                write_profile(line)
+    if parser.profile_json:
+        with open(parser.profile_json, "w") as f:
+            profiler.dump(f)
     return exit_code, output
 
 
+def watch_process(parser, checks, writer):
+    from check_project.watch import make_watcher, Watch
+    # Our own git status must not rewrite the index, or we'd see it change
+    # and check again, forever.
+    os.environ.setdefault("GIT_OPTIONAL_LOCKS", "0")
+    status = status_for(parser)
+
+    def check(project, only):
+        return check_project(project, checks, parser.ignore_unpushed_if_no_remotes,
+                             show_changes=changes_to_show(parser), only=only, status=status)
+
+    watch = Watch(get_directories(parser), check, project_class_for(parser.backend),
+                  make_watcher(parser.watch_interval))
+    try:
+        changed = watch.start()
+        while True:
+            for directory in changed:
+                writer.report(watch.reports[directory], directory)
+            changed = watch.step()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watch.close()
+    return max([generate_exit_code(report) for report in watch.reports.values()] or [0])
+
+
+def run_process(parser, writer):
+    checks = skipped_by_options(parser)
+    if parser.watch:
+        return watch_process(parser, checks, writer)
+    with contextlib.ExitStack() as resources:
+        cache = None
+        if not parser.no_cache:
+            # Closing it closes the connections every thread that checked a project opened.
+            cache = resources.enter_context(ResultCache(parser.cache_file, parser.cache_size))
+        remote_tips = None
+        if parser.verify_remotes or parser.batch:
+            from check_project.lsremote import RemoteTips
+            remote_tips = RemoteTips(parser.remote_timeout, parser.remote_connections)
+            resources.callback(remote_tips.close)
+        if parser.batch:
+            return batch_process(parser, cache, writer, remote_tips)
+        if len(parser.directories) > 1 or parser.roots:
+            return scan_process(parser, checks, cache, writer, remote_tips)
+
+        report = build_check(parser, checks, cache, remote_tips)(parser.directory)
+    writer.show_directory = False
+    writer.report(report, parser.directory)
+
+    return generate_exit_code(report)
+
+
+def print_line(line):
+    print(line)
+    sys.stdout.flush()
+
+
+def print_error_line(line):
+    print(line, file=sys.stderr)
+
+
 def main(args=None):
     if args is None:
         args = sys.argv[1:]
-    return_code, output = start_process(args)
+    # The --profile summary goes to stderr, so it doesn't get mixed up with the reports, like --format json.
+    return_code, output = start_process(args, write=print_line, write_profile=print_error_line)
     for line in output:
         print(line)
     sys.exit(return_code)
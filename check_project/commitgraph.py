@@ -0,0 +1,239 @@
+"""Answer "is this commit in the history of that one?" from git's commit-graph files.
+
+git can write the parents of every commit into a commit-graph file (in
+objects/info/commit-graph, or as a chain of them in
+objects/info/commit-graphs), so that walking history doesn't mean
+unpacking commits.  We read the same files, which lets us tell whether a
+branch has been pushed without running git at all.  Anything the graph
+doesn't cover, like commits made since it was written, gets an answer of
+None, and the caller should ask git.
+
+The format is described in git's Documentation/gitformat-commit-graph.txt.
+"""
+import bisect
+import mmap
+import os
+import struct
+import threading
+
+__author__ = 'wolf'
+
+SIGNATURE = b"CGPH"
+HASH_LENGTHS = {1: 20, 2: 32}
+PARENT_NONE = 0x70000000
+EXTRA_EDGES_NEEDED = 0x80000000
+LAST_EDGE = 0x80000000
+GENERATION_MAX = 0x3FFFFFFF
+
+# Don't walk more than this many commits before giving up and asking git.
+MAX_WALK = 200000
+
+
+class UnreadableCommitGraph(Exception):
+    pass
+
+
+class CommitGraphFile(object):
+    """One commit-graph file, mapped into memory."""
+
+    def __init__(self, filename):
+        with open(filename, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:4] != SIGNATURE or self.data[4] != 1:
+            raise UnreadableCommitGraph("{0} isn't a version 1 commit-graph.".format(filename))
+        self.hash_length = HASH_LENGTHS.get(self.data[5])
+        if self.hash_length is None:
+            raise UnreadableCommitGraph("{0} uses an unknown hash.".format(filename))
+        chunk_count = self.data[6]
+
+        self.chunks = {}
+        for n in range(chunk_count):
+            chunk_id, offset = struct.unpack_from(">4sQ", self.data, 8 + 12 * n)
+            self.chunks[chunk_id] = offset
+        for chunk_id in (b"OIDF", b"OIDL", b"CDAT"):
+            if chunk_id not in self.chunks:
+                raise UnreadableCommitGraph("{0} has no {1} chunk.".format(filename, chunk_id.decode("ascii")))
+
+        self.fanout = struct.unpack_from(">256I", self.data, self.chunks[b"OIDF"])
+        self.count = self.fanout[255]
+        self.oids = self.chunks[b"OIDL"]
+        self.commit_data = self.chunks[b"CDAT"]
+        self.extra_edges = self.chunks.get(b"EDGE")
+
+    def oid(self, n):
+        start = self.oids + n * self.hash_length
+        return self.data[start:start + self.hash_length]
+
+    def find(self, oid):
+        """Return the position of the binary object ID oid in this file, or None."""
+        low = self.fanout[oid[0] - 1] if oid[0] else 0
+        high = self.fanout[oid[0]]
+        n = bisect.bisect_left(_Oids(self), oid, low, high)
+        if n < high and self.oid(n) == oid:
+            return n
+        return None
+
+    def close(self):
+        self.data.close()
+
+
+class _Oids(object):
+    # Just enough of a sequence for bisect to search a CommitGraphFile's OIDL chunk.
+
+    def __init__(self, graph_file):
+        self.graph_file = graph_file
+
+    def __getitem__(self, n):
+        return self.graph_file.oid(n)
+
+    def __len__(self):
+        return self.graph_file.count
+
+
+class CommitGraph(object):
+    """All the commit-graph files for an object directory, as one graph.
+
+    In a chain, positions count up through the base file first, and a
+    commit's parents can be anywhere earlier in the chain.
+    """
+
+    def __init__(self, files):
+        self.files = files
+        self.offsets = []
+        offset = 0
+        for graph_file in files:
+            self.offsets.append(offset)
+            offset += graph_file.count
+
+    def position(self, sha):
+        """Return the position of the commit with the hex ID sha, or None if it isn't in the graph."""
+        if isinstance(sha, str):
+            sha = sha.encode("ascii")
+        try:
+            oid = bytes.fromhex(sha.decode("ascii"))
+        except ValueError:
+            return None
+        for graph_file, offset in zip(self.files, self.offsets):
+            if len(oid) != graph_file.hash_length:
+                return None
+            n = graph_file.find(oid)
+            if n is not None:
+                return offset + n
+        return None
+
+    def locate(self, position):
+        n = bisect.bisect_right(self.offsets, position) - 1
+        return self.files[n], position - self.offsets[n]
+
+    def parents(self, position):
+        graph_file, n = self.locate(position)
+        start = graph_file.commit_data + n * (graph_file.hash_length + 16) + graph_file.hash_length
+        first, second = struct.unpack_from(">II", graph_file.data, start)
+        parents = []
+        if first != PARENT_NONE:
+            parents.append(first)
+        if second & EXTRA_EDGES_NEEDED:
+            edge = graph_file.extra_edges + 4 * (second & ~EXTRA_EDGES_NEEDED)
+            while True:
+                value, = struct.unpack_from(">I", graph_file.data, edge)
+                parents.append(value & ~LAST_EDGE)
+                if value & LAST_EDGE:
+                    break
+                edge += 4
+        elif second != PARENT_NONE:
+            parents.append(second)
+        return parents
+
+    def generation(self, position):
+        """The commit's topological level, or 0 if the graph doesn't say."""
+        graph_file, n = self.locate(position)
+        start = graph_file.commit_data + n * (graph_file.hash_length + 16) + graph_file.hash_length + 8
+        value, = struct.unpack_from(">I", graph_file.data, start)
+        return value >> 2
+
+    def reaches(self, shas, target):
+        """Return whether the commit target is in the history of any of the commits shas.
+
+        Returns None if the graph can't say, because target or one of shas
+        isn't in it.
+        """
+        goal = self.position(target)
+        if goal is None:
+            return None
+        goal_generation = self.generation(goal)
+        # A commit can only reach commits at a lower level than its own.
+        prune = 0 < goal_generation < GENERATION_MAX
+
+        starts = []
+        unknown = False
+        for sha in shas:
+            position = self.position(sha)
+            if position is None:
+                unknown = True
+            else:
+                starts.append(position)
+
+        seen = set()
+        pending = starts
+        while pending:
+            position = pending.pop()
+            if position == goal:
+                return True
+            if position in seen:
+                continue
+            seen.add(position)
+            if len(seen) > MAX_WALK:
+                return None
+            if prune:
+                generation = self.generation(position)
+                if generation and generation <= goal_generation:
+                    continue
+            pending.extend(self.parents(position))
+        return None if unknown else False
+
+    def close(self):
+        for graph_file in self.files:
+            graph_file.close()
+
+
+def graph_files(objects):
+    """Return the commit-graph files for an object directory, base first, or [] if there aren't any."""
+    single = os.path.join(objects, "info", "commit-graph")
+    chain = os.path.join(objects, "info", "commit-graphs", "commit-graph-chain")
+    try:
+        with open(chain) as f:
+            hashes = [line.strip() for line in f if line.strip()]
+        return [os.path.join(objects, "info", "commit-graphs", "graph-{0}.graph".format(h)) for h in hashes]
+    except (IOError, OSError):
+        pass
+    if os.path.isfile(single):
+        return [single]
+    return []
+
+
+_graphs = {}
+_graphs_lock = threading.Lock()
+
+
+def load_commit_graph(objects):
+    """Return the CommitGraph for an object directory, or None if it hasn't got one we can read.
+
+    Graphs are kept, and shared by every repository that uses the object
+    directory (say, as an alternate), until their files change.
+    """
+    filenames = graph_files(objects)
+    if not filenames:
+        return None
+    try:
+        key = tuple((filename, os.stat(filename).st_mtime_ns, os.stat(filename).st_size) for filename in filenames)
+    except OSError:
+        return None
+    with _graphs_lock:
+        if _graphs.get(objects, (None, None))[0] == key:
+            return _graphs[objects][1]
+        try:
+            graph = CommitGraph([CommitGraphFile(filename) for filename in filenames])
+        except (IOError, OSError, ValueError, struct.error, UnreadableCommitGraph):
+            graph = None
+        _graphs[objects] = (key, graph)
+        return graph
@@ -0,0 +1,57 @@
+import fnmatch
+import os
+
+__author__ = 'wolf'
+
+
+def is_excluded(name, relative_path, exclude):
+    for pattern in exclude:
+        if fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(relative_path, pattern):
+            return True
+    return False
+
+
+def find_repositories(root, exclude=(), max_depth=None, nested=False):
+    """Yield the working directory of every git repository under root, as we find them.
+
+    We don't descend into a repository once we've found its .git, unless
+    nested is true, in which case submodules and repositories inside other
+    repositories are found too.  Directories whose name or path relative
+    to root matches one of the exclude globs are skipped, and so is
+    anything more than max_depth directories below root.  Symlinks to
+    directories aren't followed.
+
+    Repositories come out in sorted order for each directory, so the same
+    tree always gives the same order.  This is a generator, so whoever is
+    checking the repositories can start before the walk is finished.
+    """
+    root = os.path.abspath(os.path.expanduser(root))
+    stack = [(root, "", 0)]
+    while stack:
+        path, relative_path, depth = stack.pop()
+        try:
+            # We only ever need to know the type of an entry, which scandir
+            # usually gets for free, so there's no stat() per entry.
+            entries = sorted(os.scandir(path), key=lambda entry: entry.name)
+        except OSError:
+            continue
+
+        subdirectories = []
+        is_repository = False
+        for entry in entries:
+            if entry.name == ".git":
+                is_repository = True
+            elif entry.is_dir(follow_symlinks=False):
+                subdirectories.append(entry)
+
+        if is_repository:
+            yield path
+            if not nested:
+                continue
+
+        if max_depth is not None and depth >= max_depth:
+            continue
+        for entry in reversed(subdirectories):
+            entry_relative_path = os.path.join(relative_path, entry.name)
+            if not is_excluded(entry.name, entry_relative_path, exclude):
+                stack.append((entry.path, entry_relative_path, depth + 1))
@@ -0,0 +1,49 @@
+"""Find files like README and LICENSE at the top of a project, in one pass.
+
+A pattern is a prefix, like "README", which matches README, README.md and
+README.rst, or, if it has any of *?[ in it, an fnmatch pattern, like
+"LICEN[CS]E*".  Reading the directory once with os.scandir answers any
+number of patterns, and only the files that match one are stat()ed, to
+see whether they're empty.
+"""
+import fnmatch
+import os
+
+__author__ = 'wolf'
+
+# What a snapshot looks for the first time it's asked about any file, so
+# that the README check, the LICENSE check and any others share one pass.
+FILE_PATTERNS = ["README", "LICENSE", "CONTRIBUTING", "CHANGELOG", "SECURITY", "CODE_OF_CONDUCT"]
+
+
+def scan_directory(path):
+    """Return the os.DirEntry objects for path, sorted by name."""
+    with os.scandir(path) as entries:
+        return sorted(entries, key=lambda entry: entry.name)
+
+
+def matches(name, pattern):
+    if any(c in pattern for c in "*?["):
+        return fnmatch.fnmatchcase(name, pattern)
+    return name.startswith(pattern)
+
+
+def find_nonempty_files(entries, patterns):
+    """Return {pattern: [the names of the non-empty files matching it, in the order of entries]}.
+
+    Directories, and anything that can't be stat()ed, like a broken
+    symlink, don't count.
+    """
+    found = dict((pattern, []) for pattern in patterns)
+    for entry in entries:
+        matching = [pattern for pattern in found if matches(entry.name, pattern)]
+        if not matching:
+            continue
+        try:
+            if not entry.is_file() or entry.stat().st_size == 0:
+                continue
+        except OSError:
+            continue
+        for pattern in matching:
+            found[pattern].append(entry.name)
+    return found
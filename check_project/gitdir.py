@@ -0,0 +1,242 @@
+"""Read a git repository's refs and config straight from its .git directory.
+
+This only understands the plain files git has always written: loose refs,
+packed-refs and the config file.  Anything it can't read with confidence,
+like a reftable ref store or a config that includes other files
+conditionally, raises UnreadableGitDir so the caller can ask git instead.
+"""
+import os
+import re
+
+__author__ = 'wolf'
+
+SECTION = re.compile(r'^\s*\[\s*([-.\w]+)(?:\s+"((?:[^"\\]|\\.)*)")?\s*\]')
+KEY = re.compile(r'^\s*([-\w]+)\s*(=)?')
+ESCAPES = {'"': '"', '\\': '\\', 'n': '\n', 't': '\t', 'b': '\b'}
+
+
+class UnreadableGitDir(Exception):
+    pass
+
+
+class GitDir(object):
+    """A repository's git directory, and what kind of repository it is.
+
+    work_tree is None for a bare repository.  common_dir is where the refs
+    and objects are, which is somewhere else for a worktree made with `git
+    worktree add`.  superproject is the work tree of the repository this
+    one is a submodule of, if it is one.
+    """
+
+    def __init__(self, git_dir, common_dir=None, work_tree=None, superproject=None):
+        self.git_dir = git_dir
+        self.common_dir = common_dir or git_dir
+        self.work_tree = work_tree
+        self.superproject = superproject
+
+    @property
+    def bare(self):
+        return self.work_tree is None
+
+    @property
+    def is_worktree(self):
+        return os.path.normpath(self.common_dir) != os.path.normpath(self.git_dir)
+
+    @property
+    def is_submodule(self):
+        return self.superproject is not None
+
+    def __str__(self):
+        return "<GitDir '{0}'>".format(self.git_dir)
+
+    def path(self, *parts):
+        return os.path.join(self.common_dir, *parts)
+
+    def read_refs(self, prefixes=(b"refs/",)):
+        """Return {refname: sha} for the refs starting with any of prefixes.
+
+        Symbolic refs, like refs/remotes/origin/HEAD, are left out.
+        """
+        if os.path.exists(self.path("reftable")):
+            raise UnreadableGitDir("{0} uses reftable.".format(self.common_dir))
+
+        refs = {}
+        try:
+            with open(self.path("packed-refs"), "rb") as f:
+                for line in f:
+                    if line.startswith((b"#", b"^")):
+                        continue
+                    sha, refname = line.rstrip(b"\n").split(b" ", 1)
+                    if refname.startswith(prefixes):
+                        refs[refname] = sha
+        except (IOError, OSError):
+            pass
+
+        # Loose refs win over packed ones.
+        refs_dir = self.path("refs")
+        for dirpath, dirnames, filenames in os.walk(refs_dir):
+            for filename in filenames:
+                full_path = os.path.join(dirpath, filename)
+                refname = os.fsencode(os.path.relpath(full_path, self.common_dir).replace(os.sep, "/"))
+                if not refname.startswith(prefixes):
+                    continue
+                with open(full_path, "rb") as f:
+                    contents = f.read().strip()
+                if contents and not contents.startswith(b"ref:"):
+                    refs[refname] = contents
+        return refs
+
+    def has_ref(self, refname):
+        if os.path.exists(self.path("reftable")):
+            raise UnreadableGitDir("{0} uses reftable.".format(self.common_dir))
+        if os.path.isfile(self.path(*refname.split("/"))):
+            return True
+        return refname.encode("utf-8") in self.read_refs((refname.encode("utf-8"),))
+
+    def read_config(self):
+        """Return a list of (section, subsection, key, value) from the repository's config."""
+        return read_config_file(self.path("config"))
+
+    def get_remotes(self):
+        remotes = set()
+        for section, subsection, key, value in self.read_config():
+            if section == "remote" and subsection is not None:
+                remotes.add(subsection.encode("utf-8"))
+        return sorted(remotes)
+
+    def get_remote_urls(self):
+        """Return {remote name: URL}, taking the first URL of a remote that has several."""
+        urls = {}
+        for section, subsection, key, value in self.read_config():
+            if section == "remote" and subsection is not None and key == "url" and value:
+                urls.setdefault(subsection.encode("utf-8"), value)
+        return urls
+
+    def object_directories(self):
+        """Return the repository's object directory, followed by its alternates and theirs."""
+        directories = []
+        pending = [self.path("objects")]
+        while pending:
+            directory = os.path.normpath(pending.pop(0))
+            if directory in directories:
+                continue
+            directories.append(directory)
+            try:
+                with open(os.path.join(directory, "info", "alternates")) as f:
+                    lines = f.read().splitlines()
+            except (IOError, OSError):
+                continue
+            for line in lines:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    pending.append(os.path.join(directory, line))
+        return directories
+
+
+def read_config_file(filename, depth=0):
+    if depth > 10:
+        raise UnreadableGitDir("{0} includes too many other configs.".format(filename))
+
+    entries = []
+    section = subsection = None
+    with open(filename) as f:
+        for line in f:
+            match = SECTION.match(line)
+            if match:
+                section, subsection = match.group(1).lower(), match.group(2)
+                if subsection is None and "." in section:
+                    # The deprecated [section.subsection] syntax.
+                    section, subsection = section.split(".", 1)
+                line = line[match.end():]
+            match = KEY.match(line)
+            if not match or section is None:
+                continue
+            key = match.group(1).lower()
+            value = parse_value(line[match.end():], filename) if match.group(2) else None
+            if section == "includeif":
+                raise UnreadableGitDir("{0} has conditional includes.".format(filename))
+            if section == "include" and key == "path" and value:
+                included = os.path.join(os.path.dirname(filename), os.path.expanduser(value))
+                if os.path.exists(included):
+                    entries.extend(read_config_file(included, depth + 1))
+                continue
+            entries.append((section, subsection, key, value))
+    return entries
+
+
+def parse_value(text, filename):
+    """Parse a config value the way git does.
+
+    Double quotes keep whitespace and comment characters, backslash
+    escapes work inside and out of them, and outside of quotes a # or ;
+    starts a comment.  A value continued onto the next line is more than
+    we bother with.
+    """
+    value = []
+    pending_space = ""
+    quoted = False
+    chars = iter(text.rstrip("\r\n").lstrip())
+    for char in chars:
+        if not quoted and char in " \t":
+            pending_space += char
+            continue
+        if not quoted and char in "#;":
+            break
+        if value or quoted:
+            value.append(pending_space)
+        pending_space = ""
+        if char == '"':
+            quoted = not quoted
+        elif char == "\\":
+            escaped = next(chars, None)
+            if escaped not in ESCAPES:
+                raise UnreadableGitDir("{0} has a value we can't read.".format(filename))
+            value.append(ESCAPES[escaped])
+        else:
+            value.append(char)
+    if quoted:
+        raise UnreadableGitDir("{0} has an unterminated quote.".format(filename))
+    return "".join(value)
+
+
+def find_git_dir(path):
+    """Find the GitDir for the repository containing path, or None.
+
+    Like git, we look in path and then each of its parents, and follow
+    the "gitdir:" files that worktrees and submodules use in place of a
+    .git directory.
+    """
+    path = os.path.abspath(path)
+    while True:
+        dot_git = os.path.join(path, ".git")
+        if os.path.isdir(dot_git):
+            return GitDir(dot_git, work_tree=path)
+        if os.path.isfile(dot_git):
+            return read_git_file(dot_git)
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+def read_git_file(dot_git):
+    with open(dot_git) as f:
+        contents = f.read().strip()
+    if not contents.startswith("gitdir:"):
+        raise UnreadableGitDir("{0} doesn't point to a git directory.".format(dot_git))
+    git_dir = os.path.join(os.path.dirname(dot_git), contents[len("gitdir:"):].strip())
+    git_dir = os.path.normpath(git_dir)
+
+    common_dir = None
+    try:
+        with open(os.path.join(git_dir, "commondir")) as f:
+            common_dir = os.path.normpath(os.path.join(git_dir, f.read().strip()))
+    except (IOError, OSError):
+        pass
+
+    # A submodule's git directory is kept in its superproject's, under modules.
+    superproject = None
+    marker = os.sep + os.path.join(".git", "modules") + os.sep
+    if marker in git_dir + os.sep and common_dir is None:
+        superproject = (git_dir + os.sep).split(marker, 1)[0]
+    return GitDir(git_dir, common_dir, os.path.dirname(dot_git), superproject)
@@ -1,5 +1,15 @@
+import contextlib
+import functools
+import itertools
 import os
 import subprocess
+import tempfile
+from check_project.catfile import CatFile
+from check_project.instrument import instrumented, timed
+from check_project.gitdir import GitDir, find_git_dir, UnreadableGitDir
+from check_project.reachability import unpushed_branches
+from check_project.report import CheckResult
+from check_project.snapshot import GitSnapshot, iter_porcelain_v2
 
 __author__ = 'wolf'
 
@@ -8,106 +18,519 @@ class GitProjectException(Exception):
     pass
 
 
+class GitCommandError(subprocess.CalledProcessError):
+    """A git command that failed.  What git said on standard error is kept in stderr, and shown in the message."""
+
+    def __str__(self):
+        message = super(GitCommandError, self).__str__()
+        said = (self.stderr or b"").decode("utf-8", "replace").strip()
+        return "{0}  git said: {1}".format(message, said) if said else message
+
+
+_builtin_fsmonitor = None
+
+
+def has_builtin_fsmonitor():
+    """Return whether this git has a file system monitor of its own (git 2.36 and later, on macOS and Windows)."""
+    global _builtin_fsmonitor
+    if _builtin_fsmonitor is None:
+        try:
+            output = subprocess.check_output(('git', 'version', '--build-options'), stderr=subprocess.STDOUT)
+        except (OSError, subprocess.CalledProcessError):
+            output = b""
+        _builtin_fsmonitor = b"feature: fsmonitor--daemon" in output
+    return _builtin_fsmonitor
+
+
+def status_arguments(untracked=None, fast=False):
+    """Return the git arguments that list the uncommitted changes.
+
+    untracked is given to --untracked-files: "no" doesn't look for
+    untracked files at all, and "normal" doesn't look inside untracked
+    directories.  fast lets git keep an untracked cache and a split index
+    in .git, and run its own file system monitor where it has one, so that
+    it doesn't have to look at every file every time, and skips finding
+    renames, which don't change the answer.
+    """
+    arguments = ()
+    if fast:
+        arguments += ('-c', 'core.untrackedCache=true', '-c', 'core.splitIndex=true')
+        if has_builtin_fsmonitor():
+            arguments += ('-c', 'core.fsmonitor=true')
+    arguments += ('status', '--porcelain=v2', '-z')
+    if untracked:
+        arguments += ('--untracked-files=' + untracked,)
+    if fast:
+        arguments += ('--no-renames',)
+    return arguments
+
+
+# What validate() asks `git rev-parse`.  --show-cdup only answers inside a
+# work tree, and --show-superproject-working-tree only inside a submodule,
+# so they come last.
+REV_PARSE_LAYOUT = ('rev-parse', '--absolute-git-dir', '--git-common-dir', '--is-bare-repository',
+                    '--is-inside-work-tree', '--show-cdup', '--show-superproject-working-tree')
+
+
+def parse_layout(output, path):
+    """Return the GitDir described by the output of `git REV_PARSE_LAYOUT` run in path."""
+    lines = output.decode("utf-8", "surrogateescape").split("\n")
+    git_dir, common_dir, bare, inside_work_tree = lines[:4]
+    rest = lines[4:]
+    work_tree = None
+    if inside_work_tree == "true":
+        work_tree = os.path.normpath(os.path.join(path, rest.pop(0)))
+    superproject = rest[0] if rest and rest[0] else None
+    return GitDir(git_dir, os.path.normpath(os.path.join(path, common_dir)),
+                  None if bare == "true" else work_tree, superproject)
+
+
 class GitProject:
     def __init__(self, path):
         self.path = os.path.abspath(os.path.expanduser(path))
+        self.snapshot = None
+        self.repository = None
+        self.cat_file = CatFile(self.path)
 
         if not os.path.isdir(self.path):
-            raise Exception("Path must exist.")
+            raise GitProjectException("Path {0} doesn't exist.".format(self.path))
+
+        self.validate()
+
+    def validate(self):
+        """Make sure path is in a git repository, and set repository to the GitDir describing it.
 
+        `git rev-parse` answers without looking at the working tree, so this
+        is quick however big the project is.
+        """
         try:
-            subprocess.check_output(('git', 'status', '--porcelain'),
-                                    stderr=subprocess.STDOUT,
-                                    cwd=self.path)
+            with timed("git", ('git',) + REV_PARSE_LAYOUT, self.path) as event:
+                output = subprocess.check_output(('git',) + REV_PARSE_LAYOUT,
+                                                 stderr=subprocess.PIPE,
+                                                 cwd=self.path)
+                event.exit_status = 0
+            self.repository = parse_layout(output, self.path)
 
         except subprocess.CalledProcessError as e:
-            print(type(e.output))
-            if "fatal: Not a git repository (or any of the parent directories)" in e.output.decode('utf-8'):
+            # Older versions of git capitalize this message, newer ones don't.
+            if "not a git repository" in (e.stderr or b"").decode('utf-8', 'replace').lower():
                 raise GitProjectException("Path {0} is not a git repository.".format(self.path))
-            else:
-                raise
+            raise GitCommandError(e.returncode, e.cmd, output=e.output, stderr=e.stderr)
 
     def __str__(self):
         return u"<Project '{0}'>".format(self.path)
 
+    def close(self):
+        """Stop the git processes kept running for this project.  Only needed if some were started."""
+        self.cat_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def git(self, *args, **kwargs):
+        """Return git's output.  If input is given, it's written to git's standard input.
+
+        Warnings git writes to standard error are left out of the output;
+        if git fails, they're in the GitCommandError.
+        """
+        command = ('git',) + args
+        with timed("git", command, self.path) as event:
+            process = subprocess.run(command,
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.PIPE,
+                                     cwd=self.path,
+                                     input=kwargs.get("input"))
+            if process.returncode:
+                raise GitCommandError(process.returncode, command, output=process.stdout, stderr=process.stderr)
+            event.output_bytes = len(process.stdout)
+            event.exit_status = 0
+        return process.stdout
+
+    def git_records(self, *args, **kwargs):
+        """Yield git's output a record at a time, as git writes it.
+
+        Records are separated by separator, which defaults to a newline.
+        If the caller stops iterating (or closes the generator) before git
+        is done, git is killed rather than left to finish.  Standard error
+        goes to a file of its own, so a warning can't end up in a record or
+        fill a pipe nobody's reading; if git fails, it's in the
+        GitCommandError.
+        """
+        separator = kwargs.get("separator", b"\n")
+        command = ('git',) + args
+        with timed("git", command, self.path) as event, tempfile.TemporaryFile() as errors:
+            process = subprocess.Popen(command,
+                                       stdout=subprocess.PIPE,
+                                       stderr=errors,
+                                       cwd=self.path)
+            finished = False
+            event.output_bytes = 0
+            try:
+                buffered = b""
+                while True:
+                    chunk = os.read(process.stdout.fileno(), 65536)
+                    if not chunk:
+                        break
+                    event.output_bytes += len(chunk)
+                    records = (buffered + chunk).split(separator)
+                    buffered = records.pop()
+                    for record in records:
+                        yield record
+                if buffered:
+                    yield buffered
+                finished = True
+            finally:
+                if not finished:
+                    process.kill()
+                process.stdout.close()
+                event.exit_status = process.wait()
+            if event.exit_status:
+                errors.seek(0)
+                raise GitCommandError(event.exit_status, command, output=b"", stderr=errors.read())
+
+    def take_snapshot(self, status=None):
+        """Answer the get_* and has_* questions from one GitSnapshot until the next snapshot is taken.
+
+        status is how to ask git for the uncommitted changes, from
+        status_arguments(), if not the usual way.
+        """
+        self.snapshot = GitSnapshot(self, status)
+        return self.snapshot
+
+    def read_refs(self):
+        """Return {refname: sha} for the branches, the remote-tracking branches and the stash."""
+        output = self.git('for-each-ref', '--format=%(objectname) %(refname)',
+                          'refs/heads', 'refs/remotes', 'refs/stash')
+        refs = {}
+        for line in output.splitlines():
+            sha, refname = line.split(b" ", 1)
+            refs[refname] = sha
+        return refs
+
+    def read_remotes(self):
+        return self.git('remote').splitlines()
+
+    def read_remote_urls(self):
+        """Return {remote name: URL}."""
+        try:
+            output = self.git('config', '--get-regexp', r'^remote\..*\.url$')
+        except subprocess.CalledProcessError as e:
+            if e.returncode == 1:  # there aren't any
+                return {}
+            raise
+        urls = {}
+        for line in output.splitlines():
+            key, _, url = line.partition(b" ")
+            urls.setdefault(key[len(b"remote."):-len(b".url")], url.decode("utf-8"))
+        return urls
+
     def has_git_stash(self):
-        output = subprocess.check_output(('git', 'stash', 'list'),
-                                         stderr=subprocess.STDOUT,
-                                         cwd=self.path)
+        if self.snapshot is not None:
+            return self.snapshot.has_stash
+
+        output = self.git('stash', 'list')
 
         if output:
             return True
         else:
             return False
 
-    def has_file_starting_with(self, prefix):
-        for filename in os.listdir(self.path):
-            if filename.startswith(prefix) and os.path.getsize(os.path.join(self.path, filename)) != 0:
-                return filename
-        return False
+    def find_nonempty_files(self, patterns, tracked=False):
+        """Return {pattern: the first non-empty file at the top of the project matching it, or False}.
+
+        All of patterns are answered from one read of the directory.  With
+        tracked, only files git tracks count.
+        """
+        return (self.snapshot or GitSnapshot(self)).nonempty_files(patterns, tracked)
+
+    def tracked_files(self, names):
+        """Return {name: whether git has it in the index} for the files at the top of the project."""
+        info = self.cat_file.info(b":" + os.fsencode(name) for name in names)
+        return dict((name, answer is not None) for name, answer in zip(names, info))
 
-    def get_uncommitted_changes(self):
-        git_status = subprocess.check_output(('git', 'status', '--porcelain'),
-                                             stderr=subprocess.STDOUT,
-                                             cwd=self.path)
+    def has_file_starting_with(self, prefix, tracked=False):
+        return self.find_nonempty_files([prefix], tracked)[prefix]
 
-        entries = []
-        for line in git_status.splitlines():
-            entries.append(line[3:])
-        return entries
+    def stream_uncommitted_changes(self, limit=None, status=None):
+        """Return the first limit uncommitted changes (or all of them), stopping git once we have them.
+
+        Only the changes we keep are ever held in memory, so asking for a
+        few in a working tree with hundreds of thousands of untracked files
+        is cheap.  status is the git arguments to use, from
+        status_arguments().
+        """
+        if self.repository is not None and self.repository.bare:
+            return []  # there's no working tree to have changes in
+        records = self.git_records(*(status or status_arguments()), separator=b"\0")
+        with contextlib.closing(records):
+            return list(itertools.islice(iter_porcelain_v2(records), limit))
+
+    def has_uncommitted_changes(self):
+        if self.snapshot is not None:
+            return self.snapshot.has_uncommitted_changes
+        return bool(self.stream_uncommitted_changes(limit=1))
+
+    def get_uncommitted_changes(self, limit=None):
+        if self.snapshot is not None:
+            return list(self.snapshot.get_uncommitted_changes(limit))
+        return self.stream_uncommitted_changes(limit)
 
     def get_commits_not_pushed_to_existing_remotes(self):
+        if self.snapshot is not None:
+            return list(self.snapshot.unpushed_commits)
+        return self.log_unpushed_commits()
+
+    def log_unpushed_commits(self):
         # This does not get *all* unpushed commits, but it gets the most recent commit on each unpushed branch...
         # or something like that.
 
-        output = subprocess.check_output(('git', 'log', '--branches', '--not', '--remotes',
-                                          '--simplify-by-decoration', '--decorate', '--oneline'),
-                                         stderr=subprocess.STDOUT,
-                                         cwd=self.path)
+        output = self.git('log', '--branches', '--not', '--remotes',
+                          '--simplify-by-decoration', '--decorate', '--oneline')
         return output.splitlines()
 
+    def list_unpushed_tips(self):
+        """Return the set of commits that are the most recent unpushed commit on some branch.
+
+        Every branch tip that isn't in the history of a remote-tracking
+        branch is in it.
+        """
+        output = self.git('rev-list', '--branches', '--not', '--remotes', '--simplify-by-decoration')
+        return set(output.split())
+
+    def list_tips_not_in(self, shas):
+        """Return the set of branch tips that aren't in the history of any of the commits shas."""
+        revisions = b"".join(b"^" + sha + b"\n" for sha in shas)
+        output = self.git('rev-list', '--branches', '--simplify-by-decoration', '--stdin', input=revisions)
+        return set(output.split())
+
+    def commits_present(self, shas):
+        """Return the ones of shas this repository has."""
+        return set(info[0] for info in self.cat_file.info(sorted(shas))
+                   if info is not None and info[1] == b"commit")
+
+    def find_branches_missing_from_remotes(self, remote_tips):
+        """Ask every remote where its branches point, and return (missing, unsure, reasons).
+
+        missing are the branches no remote has.  unsure are the ones we
+        can't tell about, because some remote didn't answer or has commits
+        that haven't been fetched, and reasons says why.
+        """
+        from check_project.lsremote import resolve_url
+        refs = self.snapshot.refs if self.snapshot is not None else self.read_refs()
+        urls = self.snapshot.remote_urls if self.snapshot is not None else self.read_remote_urls()
+        resolved = dict((name, resolve_url(url, self.path)) for name, url in urls.items())
+        answers = remote_tips.tips(sorted(set(resolved.values())), self.path)
+
+        branches = dict((refname, sha) for refname, sha in refs.items() if refname.startswith(b"refs/heads/"))
+        live = {}
+        reasons = []
+        for name in sorted(resolved):
+            answer = answers[resolved[name]]
+            if isinstance(answer, Exception):
+                reasons.append("{0} couldn't be asked: {1}".format(name.decode("utf-8", "replace"), answer))
+                continue
+            for refname, sha in answer.items():
+                live[b"refs/remotes/" + name + b"/" + refname[len(b"refs/heads/"):]] = sha
+
+        tips = set(live.values())
+        present = tips & set(branches.values())
+        present |= self.commits_present(tips - present)
+        if present != tips:
+            reasons.append("the remotes have commits that haven't been fetched")
+
+        known = dict(branches)
+        known.update((refname, sha) for refname, sha in live.items() if sha in present)
+        unpushed = unpushed_branches(known, self.object_directories(),
+                                     lambda: self.list_tips_not_in(present))
+        if reasons:
+            return [], unpushed, reasons
+        return unpushed, [], reasons
+
+    def object_directories(self):
+        """Return the object directory and its alternates, where commit-graph files might be."""
+        if self.repository is not None:
+            return self.repository.object_directories()
+        try:
+            git_dir = find_git_dir(self.path)
+        except (IOError, OSError, UnreadableGitDir):
+            return []
+        return git_dir.object_directories() if git_dir is not None else []
+
     def get_remotes(self):
-        output = subprocess.check_output(('git', 'remote'),
-                                         stderr=subprocess.STDOUT,
-                                         cwd=self.path)
-        return output.splitlines()
+        if self.snapshot is not None:
+            return list(self.snapshot.remotes)
 
-    def check_for_nonempty_file(self, name):
-        result = self.has_file_starting_with(name)
-        if result:
-            return True, "{0} exists and isn't empty.".format(result)
-        else:
-            return False, "Either there isn't a file with a name starting with {0}, or it is empty.".format(name)
+        return self.read_remotes()
 
+    @instrumented("check")
+    def check_for_nonempty_file(self, name, tracked=False):
+        return nonempty_file_result(name, self.has_file_starting_with(name, tracked))
+
+    @instrumented("check")
     def check_git_stash(self):
-        if self.has_git_stash():
-            return False, "Run `git stash list` to see the stashes."
-        else:
-            return True, "The git stash is empty."
+        return stash_result(self.has_git_stash())
 
-    def check_uncommitted_changes(self):
-        uncommitted_changes = self.get_uncommitted_changes()
-        if uncommitted_changes:
-            return False, "Run `git status` to see the uncommitted changes."
-        else:
-            return True, "There are no uncommitted changes."
+    @instrumented("check")
+    def check_uncommitted_changes(self, sample=0):
+        """Check for uncommitted changes, naming up to sample of them in the message."""
+        return uncommitted_changes_result(self.get_uncommitted_changes(limit=max(sample, 1)), sample)
 
+    @instrumented("check")
     def check_remotes(self):
-        remotes = self.get_remotes()
-        if remotes:
-            return True, "There is at least one remote."
-        else:
-            return False, "There are no remotes."
+        return remotes_result(self.get_remotes())
 
+    @instrumented("check")
     def check_unpushed_commits(self):
         unpushed_commits = self.get_commits_not_pushed_to_existing_remotes()
         remotes = self.get_remotes()
+        return unpushed_commits_result(remotes, unpushed_commits)
+
+    @instrumented("check")
+    def check_remote_branches(self, remote_tips):
+        """Check every branch is on some remote, asking the remotes themselves through remote_tips."""
+        return remote_branches_result(*self.find_branches_missing_from_remotes(remote_tips))
+
+
+# The check_* methods are split from deciding what their answers mean, so
+# that anything else that gathers the same facts (like AsyncGitProject)
+# reports them the same way.
+
+NO_STASH = CheckResult(True, "The git stash is empty.")
+STASH = CheckResult(False, "Run `git stash list` to see the stashes.")
+NO_UNCOMMITTED_CHANGES = CheckResult(True, "There are no uncommitted changes.")
+UNCOMMITTED_CHANGES = CheckResult(False, "Run `git status` to see the uncommitted changes.")
+REMOTES = CheckResult(True, "There is at least one remote.")
+NO_REMOTES = CheckResult(False, "There are no remotes.")
+NO_UNPUSHED_COMMITS = CheckResult(True, "There are no unpushed commits.")
+UNPUSHED_COMMITS = CheckResult(False, "There are unpushed commits.")
+ALL_COMMITS_UNPUSHED = CheckResult(False, "There are no remotes, so all the commits are unpushed.")
+EVERY_BRANCH_ON_A_REMOTE = CheckResult(True, "The remotes have every branch.")
+
+
+@functools.lru_cache(maxsize=256)
+def nonempty_file_result(name, filename):
+    # There are only ever a few names (README.md, LICENSE...), so projects share these.
+    if filename:
+        return CheckResult(True, "{0} exists and isn't empty.", filename)
+    else:
+        return CheckResult(False, "Either there isn't a file with a name starting with {0}, or it is empty.", name)
+
+
+def stash_result(has_stash):
+    if has_stash:
+        return STASH
+    else:
+        return NO_STASH
+
+
+def uncommitted_changes_result(uncommitted_changes, sample=0):
+    if uncommitted_changes and sample:
+        return CheckResult(False, "Run `git status` to see the uncommitted changes, which include {0}.",
+                           ChangedPaths(uncommitted_changes[:sample]))
+    if uncommitted_changes:
+        return UNCOMMITTED_CHANGES
+    else:
+        return NO_UNCOMMITTED_CHANGES
+
+
+class ChangedPaths(object):
+    """Some paths from git status, which are only decoded and joined up if the message is read."""
 
-        if remotes and not unpushed_commits:
-            return True, "There are no unpushed commits."
+    __slots__ = ("paths",)
 
-        if remotes and unpushed_commits:
-            return False, "There are unpushed commits."
+    def __init__(self, paths):
+        self.paths = tuple(paths)
 
-        if not remotes:
-            return False, "There are no remotes, so all the commits are unpushed."
+    def __format__(self, spec):
+        return ", ".join(path.decode("utf-8", "replace") for path in self.paths)
+
+
+def remotes_result(remotes):
+    if remotes:
+        return REMOTES
+    else:
+        return NO_REMOTES
+
+
+def unpushed_commits_result(remotes, unpushed_commits):
+    if remotes and not unpushed_commits:
+        return NO_UNPUSHED_COMMITS
+
+    if remotes and unpushed_commits:
+        return UNPUSHED_COMMITS
+
+    if not remotes:
+        return ALL_COMMITS_UNPUSHED
+
+
+def branch_names(refnames):
+    return ", ".join(refname[len(b"refs/heads/"):].decode("utf-8", "replace") for refname in refnames)
+
+
+def remote_branches_result(missing, unsure, reasons):
+    if missing:
+        return CheckResult(False, "The remotes don't have {0}.", branch_names(missing))
+    if unsure:
+        return CheckResult(False, "Can't tell whether the remotes have {0}: {1}.", branch_names(unsure),
+                           "; ".join(reasons))
+    return EVERY_BRANCH_ON_A_REMOTE
+
+
+class FilesystemGitProject(GitProject):
+    """A GitProject that reads refs, remotes and the stash from the .git directory.
+
+    Only searching history for unpushed commits needs git itself, and even
+    that is skipped when every branch points at a remote-tracking branch.
+    Whenever the .git directory holds something we can't read ourselves,
+    we ask git like GitProject does.
+    """
+
+    def validate(self):
+        try:
+            self.git_dir = find_git_dir(self.path)
+        except (IOError, OSError, UnreadableGitDir):
+            self.git_dir = None
+        if self.git_dir is None:
+            # Either something's there that only git understands, or there's
+            # no .git at all, as in a bare repository.
+            GitProject.validate(self)
+            return
+        self.repository = self.git_dir
+
+    def read_refs(self):
+        if self.git_dir is not None:
+            try:
+                return self.git_dir.read_refs((b"refs/heads/", b"refs/remotes/", b"refs/stash"))
+            except (IOError, OSError, UnreadableGitDir):
+                pass
+        return GitProject.read_refs(self)
+
+    def read_remotes(self):
+        if self.git_dir is not None:
+            try:
+                return self.git_dir.get_remotes()
+            except (IOError, OSError, UnreadableGitDir):
+                pass
+        return GitProject.read_remotes(self)
+
+    def read_remote_urls(self):
+        if self.git_dir is not None:
+            try:
+                return self.git_dir.get_remote_urls()
+            except (IOError, OSError, UnreadableGitDir):
+                pass
+        return GitProject.read_remote_urls(self)
+
+    def object_directories(self):
+        if self.git_dir is None:
+            return GitProject.object_directories(self)
+        return self.git_dir.object_directories()
+
+    def has_git_stash(self):
+        return (self.snapshot or GitSnapshot(self)).has_stash
+
+    def get_commits_not_pushed_to_existing_remotes(self):
+        return list((self.snapshot or GitSnapshot(self)).unpushed_commits)
@@ -0,0 +1,253 @@
+"""Hooks for finding out where the time goes.
+
+Every git command a project runs, every check_* method, every check run
+by cli.check_project() and every cli.check_project() call is reported to the listeners added with
+add_listener() as an Event, once it's finished.  With no listeners, the
+only cost is reading the clock.
+
+    def show(event):
+        print(event.kind, event.name, event.path, event.duration)
+
+    instrument.add_listener(show)
+
+Listeners are called from whichever thread did the work, so they need to
+be thread-safe.  Profiler is a listener that collects everything for
+--profile.
+"""
+import collections
+import collections.abc
+import contextlib
+import functools
+import threading
+import time
+from check_project.report import CheckResult
+
+__author__ = 'wolf'
+
+_listeners = []
+_listeners_lock = threading.Lock()
+
+
+def add_listener(listener):
+    with _listeners_lock:
+        _listeners.append(listener)
+
+
+def remove_listener(listener):
+    with _listeners_lock:
+        _listeners.remove(listener)
+
+
+class Event(object):
+    """Something that took time.
+
+    kind is "git", "check", "category" or "project".  name is the git
+    command line, the name of the check_* method or function, or the
+    category of the check.  For git commands, output_bytes and exit_status
+    are filled in; for checks and projects, passed is.
+    """
+
+    def __init__(self, kind, name, path):
+        self.kind = kind
+        self.name = name
+        self.path = path
+        self.start = time.time()
+        self.duration = None
+        self.output_bytes = None
+        self.exit_status = None
+        self.passed = None
+        self.thread = threading.current_thread().name
+
+    def __str__(self):
+        return "<Event {0} {1!r} in '{2}'>".format(self.kind, self.name, self.path)
+
+    @classmethod
+    def from_dict(cls, fields):
+        """Return the Event that as_dict() turned into fields, like one sent back by a worker process."""
+        event = cls(fields["kind"], fields["name"], fields["path"])
+        for name, value in fields.items():
+            setattr(event, name, value)
+        return event
+
+    def as_dict(self):
+        return {"kind": self.kind,
+                "name": self.name,
+                "path": self.path,
+                "start": self.start,
+                "duration": self.duration,
+                "output_bytes": self.output_bytes,
+                "exit_status": self.exit_status,
+                "passed": self.passed,
+                "thread": self.thread}
+
+
+def listening():
+    """Return whether any listeners have been added."""
+    return bool(_listeners)
+
+
+def emit(event):
+    with _listeners_lock:
+        listeners = list(_listeners)
+    for listener in listeners:
+        listener(event)
+
+
+@contextlib.contextmanager
+def timed(kind, name, path):
+    """Time the body of the with statement and report it to the listeners as an Event.
+
+    A CalledProcessError escaping the body has its exit status and output
+    recorded before it carries on.
+    """
+    event = Event(kind, name, path)
+    start = time.perf_counter()
+    try:
+        yield event
+    except Exception as e:
+        import subprocess  # not at the top, so --help doesn't pay for it
+        if isinstance(e, subprocess.CalledProcessError):
+            event.exit_status = e.returncode
+            event.output_bytes = len(e.output or b"") + len(e.stderr or b"")
+        raise
+    finally:
+        event.duration = time.perf_counter() - start
+        if _listeners:
+            emit(event)
+
+
+def instrumented(kind):
+    """Decorate a check_* method, or a function taking a project first, to report an Event per call.
+
+    The Event is named after the function, followed by any string
+    arguments, like "check_for_nonempty_file README".  Other arguments
+    are left out, so that every call to check_project has the same name.
+    If it returns a (success, message) tuple or CheckResult, or a report full of them,
+    the Event records whether everything passed.
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(subject, *args, **kwargs):
+            with timed(kind, event_name(function, args), getattr(subject, "path", None)) as event:
+                result = function(subject, *args, **kwargs)
+                if _listeners:
+                    event.passed = passed(result)
+            return result
+        return wrapper
+    return decorate
+
+
+def instrumented_async(kind):
+    """Like instrumented(), for a coroutine function, like AsyncGitProject's check_* methods."""
+    def decorate(function):
+        @functools.wraps(function)
+        async def wrapper(subject, *args, **kwargs):
+            with timed(kind, event_name(function, args), getattr(subject, "path", None)) as event:
+                result = await function(subject, *args, **kwargs)
+                if _listeners:
+                    event.passed = passed(result)
+            return result
+        return wrapper
+    return decorate
+
+
+def event_name(function, args):
+    return " ".join([function.__name__] + [arg for arg in args if isinstance(arg, str)])
+
+
+def passed(result):
+    if isinstance(result, (tuple, CheckResult)) and result:
+        return bool(result[0])
+    if isinstance(result, collections.abc.Mapping):
+        return all(success for success, message in result.values())
+    return None
+
+
+def git_command_name(name):
+    # Group git commands by subcommand, like "git status", in the summary.
+    if isinstance(name, tuple):
+        name = list(name)
+        while name[1:2] == ["-c"]:
+            del name[1:3]
+        return " ".join(name[:2])
+    return name
+
+
+class Profiler(object):
+    """A listener that keeps every Event, for summarizing or dumping afterwards."""
+
+    def __init__(self):
+        self.events = []
+        self.lock = threading.Lock()
+
+    def __call__(self, event):
+        with self.lock:
+            self.events.append(event)
+
+    def __enter__(self):
+        add_listener(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        remove_listener(self)
+
+    def summary(self, slowest=10):
+        """Return lines of a table of time spent per git command and check, then the slowest projects."""
+        totals = collections.OrderedDict()
+        for event in sorted(self.events, key=lambda event: (event.kind, git_command_name(event.name))):
+            key = (event.kind, git_command_name(event.name))
+            calls, duration, longest, output_bytes = totals.get(key, (0, 0.0, 0.0, 0))
+            totals[key] = (calls + 1,
+                           duration + event.duration,
+                           max(longest, event.duration),
+                           output_bytes + (event.output_bytes or 0))
+
+        lines = ["{0:<8} {1:<32} {2:>7} {3:>10} {4:>9} {5:>9} {6:>11}".format(
+            "kind", "name", "calls", "total ms", "mean ms", "max ms", "output kB")]
+        for (kind, name), (calls, duration, longest, output_bytes) in totals.items():
+            lines.append("{0:<8} {1:<32} {2:>7} {3:>10.1f} {4:>9.2f} {5:>9.2f} {6:>11.1f}".format(
+                kind, name, calls, duration * 1000, duration * 1000 / calls, longest * 1000,
+                output_bytes / 1024.0))
+
+        projects = sorted((event for event in self.events if event.kind == "project"),
+                          key=lambda event: event.duration,
+                          reverse=True)
+        if projects:
+            lines.append("")
+            lines.append("slowest projects:")
+            for event in projects[:slowest]:
+                lines.append("{0:>10.1f} ms  {1}".format(event.duration * 1000, event.path))
+        return lines
+
+    def dump(self, f):
+        import json
+        json.dump([event.as_dict() for event in self.events], f, indent=2, sort_keys=True)
+
+
+class Timings(object):
+    """A listener that keeps how long each check took, by project, until it's asked for them."""
+
+    def __init__(self):
+        self.durations = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, event):
+        if event.kind not in ("check", "project"):
+            return
+        name = event.name if event.kind == "check" else "total"
+        with self.lock:
+            durations = self.durations.setdefault(event.path, {})
+            # --schedule may check a project in parts, each with a total of its own.
+            durations[name] = durations.get(name, 0.0) + event.duration
+
+    def __enter__(self):
+        add_listener(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        remove_listener(self)
+
+    def pop(self, path):
+        """Return {check name: seconds} for the project at path, plus its "total", and forget them."""
+        with self.lock:
+            return self.durations.pop(path, {})
@@ -0,0 +1,126 @@
+"""Ask remotes where their branches point, for --verify-remotes.
+
+Remote-tracking branches are only as fresh as the last fetch, so a branch
+that was pushed and has since been deleted, or force-pushed over, still
+looks pushed.  `git ls-remote` asks the remote itself.
+
+One RemoteTips is shared by every project in a run.  Each URL is asked
+about once, however many clones use it, and the asking happens on a pool
+of threads, so that every remote of every project is asked at once, up to
+a limit.  Each `git ls-remote` that takes longer than the timeout is
+killed, and the remote counted as unavailable.
+"""
+import concurrent.futures
+import os
+import re
+import signal
+import subprocess
+import threading
+from check_project.instrument import timed
+
+__author__ = 'wolf'
+
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_CONNECTIONS = 8
+
+# user@host:path, which git treats as ssh, unless it looks like a Windows drive.
+SCP_LIKE = re.compile(r'^[^/:]{2,}:')
+
+
+class RemoteUnavailable(Exception):
+    pass
+
+
+def resolve_url(url, path):
+    """Return url, with a relative path to a local repository made absolute from the project at path.
+
+    That way, clones that name the same remote differently share one
+    `git ls-remote`.
+    """
+    if "://" in url or SCP_LIKE.match(url):
+        return url
+    return os.path.normpath(os.path.join(path, os.path.expanduser(url)))
+
+
+def parse_ls_remote(output):
+    """Return {refname: sha} for the branches in `git ls-remote --heads` output."""
+    tips = {}
+    for line in output.splitlines():
+        sha, _, refname = line.partition(b"\t")
+        if refname.startswith(b"refs/heads/"):
+            tips[refname] = sha
+    return tips
+
+
+def kill(process):
+    if hasattr(os, "killpg"):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+            return
+        except OSError:
+            pass
+    process.kill()
+
+
+class RemoteTips(object):
+    """Run `git ls-remote` for each URL once, with at most connections running at a time."""
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, connections=DEFAULT_CONNECTIONS):
+        self.timeout = timeout
+        self.connections = connections
+        self.futures = {}
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def submit(self, url, path=None):
+        """Start asking url for its branches, unless someone already has, and return the Future."""
+        with self.lock:
+            if url not in self.futures:
+                if self.executor is None:
+                    self.executor = concurrent.futures.ThreadPoolExecutor(self.connections)
+                self.futures[url] = self.executor.submit(self.ls_remote, url, path)
+            return self.futures[url]
+
+    def tips(self, urls, path=None):
+        """Return {url: {refname: sha}} for each of urls, or {url: RemoteUnavailable} if it didn't answer.
+
+        All of urls are asked at once.
+        """
+        futures = [(url, self.submit(url, path)) for url in urls]
+        answers = {}
+        for url, future in futures:
+            try:
+                answers[url] = future.result()
+            except RemoteUnavailable as e:
+                answers[url] = e
+        return answers
+
+    def ls_remote(self, url, path=None):
+        command = ('git', 'ls-remote', '--heads', url)
+        # Never wait for someone to type a password.
+        env = dict(os.environ, GIT_TERMINAL_PROMPT="0", GIT_SSH_COMMAND=os.environ.get(
+            "GIT_SSH_COMMAND", "ssh -o BatchMode=yes"))
+        with timed("git", command, path) as event:
+            try:
+                # In a session of its own, so that ssh or whatever else git starts can be killed with it.
+                process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                           stderr=subprocess.PIPE, cwd=path, env=env,
+                                           start_new_session=hasattr(os, "killpg"))
+            except OSError as e:
+                raise RemoteUnavailable(str(e))
+            try:
+                output, errors = process.communicate(timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                kill(process)
+                process.communicate()
+                raise RemoteUnavailable("it didn't answer within {0:g} seconds".format(self.timeout))
+            event.exit_status = process.returncode
+            event.output_bytes = len(output)
+        if process.returncode:
+            lines = errors.decode("utf-8", "replace").strip().splitlines()
+            raise RemoteUnavailable(lines[0] if lines else "git ls-remote failed")
+        return parse_ls_remote(output)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
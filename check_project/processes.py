@@ -0,0 +1,252 @@
+"""Check projects on a pool of processes, for --engine processes.
+
+Pickling every report dict, with all its messages, back to the parent is
+most of what a process pool costs once there are tens of thousands of
+projects, so the workers don't.  Each project being checked gets a
+fixed-width record in one buffer of shared memory:
+
+    state      WRITTEN, or PICKLED if the report didn't fit a record
+    worker     which worker wrote it
+    ran        a bit for each category, set if that check is in the report
+    passed     a bit for each category, set if that check passed
+    messages   for each category, the message's number in the worker's table
+
+Workers are handed projects a chunk at a time.  Each worker numbers the
+messages it sees, and after each chunk only sends the parent the ones it
+hasn't sent before.  Most messages, like "There is at least one
+remote.", are the same for thousands of projects, so after the first few
+projects a worker sends back next to nothing.
+
+If the parent is listening for instrument Events (for --profile, or
+the timings in --format json), each worker records its own and sends
+them back with the chunk, and the parent passes them on to its listeners
+before reporting the chunk's projects.
+
+Records are reused once their project's been reported, so the buffer's
+size depends on --jobs, not on how many projects there are.  Workers run
+the checks registered when the pool is started (only the built-in ones,
+where processes are spawned rather than forked); a report with a category
+the parent didn't know about is pickled as usual.
+"""
+import collections
+import functools
+import itertools
+import multiprocessing
+import multiprocessing.util
+import queue
+import struct
+from check_project import instrument
+from check_project.report import CheckResult, Report
+
+__author__ = 'wolf'
+
+WRITTEN, PICKLED = 1, 2
+
+# How many projects a worker is handed at a time.
+CHUNK_SIZE = 8
+
+
+class RecordLayout(object):
+    """How a report made of the checks in categories is laid out in a record."""
+
+    def __init__(self, categories):
+        self.categories = list(categories)
+        self.index = dict((category, i) for i, category in enumerate(self.categories))
+        bitfield = (len(self.categories) + 7) // 8
+        self.struct = struct.Struct("<BH{0}s{0}s{1}I".format(bitfield, len(self.categories)))
+        self.size = self.struct.size
+        self.bitfield = bitfield
+        self._ran_categories = {}
+
+    def ran_categories(self, ran):
+        """Return (bit, category) for the bits set in ran.  There are only ever a few different answers."""
+        if ran not in self._ran_categories:
+            self._ran_categories[ran] = tuple((i, category) for i, category in enumerate(self.categories)
+                                              if ran >> i & 1)
+        return self._ran_categories[ran]
+
+    def pack_into(self, buffer, slot, worker, report, number):
+        """Write report into record slot of buffer, numbering its messages with number.
+
+        Return False, and leave the record marked PICKLED, if report has a
+        category we don't have room for.
+        """
+        if any(category not in self.index for category in report):
+            self.struct.pack_into(buffer, slot * self.size, PICKLED, worker, b"", b"",
+                                  *[0] * len(self.categories))
+            return False
+        ran = passed = 0
+        messages = [0] * len(self.categories)
+        for category, (success, message) in report.items():
+            i = self.index[category]
+            ran |= 1 << i
+            if success:
+                passed |= 1 << i
+            messages[i] = number(message)
+        self.struct.pack_into(buffer, slot * self.size, WRITTEN, worker,
+                              ran.to_bytes(self.bitfield, "little"), passed.to_bytes(self.bitfield, "little"),
+                              *messages)
+        return True
+
+
+class RecordReader(object):
+    """Turns records back into reports, in the parent.
+
+    Projects whose records are the same, byte for byte (the same worker
+    wrote them, and the same checks passed and failed with the same
+    messages), share one report, so most projects are read with one
+    dictionary lookup.  The reports mustn't be changed.
+    """
+
+    def __init__(self, layout, buffer, max_reports=4096):
+        self.layout = layout
+        self.view = memoryview(buffer).cast("B")
+        self.max_reports = max_reports
+        self.messages = collections.defaultdict(list)
+        self.reports = {}
+
+    def add_messages(self, worker, messages):
+        """Learn the next few messages in worker's table."""
+        self.messages[worker].extend(messages)
+
+    def read(self, slot):
+        start = slot * self.layout.size
+        record = self.view[start:start + self.layout.size].tobytes()
+        report = self.reports.get(record)
+        if report is None:
+            if len(self.reports) >= self.max_reports:
+                self.reports.clear()
+            report = self.reports[record] = self.decode(record)
+        return report
+
+    def decode(self, record):
+        fields = self.layout.struct.unpack(record)
+        messages = self.messages[fields[1]]
+        passed = int.from_bytes(fields[3], "little")
+        return Report((category, CheckResult(passed >> i & 1, messages[fields[4 + i]]))
+                      for i, category in self.layout.ran_categories(int.from_bytes(fields[2], "little")))
+
+
+class Worker(object):
+    """What each process in the pool knows: where to write, and which messages it's already sent."""
+
+    def __init__(self, layout, buffer, number, check, events=None):
+        self.layout = layout
+        self.buffer = buffer
+        self.number = number
+        self.check_directory = check
+        self.numbers = {}
+        self.messages = []
+        self.sent = 0
+        self.events = events
+
+    def number_message(self, message):
+        if message not in self.numbers:
+            self.numbers[message] = len(self.messages)
+            self.messages.append(message)
+        return self.numbers[message]
+
+    def check(self, first, directories):
+        """Check directories, writing their reports to the records starting at first.
+
+        Return (our number, the messages we haven't sent before, {index in
+        directories: report} for the reports that didn't fit a record, and
+        the Events recorded since last time, as dicts).
+        """
+        pickled = {}
+        for i, directory in enumerate(directories):
+            report = self.check_directory(directory)
+            if not self.layout.pack_into(self.buffer, first + i, self.number, report, self.number_message):
+                pickled[i] = report
+        new_messages = self.messages[self.sent:]
+        self.sent = len(self.messages)
+        events = []
+        if self.events is not None:
+            events, self.events[:] = [event.as_dict() for event in self.events], []
+        return self.number, new_messages, pickled, events
+
+
+_worker = None
+
+
+def start_worker(categories, buffer, counter, parser, skip_checks, record_events):
+    global _worker
+    from check_project.cache import ResultCache
+    from check_project.cli import build_check, report_not_a_repository
+    cache = None
+    if not parser.no_cache:
+        cache = ResultCache(parser.cache_file, parser.cache_size)
+        # Run when the pool lets the worker exit.  The parent throws old
+        # reports out of the cache when it closes its own.
+        multiprocessing.util.Finalize(cache, cache.close, kwargs={"evict": False}, exitpriority=0)
+    check = functools.partial(report_not_a_repository, build_check(parser, skip_checks, cache))
+    with counter.get_lock():
+        number = counter.value
+        counter.value += 1
+    events = None
+    if record_events:
+        events = []
+        instrument.add_listener(events.append)
+    _worker = Worker(RecordLayout(categories), buffer, number, check, events)
+
+
+def check_into_records(chunk):
+    first, directories = chunk
+    return first, _worker.check(first, directories)
+
+
+def scan_directories_with_processes(directories, parser, skip_checks, jobs=None, stop=None, ordered=True,
+                                    chunk_size=CHUNK_SIZE):
+    """Like scan.scan_directories, but the projects are checked by build_check(parser) in worker processes.
+
+    Yields (directory, report) pairs; the same report may be yielded for
+    several projects, so they mustn't be changed.  Projects are handed to
+    workers chunk_size at a time, each chunk with a block of records of its
+    own.  Once stop is set, no more are, and the ones that already have
+    been are finished and yielded.
+    """
+    from check_project.checks import CHECKS
+    from check_project.scan import default_jobs
+    if jobs is None:
+        jobs = default_jobs()
+    blocks = jobs * 4
+
+    layout = RecordLayout([check.category for check in CHECKS] + ["is a git repository"])
+    context = multiprocessing.get_context()
+    buffer = context.RawArray("B", layout.size * blocks * chunk_size)
+    reader = RecordReader(layout, buffer)
+    free = queue.Queue()
+    for block in range(blocks):
+        free.put(block * chunk_size)
+    chunks = {}
+
+    def make_chunks():
+        # The pool reads these on a thread of its own, waiting for a free
+        # block of records before each chunk.
+        iterator = iter(directories)
+        while stop is None or not stop.is_set():
+            chunk = list(itertools.islice(iterator, chunk_size))
+            if not chunk:
+                return
+            first = free.get()
+            if first is None or stop is not None and stop.is_set():
+                return
+            chunks[first] = chunk
+            yield first, chunk
+
+    pool = context.Pool(jobs, start_worker, (layout.categories, buffer, context.Value("i", 0), parser, skip_checks,
+                                             instrument.listening()))
+    try:
+        results = (pool.imap if ordered else pool.imap_unordered)(check_into_records, make_chunks())
+        for first, (worker, new_messages, pickled, events) in results:
+            reader.add_messages(worker, new_messages)
+            for fields in events:
+                instrument.emit(instrument.Event.from_dict(fields))
+            for i, directory in enumerate(chunks.pop(first)):
+                yield directory, pickled[i] if i in pickled else reader.read(first + i)
+            free.put(first)
+        pool.close()
+        pool.join()
+    finally:
+        free.put(None)  # in case make_chunks is still waiting
+        pool.terminate()
@@ -0,0 +1,116 @@
+"""Work out which branches haven't been pushed, as cheaply as we can.
+
+A branch has been pushed if its tip is in the history of some
+remote-tracking branch.  In order, we try:
+
+*   comparing tips: a branch pointing where a remote-tracking branch points
+    has been pushed, which settles most branches without looking at
+    history at all;
+*   remembering: commit IDs name the same history in every repository, so
+    an answer worked out for one clone holds for all the others, and is
+    kept for the life of the process;
+*   the commit-graph files of the repository's object directory and its
+    alternates, which we can walk ourselves;
+*   and only then asking git, once, about whatever's left.
+"""
+import threading
+
+__author__ = 'wolf'
+
+# How many answers to remember for each commit.
+ANSWERS_PER_COMMIT = 8
+
+
+class ReachabilityCache(object):
+    """Remember whether commits are in the history of sets of other commits.
+
+    If a commit is in the history of some set of commits, it's in the
+    history of any bigger set too, and if it isn't, it isn't in the history
+    of any smaller one, so an answer for one repository's remote-tracking
+    branches often settles the question for another's.
+    """
+
+    def __init__(self):
+        self.reachable = {}
+        self.unreachable = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, sha, sources):
+        """Return whether sha is in the history of any of sources, or None if we don't know."""
+        with self.lock:
+            for known in self.reachable.get(sha, ()):
+                if known <= sources:
+                    self.hits += 1
+                    return True
+            for known in self.unreachable.get(sha, ()):
+                if sources <= known:
+                    self.hits += 1
+                    return False
+            self.misses += 1
+            return None
+
+    def record(self, sha, sources, reachable):
+        answers = self.reachable if reachable else self.unreachable
+        with self.lock:
+            known = answers.setdefault(sha, [])
+            known.append(sources)
+            del known[:-ANSWERS_PER_COMMIT]
+
+    def clear(self):
+        with self.lock:
+            self.reachable.clear()
+            self.unreachable.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+ANSWERS = ReachabilityCache()
+
+
+def unpushed_branches(refs, object_directories, ask_git, answers=ANSWERS):
+    """Return the sorted names of the branches in refs ({refname: sha}) no remote-tracking branch has.
+
+    object_directories are searched for commit-graph files.  ask_git()
+    is called, at most once, to return the set of branch tips git says
+    are unpushed, if anything's left to ask.
+    """
+    branches = dict((refname, sha) for refname, sha in refs.items() if refname.startswith(b"refs/heads/"))
+    remote_tips = frozenset(sha for refname, sha in refs.items() if refname.startswith(b"refs/remotes/"))
+
+    unpushed = set()
+    unknown = set()
+    for sha in set(branches.values()) - remote_tips:
+        pushed = answers.lookup(sha, remote_tips)
+        if pushed is None:
+            pushed = graph_reaches(object_directories, remote_tips, sha)
+            if pushed is not None:
+                answers.record(sha, remote_tips, pushed)
+        if pushed is None:
+            unknown.add(sha)
+        elif not pushed:
+            unpushed.add(sha)
+
+    if unknown:
+        said_unpushed = ask_git()
+        for sha in unknown:
+            answers.record(sha, remote_tips, sha not in said_unpushed)
+        unpushed.update(unknown & said_unpushed)
+
+    return sorted(refname for refname, sha in branches.items() if sha in unpushed)
+
+
+def graph_reaches(object_directories, shas, target):
+    """Ask the first commit-graph that knows whether target is in the history of any of shas."""
+    if not shas:
+        return False
+    from check_project.commitgraph import load_commit_graph
+    for objects in object_directories:
+        graph = load_commit_graph(objects)
+        if graph is None:
+            continue
+        reached = graph.reaches(shas, target)
+        if reached is not None:
+            return reached
+    return None
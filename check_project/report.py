@@ -0,0 +1,163 @@
+"""Reports that stay small, for runs that keep thousands of them around.
+
+A Report looks like a dict of (passed, message) tuples keyed by category,
+and a CheckResult like one of those tuples::
+
+    report = Report()
+    report["has remotes"] = CheckResult(False, "There are no remotes.")
+    success, message = report["has remotes"]
+    report[CheckId.HAS_REMOTES].passed  # False
+
+but the built-in checks' results are kept in a list indexed by CheckId, and
+a CheckResult only formats its message when something reads it
+(benchmarks/memory.py measures what a report costs).  Results
+that are always the same, like "There are no remotes.", are made once and
+shared by every report that has them, so they're never changed once made.
+"""
+import collections.abc
+import enum
+
+__author__ = 'wolf'
+
+
+class CheckId(enum.IntEnum):
+    """The built-in checks, and the failures that stand in for a report."""
+
+    HAS_A_README = 0
+    HAS_A_LICENSE = 1
+    HAS_REMOTES = 2
+    HAS_NO_STASH = 3
+    HAS_NO_UNCOMMITTED_CHANGES = 4
+    HAS_NO_UNPUSHED_COMMITS = 5
+    HAS_EVERY_BRANCH_ON_A_REMOTE = 6
+    IS_A_GIT_REPOSITORY = 7
+    HAS_VALID_OPTIONS = 8
+
+    @property
+    def category(self):
+        return self.name.lower().replace("_", " ")
+
+
+CATEGORIES = [check_id.category for check_id in CheckId]
+CATEGORY_IDS = dict((check_id.category, check_id) for check_id in CheckId)
+
+
+class CheckResult(object):
+    """Whether a check passed, and why, with the message formatted from template and args when it's read.
+
+    It unpacks, indexes and compares like a (passed, message) tuple.
+    """
+
+    __slots__ = ("passed", "template", "args")
+
+    def __init__(self, passed, template, *args):
+        self.passed = bool(passed)
+        self.template = template
+        self.args = args
+
+    @property
+    def message(self):
+        if not self.args:
+            return self.template
+        return self.template.format(*self.args)
+
+    def __iter__(self):
+        yield self.passed
+        yield self.message
+
+    def __len__(self):
+        return 2
+
+    def __getitem__(self, index):
+        return (self.passed, self.message)[index]
+
+    def __eq__(self, other):
+        if isinstance(other, (CheckResult, tuple)):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        return "CheckResult({0!r}, {1!r})".format(self.passed, self.message)
+
+    def __reduce__(self):
+        return CheckResult, (self.passed, self.template) + self.args
+
+
+def as_result(result):
+    """Return a (passed, message) tuple as a CheckResult.  Anything else is left as it is."""
+    if isinstance(result, tuple):
+        passed, message = result
+        return CheckResult(passed, message)
+    return result
+
+
+class Report(collections.abc.MutableMapping):
+    """{category: CheckResult} for one project.
+
+    Keys are categories, like "has remotes", or CheckIds.  Only checks added
+    with checks.register() need the dict kept in extra.
+    """
+
+    __slots__ = ("results", "extra")
+
+    def __init__(self, results=()):
+        self.results = [None] * len(CheckId)
+        self.extra = None
+        self.update(results)
+
+    def __getitem__(self, category):
+        check_id = category if isinstance(category, CheckId) else CATEGORY_IDS.get(category)
+        if check_id is None:
+            if self.extra is None:
+                raise KeyError(category)
+            return self.extra[category]
+        result = self.results[check_id]
+        if result is None:
+            raise KeyError(category)
+        return result
+
+    def __setitem__(self, category, result):
+        check_id = category if isinstance(category, CheckId) else CATEGORY_IDS.get(category)
+        if check_id is None:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[category] = as_result(result)
+        else:
+            self.results[check_id] = as_result(result)
+
+    def __delitem__(self, category):
+        self[category]  # raises KeyError if it isn't there
+        check_id = category if isinstance(category, CheckId) else CATEGORY_IDS.get(category)
+        if check_id is None:
+            del self.extra[category]
+        else:
+            self.results[check_id] = None
+
+    def __iter__(self):
+        for category, result in zip(CATEGORIES, self.results):
+            if result is not None:
+                yield category
+        if self.extra:
+            for category in self.extra:
+                yield category
+
+    def __len__(self):
+        return len(self.results) - self.results.count(None) + len(self.extra or ())
+
+    def __repr__(self):
+        return "Report({0!r})".format(dict(self))
+
+    def __reduce__(self):
+        return Report, (list(self.items()),)
+
+
+def as_pairs(report):
+    """Return report as a plain dict of (passed, message) tuples, to write out as JSON."""
+    return dict((category, (bool(result[0]), result[1])) for category, result in report.items())
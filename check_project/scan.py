@@ -0,0 +1,81 @@
+import collections
+import concurrent.futures
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+__author__ = 'wolf'
+
+
+def default_jobs():
+    # Checks spend nearly all their time waiting on git, so we can run
+    # more of them at once than we have cores.
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+def scan_directories(directories, check, jobs=None, stop=None, ordered=True):
+    """Run check(directory) for each directory on a pool of threads.
+
+    Yields (directory, result) pairs in the same order as directories,
+    no matter which worker finishes first.  directories may be any
+    iterable, including a generator that is still discovering
+    repositories; we only keep a small window of work queued ahead of
+    the result we're waiting on.
+
+    Once the threading.Event stop is set, nothing more is started: checks
+    that are already running are finished and yielded, and the rest are
+    dropped.
+
+    If ordered is False, results are yielded as soon as they're ready
+    instead, so one slow check doesn't hold up the ones after it.
+    """
+    if jobs is None:
+        jobs = default_jobs()
+    window = jobs * 2
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        pending = collections.deque()
+        try:
+            for directory in directories:
+                if stop is not None and stop.is_set():
+                    break
+                pending.append((directory, executor.submit(check, directory)))
+                if ordered:
+                    if len(pending) >= window:
+                        directory, future = pending.popleft()
+                        yield directory, future.result()
+                else:
+                    for result in finished(pending, wait=len(pending) >= window):
+                        yield result
+            while pending:
+                if not ordered:
+                    if stop is not None and stop.is_set():
+                        break
+                    for result in finished(pending, wait=True):
+                        yield result
+                    continue
+                directory, future = pending.popleft()
+                if stop is not None and stop.is_set() and future.cancel():
+                    continue
+                yield directory, future.result()
+            # Whatever's still running after a stop is finished and yielded.
+            for directory, future in pending:
+                if not future.cancel():
+                    yield directory, future.result()
+            pending.clear()
+        finally:
+            for directory, future in pending:
+                future.cancel()
+
+
+def finished(pending, wait=False):
+    """Take the finished futures out of pending and return their (directory, result) pairs.
+
+    With wait, wait for at least one to finish first.
+    """
+    if wait:
+        concurrent.futures.wait([future for directory, future in pending],
+                                return_when=concurrent.futures.FIRST_COMPLETED)
+    done = [(directory, future) for directory, future in pending if future.done()]
+    for item in done:
+        pending.remove(item)
+    return [(directory, future.result()) for directory, future in done]
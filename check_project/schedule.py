@@ -0,0 +1,198 @@
+"""Check the slowest projects first, for --schedule.
+
+Handing projects to workers in the order they were found means one huge
+repository found last can still be being checked long after everything
+else has finished.  Durations remembers, in sqlite next to the result
+cache, how long each project took last time, and how long each of its
+checks took.  The next run sorts the projects longest first (LPT), so the
+big ones start while there's plenty of small work left to fill in around
+them.
+
+A project expected to take longer than its share of the whole run (the
+total divided by --jobs) is split: its checks are dealt out to several
+workers, so `git status` can run on one while `git log` runs on another.
+Checks that need the same facts about the repository stay together (see
+check_groups()), so no fact is worked out twice.  The parts' reports are
+put back together before the project's reported.
+
+This needs every project before it can start, so with --root nothing is
+checked until all the repositories have been found.
+"""
+import collections
+import heapq
+import math
+import os
+import threading
+from check_project.cache import connect, default_durations_file, fingerprint
+from check_project.instrument import add_listener, remove_listener
+from check_project.report import Report
+
+__author__ = 'wolf'
+
+# A project that takes less than this isn't worth starting twice.
+SPLIT_AT_LEAST = 0.1
+
+
+class Durations(object):
+    """How long projects and their checks took on earlier runs, and a listener that times this one.
+
+    Durations are in seconds, by project path, with the project's as
+    "total" and each check's under its category.  What's measured this run
+    is averaged with what was remembered when save() is called.
+    """
+
+    def __init__(self, filename=None):
+        self.filename = filename or default_durations_file()
+        self.connection = connect(self.filename)
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS durations ("
+                                    "directory TEXT, name TEXT, seconds REAL, PRIMARY KEY (directory, name))")
+        self.measured = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, event):
+        if event.kind not in ("category", "project"):
+            return
+        name = event.name if event.kind == "category" else "total"
+        with self.lock:
+            durations = self.measured.setdefault(event.path, {})
+            # A project that was split is in several parts, each with a total of its own.
+            durations[name] = durations.get(name, 0.0) + event.duration
+
+    def __enter__(self):
+        add_listener(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        remove_listener(self)
+
+    def remembered(self, directories=None):
+        """Return {path: {name: seconds}} from earlier runs, for directories if given."""
+        wanted = None if directories is None else set(directories)
+        remembered = {}
+        for directory, name, seconds in self.connection.execute("SELECT directory, name, seconds FROM durations"):
+            if wanted is None or directory in wanted:
+                remembered.setdefault(directory, {})[name] = seconds
+        return remembered
+
+    def save(self):
+        with self.lock:
+            measured, self.measured = self.measured, {}
+        remembered = self.remembered(measured)
+        rows = []
+        for directory, durations in measured.items():
+            for name, seconds in durations.items():
+                previous = remembered.get(directory, {}).get(name)
+                rows.append((directory, name, seconds if previous is None else (previous + seconds) / 2))
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO durations VALUES (?, ?, ?)", rows)
+
+    def close(self):
+        self.save()
+        self.connection.close()
+
+
+def deal(groups, durations, parts):
+    """Share groups of categories out between at most parts parts, longest first onto the least busy.
+
+    Return [(expected seconds, categories)], longest first.
+    """
+    costs = sorted(((sum(durations.get(category, 0.0) for category in group), group) for group in groups),
+                   key=lambda cost_group: -cost_group[0])
+    bins = [(0.0, i, []) for i in range(parts)]
+    for cost, group in costs:
+        load, i, categories = heapq.heappop(bins)
+        heapq.heappush(bins, (load + cost, i, categories + list(group)))
+    return sorted(((load, categories) for load, i, categories in bins if categories),
+                  key=lambda load_categories: -load_categories[0])
+
+
+def plan(directories, remembered, groups, jobs, unchanged=None):
+    """Return the tasks to check directories with, longest first.
+
+    Each task is (index in directories, directory, categories), where
+    categories is None for the whole project.  A project nobody remembers
+    is expected to take as long as the average one.  unchanged(directory)
+    says whether the cache already has its report, which makes it quick
+    whatever it took last time.
+    """
+    paths = [os.path.abspath(os.path.expanduser(directory)) for directory in directories]
+    known = [remembered[path]["total"] for path in paths if "total" in remembered.get(path, {})]
+    average = sum(known) / len(known) if known else 0.0
+    expected = [remembered.get(path, {}).get("total", average) for path in paths]
+    share = sum(expected) / jobs
+
+    tasks = []
+    for index, (directory, path, seconds) in enumerate(zip(directories, paths, expected)):
+        parts = min(len(groups), jobs, int(math.ceil(seconds / share))) if share else 1
+        if (parts > 1 and seconds >= SPLIT_AT_LEAST and path in remembered
+                and not (unchanged is not None and unchanged(directory))):
+            for load, categories in deal(groups, remembered[path], parts):
+                tasks.append((load, index, directory, frozenset(categories)))
+        else:
+            tasks.append((seconds, index, directory, None))
+    tasks.sort(key=lambda task: -task[0])
+    return [(index, directory, categories) for seconds, index, directory, categories in tasks]
+
+
+def scan_directories_scheduled(directories, check, check_part, remembered, groups, jobs=None, stop=None,
+                               ordered=True, cache=None, options=None):
+    """Like scan.scan_directories, but the projects expected to take longest start first.
+
+    check(directory) checks a whole project, and check_part(directory,
+    only=categories) just some of its checks.  remembered is what
+    Durations.remembered() returned, and groups is checks.check_groups().
+    With a cache (and its options), a project that was split has its
+    report put in the cache once all its parts are in, and one that the
+    cache already has isn't split.
+
+    Yields (directory, report) in the order of directories, or as each
+    project finishes if ordered is False.  Once stop is set, no more
+    checks are started, and projects with parts that never ran are left
+    out.
+    """
+    from check_project.scan import default_jobs, scan_directories
+    if jobs is None:
+        jobs = default_jobs()
+    directories = list(directories)
+
+    # Taken before any part of a project is checked, for putting its report in the cache afterwards.
+    fingerprints = {}
+
+    def unchanged(directory):
+        path = os.path.abspath(os.path.expanduser(directory))
+        fingerprints[path] = fingerprint(path)
+        return cache.get(path, options, fingerprints[path]) is not None
+
+    tasks = plan(directories, remembered, groups, jobs, unchanged if cache is not None else None)
+
+    def run(task):
+        index, directory, categories = task
+        if categories is None:
+            return check(directory)
+        return check_part(directory, only=categories)
+
+    parts_left = collections.Counter(index for index, directory, categories in tasks)
+    merged = {}
+    finished = {}
+    next_index = 0
+    for (index, directory, categories), report in scan_directories(tasks, run, jobs, stop, ordered=False):
+        parts_left[index] -= 1
+        if categories is not None:
+            merged.setdefault(index, Report()).update(report)
+            if parts_left[index]:
+                continue
+            report = merged.pop(index)
+            if cache is not None:
+                path = os.path.abspath(os.path.expanduser(directory))
+                cache.put(path, options, fingerprints.get(path), report)
+        if not ordered:
+            yield directory, report
+            continue
+        finished[index] = directory, report
+        while next_index in finished:
+            yield finished.pop(next_index)
+            next_index += 1
+    # After a stop, whatever finished behind a project that never did.
+    for index in sorted(finished):
+        yield finished[index]
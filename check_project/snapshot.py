@@ -0,0 +1,153 @@
+from check_project.files import find_nonempty_files, scan_directory, FILE_PATTERNS
+from check_project.reachability import unpushed_branches
+
+__author__ = 'wolf'
+
+# How many space-separated fields come before the path in each kind of
+# `git status --porcelain=v2` entry.
+PORCELAIN_V2_FIELDS = {b"1": 8, b"2": 9, b"u": 10, b"?": 1, b"!": 1}
+
+
+def iter_porcelain_v2(records):
+    """Yield the paths from the NUL-separated records of `git status --porcelain=v2 -z`."""
+    records = iter(records)
+    for record in records:
+        if not record or record.startswith(b"#"):
+            continue
+        kind = record[:1]
+        if kind not in PORCELAIN_V2_FIELDS:
+            continue  # something newer git knows about and we don't
+        yield record.split(b" ", PORCELAIN_V2_FIELDS[kind])[-1]
+        if kind == b"2":
+            next(records)  # the original path of a rename or copy
+
+
+def parse_porcelain_v2(output):
+    """Return the paths from `git status --porcelain=v2 -z` output."""
+    return list(iter_porcelain_v2(output.split(b"\0")))
+
+
+class GitSnapshot(object):
+    """What the checks need to know about a repository, asked of git at most once.
+
+    Each fact is fetched the first time something asks for it, and facts
+    that come out of the same git command are fetched together: the stash,
+    the branches and the remote-tracking branches all come from one
+    `git for-each-ref`.  A snapshot never changes, so take a new one if
+    the repository might have.
+    """
+
+    def __init__(self, project, status=None):
+        self.project = project
+        self.status = status
+        self._entries = None
+        self._nonempty_files = {}
+        self._tracked = {}
+        self._uncommitted_changes = None
+        self._all_uncommitted_changes = False
+        self._refs = None
+        self._remotes = None
+        self._remote_urls = None
+        self._unpushed_commits = None
+
+    @property
+    def entries(self):
+        """The os.DirEntry objects for the top of the project, sorted by name."""
+        if self._entries is None:
+            self._entries = scan_directory(self.project.path)
+        return self._entries
+
+    @property
+    def listing(self):
+        """The names of the files at the top of the project."""
+        return [entry.name for entry in self.entries]
+
+    def nonempty_files(self, patterns, tracked=False):
+        """Return {pattern: the first non-empty file matching it, or False} (see check_project.files).
+
+        The first time, FILE_PATTERNS are looked for along with patterns,
+        so that later questions about them don't look again.  With
+        tracked, only files git has in the index count, and git is asked
+        about every candidate at once.
+        """
+        missing = [pattern for pattern in patterns if pattern not in self._nonempty_files]
+        if missing:
+            if not self._nonempty_files:
+                missing = FILE_PATTERNS + [pattern for pattern in missing if pattern not in FILE_PATTERNS]
+            self._nonempty_files.update(find_nonempty_files(self.entries, missing))
+
+        if tracked:
+            candidates = set(name for pattern in patterns for name in self._nonempty_files[pattern])
+            unknown = sorted(candidates - set(self._tracked))
+            if unknown:
+                self._tracked.update(self.project.tracked_files(unknown))
+
+        found = {}
+        for pattern in patterns:
+            names = [name for name in self._nonempty_files[pattern] if not tracked or self._tracked[name]]
+            found[pattern] = names[0] if names else False
+        return found
+
+    def get_uncommitted_changes(self, limit=None):
+        """Return the uncommitted changes, or just the first limit of them.
+
+        Asking for a few stops git as soon as it has told us about them,
+        and only asking for all of them later runs git again.
+        """
+        if self._uncommitted_changes is None or not self._all_uncommitted_changes and \
+                (limit is None or limit > len(self._uncommitted_changes)):
+            self._uncommitted_changes = self.project.stream_uncommitted_changes(limit, self.status)
+            self._all_uncommitted_changes = limit is None or len(self._uncommitted_changes) < limit
+        return self._uncommitted_changes[:limit]
+
+    @property
+    def uncommitted_changes(self):
+        return self.get_uncommitted_changes()
+
+    @property
+    def has_uncommitted_changes(self):
+        return bool(self.get_uncommitted_changes(limit=1))
+
+    @property
+    def refs(self):
+        if self._refs is None:
+            self._refs = self.project.read_refs()
+        return self._refs
+
+    @property
+    def has_stash(self):
+        return b"refs/stash" in self.refs
+
+    @property
+    def branch_tips(self):
+        return set(sha for refname, sha in self.refs.items() if refname.startswith(b"refs/heads/"))
+
+    @property
+    def remote_tips(self):
+        return set(sha for refname, sha in self.refs.items() if refname.startswith(b"refs/remotes/"))
+
+    @property
+    def remotes(self):
+        if self._remotes is None:
+            self._remotes = self.project.read_remotes()
+        return self._remotes
+
+    @property
+    def remote_urls(self):
+        if self._remote_urls is None:
+            self._remote_urls = self.project.read_remote_urls()
+        return self._remote_urls
+
+    @property
+    def unpushed_commits(self):
+        """The names of the branches with commits no remote-tracking branch has."""
+        if self._unpushed_commits is None:
+            if self.branch_tips <= self.remote_tips:
+                # Every branch points at something a remote already has, so
+                # there's no need to look at the history.
+                self._unpushed_commits = []
+            else:
+                self._unpushed_commits = unpushed_branches(self.refs,
+                                                           self.project.object_directories(),
+                                                           self.project.list_unpushed_tips)
+        return self._unpushed_commits
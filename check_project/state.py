@@ -0,0 +1,58 @@
+"""Remember the last run's reports, so --diff can say what's changed since.
+
+Reports are kept in sqlite, like the result cache, under a scope: the
+projects asked for and the options that change what goes in a report.
+Two --diff runs over different directories with the same state file don't
+see each other's projects as having gone away.
+"""
+import json
+from check_project.cache import connect, default_state_file
+from check_project.report import as_pairs, CheckResult, Report
+
+__author__ = 'wolf'
+
+
+def compare(previous, report):
+    """Return (new failures, fixed) for a project's report, as lists of categories.
+
+    previous is the last report, or None if the project wasn't there.  A
+    check that wasn't run this time (because of --fail-fast, say) hasn't
+    been fixed, and a failure that's still failing isn't new, even if its
+    message has changed.
+    """
+    previous = previous or {}
+    new_failures = [category for category in sorted(report)
+                    if not report[category][0] and previous.get(category, (True,))[0]]
+    fixed = [category for category in sorted(report)
+             if report[category][0] and not previous.get(category, (True,))[0]]
+    return new_failures, fixed
+
+
+class RunState(object):
+    """The reports from the last run in scope, and somewhere to put this run's."""
+
+    def __init__(self, filename=None, scope=""):
+        self.filename = filename or default_state_file()
+        self.scope = scope
+        self.connection = connect(self.filename)
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS reports ("
+                                    "scope TEXT, directory TEXT, report TEXT, PRIMARY KEY (scope, directory))")
+
+    def previous(self):
+        """Return {directory: report} from the last run."""
+        rows = self.connection.execute("SELECT directory, report FROM reports WHERE scope = ?", (self.scope,))
+        return dict((directory, Report((category, CheckResult(*result))
+                                       for category, result in json.loads(report).items()))
+                    for directory, report in rows)
+
+    def save(self, reports):
+        """Replace the last run's reports with reports ({directory: report})."""
+        with self.connection:
+            self.connection.execute("DELETE FROM reports WHERE scope = ?", (self.scope,))
+            self.connection.executemany("INSERT INTO reports VALUES (?, ?, ?)",
+                                        ((self.scope, directory, json.dumps(as_pairs(report), sort_keys=True))
+                                         for directory, report in reports.items()))
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,42 @@
+import subprocess
+import pytest
+from check_project.reachability import ANSWERS
+
+
+@pytest.fixture(autouse=True)
+def private_cache_home(tmpdir_factory, monkeypatch):
+    # Keep the result cache the tests use away from the real one.
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmpdir_factory.mktemp("cache")))
+
+
+@pytest.fixture(autouse=True)
+def forget_reachability():
+    # Tests make the same commits in different repositories, and expect git to be asked about them.
+    ANSWERS.clear()
+
+
+@pytest.fixture
+def make_repo(tmpdir):
+    """Change to tmpdir, and return a function that makes a repository there with a README committed.
+
+    It takes the repository's name, "hello_world" unless given, and
+    returns the sha of its one commit.
+    """
+    tmpdir.chdir()
+
+    def make(name="hello_world"):
+        tmpdir.mkdir(name)
+        subprocess.call(["git", "init"],
+                        cwd=name)
+        subprocess.call(["git", "config", "user.email", '"you@example.com"'],
+                        cwd=name)
+        subprocess.call(["git", "config", "user.name", '"My Name"'],
+                        cwd=name)
+        with open(name + '/README', 'w') as f:
+            f.write("Saluton, Mundo!")
+        subprocess.call(["git", "add", "README"],
+                        cwd=name)
+        subprocess.call(["git", "commit", "-m", "Initial commit."],
+                        cwd=name)
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=name).strip()
+    return make
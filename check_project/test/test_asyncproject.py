@@ -0,0 +1,112 @@
+import asyncio
+import json
+import subprocess
+import pytest
+from check_project.asyncproject import AsyncGitProject, check_directory_async, check_project_async, \
+    scan_directories_with_asyncio
+from check_project.checks import Check, register, skipped_by_options, unregister
+from check_project.cli import check_project, parse_args, start_process
+from check_project.gitproject import GitProject, GitProjectException
+
+
+def test_fails_no_git(tmpdir):
+    tmpdir.chdir()
+    tmpdir.mkdir("hello_world")
+    with pytest.raises(GitProjectException):
+        asyncio.run(AsyncGitProject("hello_world").validate())
+
+
+def test_async_report_matches_sync_report(tmpdir, make_repo):
+    make_repo()
+    with open('hello_world/untracked', 'w') as f:
+        f.write("woooooo")
+    subprocess.call(["git", "stash", "-u"],
+                    cwd="hello_world")
+    with open('hello_world/untracked', 'w') as f:
+        f.write("woooooo")
+    # Both engines name these the same way, without git's quoting or the old name of a rename.
+    with open('hello_world/na\u00efve "quoted" name', 'w') as f:
+        f.write("woooooo")
+    subprocess.call(["git", "mv", "README", "README.txt"],
+                    cwd="hello_world")
+
+    skip_checks = skipped_by_options(parse_args([]))
+    for ignore_unpushed_if_no_remotes in (False, True):
+        expected = check_project(GitProject("hello_world"), skip_checks, ignore_unpushed_if_no_remotes,
+                                 show_changes=5)
+        actual = asyncio.run(check_directory_async("hello_world", skip_checks, ignore_unpushed_if_no_remotes,
+                                                   show_changes=5))
+        assert actual == expected
+    assert "README.txt" in expected["has no uncommitted changes"].message
+
+
+def test_async_checks_bare_repositories(tmpdir):
+    tmpdir.chdir()
+    subprocess.call(["git", "init", "--bare", "bare.git"])
+    skip_checks = skipped_by_options(parse_args([]))
+    expected = check_project(GitProject("bare.git"), skip_checks, False)
+    assert asyncio.run(check_directory_async("bare.git", skip_checks, False)) == expected
+    assert expected["has no uncommitted changes"][0]
+
+
+def test_async_project_asks_for_remotes_once(tmpdir, make_repo):
+    make_repo()
+    calls = []
+
+    async def check():
+        project = AsyncGitProject("hello_world")
+        await project.validate()
+        git = project.git
+
+        async def counting_git(*args):
+            calls.append(args)
+            return await git(*args)
+
+        project.git = counting_git
+        await check_project_async(project, ["ignore_remote_branches"], ignore_unpushed_if_no_remotes=True)
+
+    asyncio.run(check())
+    assert calls.count(('remote',)) == 1
+
+
+def test_async_runs_registered_checks(tmpdir, make_repo):
+    make_repo()
+
+    async def is_fine(project, options):
+        return True, "Fine."
+
+    register(Check("is fine", None, run_async=is_fine))
+    register(Check("is synchronous", lambda project, options: (True, "Fine.")))
+    try:
+        report = asyncio.run(check_directory_async("hello_world", ["ignore_remote_branches", "ignore_is_synchronous"],
+                                                   False))
+        assert report["is fine"] == (True, "Fine.")
+        with pytest.raises(ValueError):
+            asyncio.run(check_directory_async("hello_world", ["ignore_remote_branches"], False))
+        with pytest.raises(SystemExit):
+            parse_args(["--engine", "asyncio"])
+    finally:
+        unregister("is fine")
+        unregister("is synchronous")
+
+
+def test_scan_with_asyncio(tmpdir, make_repo):
+    make_repo("alpha")
+    make_repo("beta")
+    tmpdir.mkdir("not_a_project")
+    directories = ["beta", "not_a_project", "alpha"]
+    results = list(scan_directories_with_asyncio(directories, ["ignore_remote_branches"], False, git_processes=2))
+    assert [directory for directory, _ in results] == directories
+    assert results[1][1] == {"is a git repository": (False, "Path {0} is not a git repository.".format(
+        tmpdir.join("not_a_project")))}
+    assert results[0][1] == results[2][1]
+
+    return_code, output = start_process(["--engine", "asyncio", "-d", "alpha", "-d", "beta", "--no-cache"])
+    assert return_code == 3
+    assert output.count("*** FAIL: has remotes") == 2
+
+    return_code, output = start_process(["--engine", "asyncio", "-d", "alpha", "-d", "beta", "--no-cache",
+                                         "--format", "jsonl"])
+    timings = dict((record["path"], record["timings"]) for record in map(json.loads, output))
+    assert set(timings[str(tmpdir.join("alpha"))]) >= set(["check_remotes", "check_for_nonempty_file README",
+                                                           "total"])
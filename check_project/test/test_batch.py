@@ -0,0 +1,66 @@
+import io
+import subprocess
+from check_project.batch import parse_record, read_records
+from check_project.cli import batch_item, parse_args, start_process
+
+
+def test_read_records():
+    f = io.BytesIO(b"/one\r\n\n/two words\n/three")
+    assert list(read_records(f)) == ["/one", "/two words", "/three"]
+
+    f = io.BytesIO(b"/one\0/two\nlines\0\0/three\0")
+    assert list(read_records(f, b"\0", chunk_size=3)) == ["/one", "/two\nlines", "/three"]
+
+
+def test_parse_record():
+    assert parse_record("/foo/bar") == ("/foo/bar", [])
+    assert parse_record("/foo bar\t--ignore-stash --show-changes '3'") == \
+        ("/foo bar", ["--ignore-stash", "--show-changes", "3"])
+
+
+def test_batch_item_parses_each_set_of_options_once():
+    parser = parse_args(["--batch", "-", "--ignore-no-remotes"])
+    parsed = {}
+    assert batch_item(parser, parsed, "/a") == ("/a", parser)
+    directory, options = batch_item(parser, parsed, "/b\t--ignore-stash")
+    assert directory == "/b" and options.ignore_stash and options.ignore_no_remotes
+    assert batch_item(parser, parsed, "/c\t--ignore-stash") == ("/c", options)
+    assert batch_item(parser, parsed, "/d\t--format json") == ("/d", None)
+
+
+def test_batch(tmpdir):
+    tmpdir.chdir()
+    for name in ("alpha", "beta"):
+        tmpdir.mkdir(name)
+        subprocess.call(["git", "init"],
+                        cwd=name)
+    tmpdir.join("batch").write_binary("\n".join([
+        str(tmpdir.join("alpha")),
+        str(tmpdir.join("beta")) + "\t--ignore-missing-readme --ignore-missing-license",
+        str(tmpdir.join("not_there")) + "\t--no-such-option",
+        str(tmpdir.join("unquoted")) + "\t--show-changes '3",
+        str(tmpdir.join("alpha")) + "\t--no-cache -v",
+    ]).encode("utf-8"))
+
+    return_code, output = start_process(["--batch", "batch", "--no-cache", "--ignore-no-remotes",
+                                         "--ignore-unpushed"])
+    assert return_code == 3
+    alpha = output.index("Project {0}".format(tmpdir.join("alpha")))
+    beta = output.index("Project {0}".format(tmpdir.join("beta")))
+    not_there = output.index("Project {0}".format(tmpdir.join("not_there")))
+    assert alpha < beta < not_there
+    assert output[alpha + 1:beta] == ["*** FAIL: has a license", "*** FAIL: has a readme", "    pass: has no stash",
+                                      "    pass: has no uncommitted changes"]
+    assert output[beta + 1:not_there] == ["    pass: has no stash", "    pass: has no uncommitted changes"]
+    unquoted = output.index("Project {0}".format(tmpdir.join("unquoted")))
+    assert output[not_there + 1:unquoted] == ["*** FAIL: has valid options"]
+    # The whole batch shares one cache and one way of writing reports, so a directory can't ask for its own.
+    assert output[unquoted + 1:] == ["*** FAIL: has valid options", "Project {0}".format(tmpdir.join("alpha")),
+                                     "*** FAIL: has valid options"]
+
+    names = [str(tmpdir.join(name)).encode("utf-8") for name in ("alpha", "beta")]
+    tmpdir.join("batch").write_binary(b"\0".join(names))
+    return_code, output = start_process(["--batch", "batch", "-0", "--no-cache", "--ignore-no-remotes",
+                                         "--ignore-unpushed", "--ignore-missing-readme", "--ignore-missing-license"])
+    assert return_code == 0
+    assert len(output) == 6
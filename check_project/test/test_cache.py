@@ -0,0 +1,113 @@
+import sqlite3
+import subprocess
+import threading
+import pytest
+import mock
+from check_project.cache import fingerprint, ResultCache, cached
+from check_project.cli import start_process
+
+
+def test_fingerprint_follows_repository_state(tmpdir, make_repo):
+    make_repo()
+    assert fingerprint("not_there") is None
+
+    seen = set([fingerprint("hello_world")])
+    assert fingerprint("hello_world") in seen
+
+    with open('hello_world/LICENSE', 'w') as f:
+        f.write("insert MIT license text here")
+    seen.add(fingerprint("hello_world"))
+
+    # Staging only shows in `git status`, which is run every time anyway.
+    subprocess.call(["git", "add", "LICENSE"],
+                    cwd="hello_world")
+    assert fingerprint("hello_world") in seen
+
+    subprocess.call(["git", "stash"],
+                    cwd="hello_world")
+    seen.add(fingerprint("hello_world"))
+
+    subprocess.call(["git", "remote", "add", "jrandomremote", "/nowhere"],
+                    cwd="hello_world")
+    seen.add(fingerprint("hello_world"))
+    assert len(seen) == 4
+
+
+def test_result_cache_evicts_least_recently_used(tmpdir):
+    cache = ResultCache(str(tmpdir.join("cache.sqlite")), max_entries=2)
+    report = {"has a readme": (True, "README exists and isn't empty.")}
+    cache.put("/a", "{}", "fingerprint a", report)
+    cache.put("/b", "{}", "fingerprint b", report)
+    cache.put("/c", "{}", "fingerprint c", report)
+    assert cache.get("/a", "{}", "fingerprint a") == report
+    assert cache.get("/a", "{}", "a different fingerprint") is None
+    assert cache.get("/a", "other options", "fingerprint a") is None
+    cache.close()
+
+    cache = ResultCache(str(tmpdir.join("cache.sqlite")), max_entries=2)
+    assert cache.get("/a", "{}", "fingerprint a") == report
+    assert cache.get("/b", "{}", "fingerprint b") is None
+    assert cache.get("/c", "{}", "fingerprint c") == report
+
+
+def test_result_cache_closes_every_thread_connection(tmpdir):
+    with ResultCache(str(tmpdir.join("cache.sqlite"))) as cache:
+        threads = [threading.Thread(target=cache.get, args=("/a", "{}", "fingerprint a")) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        connections = list(cache._connections)
+        assert len(connections) == 4
+    for connection in connections:
+        with pytest.raises(sqlite3.ProgrammingError):
+            connection.execute("SELECT 1")
+
+
+def test_cached_skips_unchanged_repositories(tmpdir, make_repo):
+    make_repo()
+    cache = ResultCache(str(tmpdir.join("cache.sqlite")))
+    check = mock.Mock(return_value={"has a readme": (True, "README exists and isn't empty.")})
+
+    cached(cache, check, "hello_world", "{}")
+    cached(cache, check, "hello_world", "{}")
+    assert check.call_count == 1
+
+    with open('hello_world/untracked', 'w') as f:
+        f.write("woooooo")
+    cached(cache, check, "hello_world", "{}")
+    assert check.call_count == 2
+
+
+def test_cached_always_looks_for_uncommitted_changes(tmpdir, make_repo):
+    make_repo()
+    tmpdir.join("hello_world", "src", "f.py").write("print('hello')\n", ensure=True)
+    subprocess.call(["git", "add", "src/f.py"],
+                    cwd="hello_world")
+    subprocess.call(["git", "commit", "-m", "Add f.py"],
+                    cwd="hello_world")
+    make_repo("other")
+    for engine in ("threads", "asyncio"):
+        args = ["-d", "hello_world", "-d", "other", "--engine", engine,
+                "--cache-file", str(tmpdir.join(engine + ".sqlite"))]
+        assert "*** FAIL: has no uncommitted changes" not in start_process(args)[1]
+
+        # Below the top of the project and not staged, so nothing the fingerprint looks at changes.
+        tmpdir.join("hello_world", "src", "f.py").write("print('goodbye')\n")
+        assert "*** FAIL: has no uncommitted changes" in start_process(args)[1]
+        subprocess.call(["git", "checkout", "src/f.py"],
+                        cwd="hello_world")
+
+
+def test_start_process_uses_cache(tmpdir, make_repo):
+    make_repo()
+    first = start_process(["-d", "hello_world", "--verbose"])
+    with mock.patch('check_project.cli.check_project') as mock_check_project:
+        mock_check_project.return_value = {}
+        assert start_process(["-d", "hello_world", "--verbose"]) == first
+        # Only to look for uncommitted changes again.
+        assert mock_check_project.call_count == 1
+        assert mock_check_project.call_args[1]["only"] == ["has no uncommitted changes"]
+
+        start_process(["-d", "hello_world", "--verbose", "--no-cache"])
+        assert mock_check_project.call_args[1]["only"] is None
@@ -0,0 +1,37 @@
+import pytest
+from check_project.catfile import CatFile, CatFileError, CHUNK_SIZE
+from check_project.gitproject import GitProject
+from check_project.instrument import Profiler
+
+
+def test_info_and_read(tmpdir, make_repo):
+    head = make_repo()
+    with CatFile(str(tmpdir.join("hello_world"))) as cat_file:
+        info = cat_file.info([b"HEAD", b"HEAD:README", b"HEAD:LICENSE", b"0" * 40])
+        assert info[0][:2] == (head, b"commit")
+        assert info[1][1:] == (b"blob", len("Saluton, Mundo!"))
+        assert info[2:] == [None, None]
+
+        assert cat_file.read(b"HEAD:README")[1:] == (b"blob", b"Saluton, Mundo!")
+        assert cat_file.read(b"HEAD:LICENSE") is None
+        assert cat_file.read(b"HEAD")[2].startswith(b"tree ")
+
+        # More than fit in one go, all down the same pipe.
+        assert cat_file.info([b"HEAD"] * (CHUNK_SIZE * 3 + 1)) == [info[0]] * (CHUNK_SIZE * 3 + 1)
+        processes = [cat_file._check.process, cat_file._contents.process]
+
+    assert [process.poll() for process in processes] == [0, 0]
+    with pytest.raises(CatFileError):
+        cat_file.info([b"HEAD"])
+
+
+def test_project_shares_one_cat_file(tmpdir, make_repo):
+    head = make_repo()
+    with GitProject("hello_world") as project:
+        with Profiler() as profiler:
+            assert project.commits_present([head, b"1" * 40]) == {head}
+            assert project.commits_present([head]) == {head}
+            assert project.commits_present([]) == set()
+        process = project.cat_file._check.process
+    assert process.poll() == 0
+    assert [event.name for event in profiler.events] == [('git', 'cat-file', '--batch-check')] * 2
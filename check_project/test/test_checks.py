@@ -0,0 +1,89 @@
+import subprocess
+from mock import Mock
+from check_project.checks import Check, CHECKS, enabled_checks, register, skipped_by_options, unregister
+from check_project.cli import check_project, parse_args, start_process
+from check_project.gitproject import GitProject
+
+
+def test_enabled_checks_cheapest_first():
+    categories = [check.category for check in enabled_checks()]
+    assert categories == ["has a readme", "has a license", "has remotes", "has no stash",
+                          "has no uncommitted changes", "has no unpushed commits", "has every branch on a remote"]
+    categories = [check.category for check in enabled_checks(["ignore_remotes"], only=["has remotes", "has no stash"])]
+    assert categories == ["has no stash"]
+
+
+def test_skipped_by_options():
+    assert skipped_by_options(parse_args([])) == ["ignore_remote_branches"]
+    assert skipped_by_options(parse_args(["--verify-remotes"])) == []
+    skipped = skipped_by_options(parse_args(["--ignore-no-remotes", "--ignore-uncommitted", "--ignore-unpushed"]))
+    assert sorted(skipped) == ["ignore_remote_branches", "ignore_remotes", "ignore_uncommitted_changes",
+                               "ignore_unpushed_commits"]
+
+
+def test_registered_checks_share_facts(tmpdir):
+    tmpdir.chdir()
+    tmpdir.mkdir("hello_world")
+    subprocess.call(["git", "init"],
+                    cwd="hello_world")
+    project = GitProject("hello_world")
+    calls = []
+    git = project.git
+
+    def counting_git(*args):
+        calls.append(args)
+        return git(*args)
+    project.git = counting_git
+
+    def has_origin(project, options):
+        if b"origin" in project.snapshot.remotes:
+            return True, "There's an origin."
+        return False, "There's no origin."
+
+    register(Check("has an origin", has_origin, needs=["remotes"]))
+    try:
+        report = check_project(project, [], False)
+    finally:
+        unregister("has an origin")
+    assert report["has an origin"] == (False, "There's no origin.")
+    assert not report["has remotes"][0]
+    assert calls.count(('remote',)) == 1
+    assert len(CHECKS) == 7
+
+    report = check_project(project, ["ignore_missing_readme"], False)
+    assert "has an origin" not in report
+    assert "has a readme" not in report
+
+
+def test_check_project_runs_registered_checks():
+    check = Mock(return_value=(True, "Fine."))
+    register(Check("is fine", check))
+    try:
+        project = Mock()
+        report = check_project(project, ["ignore_is_fine"], False)
+        assert "is fine" not in report
+        report = check_project(project, [], False, show_changes=3)
+    finally:
+        unregister("is fine")
+    assert report["is fine"] == (True, "Fine.")
+    check.assert_called_once_with(project, {"ignore_unpushed_if_no_remotes": False, "show_changes": 3,
+                                            "remote_tips": None})
+
+
+def test_ignore_options(tmpdir):
+    tmpdir.chdir()
+    tmpdir.mkdir("hello_world")
+    subprocess.call(["git", "init"],
+                    cwd="hello_world")
+    with open('hello_world/untracked', 'w') as f:
+        f.write("woooooo")
+
+    return_code, output = start_process(["-d", "hello_world", "--no-cache"])
+    assert "*** FAIL: has no uncommitted changes" in output
+    assert "*** FAIL: has remotes" in output
+
+    return_code, output = start_process(["-d", "hello_world", "--no-cache", "--ignore-uncommitted",
+                                         "--ignore-no-remotes", "--ignore-unpushed", "--ignore-missing-readme",
+                                         "--ignore-missing-license"])
+    assert output == ["    pass: has no stash"]
+    assert return_code == 0
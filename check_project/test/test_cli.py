@@ -4,7 +4,8 @@ import pytest
 from check_project.cli import parse_args, \
     generate_exit_code, \
     check_project, \
-    generate_output, main
+    generate_output, \
+    generate_record, main
 
 
 def test_parser_unspecified_directory(tmpdir):
@@ -257,3 +258,64 @@ def test_main_other_output_failure(capsys):
     out, err = capsys.readouterr()
     assert out == "jb\nkg\nlee\n"
     assert not err
+
+
+def test_parser_counts_are_positive():
+    assert parse_args(["--jobs", "2", "--cache-size", "10"]).jobs == 2
+    for option in ("--jobs", "--cache-size", "--remote-connections"):
+        for value in ("0", "-1", "many"):
+            with pytest.raises(SystemExit):
+                parse_args([option, value])
+
+
+def test_parser_multiple_directories():
+    parser = parse_args(["-d", "/foo", "-d", "/bar"])
+    assert parser.directory == "/bar"
+    assert parser.directories == ["/foo", "/bar"]
+
+    parser = parse_args([])
+    assert parser.directories == []
+    assert parser.roots == []
+
+
+def test_generate_output_show_directory():
+    issues = {'has a license': (True, "LICENSE exists and isn't empty.")}
+    output = generate_output(issues, verbose=False, quiet=False, directory="/foo/bar/baz", show_directory=True)
+    assert "/foo/bar/baz" in output[0]
+    assert "LICENSE exists" not in "\n".join(output)
+
+
+def test_check_project_fail_fast():
+    project = Mock()
+    project.check_for_nonempty_file.return_value = (False, "Where is your README?")
+    report = check_project(project,
+                           skip_checks=[],
+                           ignore_unpushed_if_no_remotes=False,
+                           fail_fast=True)
+    assert report == {"has a readme": (False, "Where is your README?")}
+    assert not project.check_remotes.called
+    assert not project.check_uncommitted_changes.called
+
+    project.reset_mock()
+    project.check_for_nonempty_file.return_value = (True, "README exists and isn't empty.")
+    project.check_remotes.return_value = (True, "There is at least one remote.")
+    project.check_git_stash.return_value = (False, "Run `git stash list` to see the stashes.")
+    report = check_project(project,
+                           skip_checks=[],
+                           ignore_unpushed_if_no_remotes=False,
+                           fail_fast=True)
+    assert sorted(report) == ["has a license", "has a readme", "has no stash", "has remotes"]
+    assert not project.check_uncommitted_changes.called
+    assert not project.check_unpushed_commits.called
+
+
+def test_generate_record():
+    issues = {'has a license': (True, "LICENSE exists and isn't empty."),
+              'has remotes': (False, "There are no remotes.")}
+    record = generate_record(issues, "/foo/bar/baz", {"check_remotes": 0.5})
+    assert record == {"path": "/foo/bar/baz",
+                      "passed": False,
+                      "report": {"has a license": {"passed": True, "message": "LICENSE exists and isn't empty."},
+                                 "has remotes": {"passed": False, "message": "There are no remotes."}},
+                      "failures": [{"check": "has remotes", "message": "There are no remotes."}],
+                      "timings": {"check_remotes": 0.5}}
@@ -1,3 +1,4 @@
+import json
 import subprocess
 from check_project.cli import start_process
 
@@ -75,3 +76,112 @@ def test_success_verbose_is_verbose(tmpdir):
     return_code, output = start_process(["-d", "hello_world", "--verbose"])
     assert str(tmpdir.join("hello_world")) in "\n".join(output)
     assert return_code == 0
+
+
+def test_multiple_projects(tmpdir):
+    tmpdir.chdir()
+    tmpdir.mkdir("projects")
+    for name in ("alpha", "beta"):
+        tmpdir.join("projects").mkdir(name)
+        subprocess.call(["git", "init"],
+                        cwd="projects/" + name)
+    tmpdir.mkdir("not_a_project")
+
+    with open('projects/beta/README', 'w') as f:
+        f.write("Saluton, Mundo!")
+
+    return_code, output = start_process(["--root", "projects", "-d", "not_a_project"])
+    assert return_code == 3
+    alpha = output.index("Project {0}".format(tmpdir.join("projects", "alpha")))
+    beta = output.index("Project {0}".format(tmpdir.join("projects", "beta")))
+    not_a_project = output.index("Project {0}".format(tmpdir.join("not_a_project")))
+    assert not_a_project < alpha < beta
+    assert "*** FAIL: has a readme" in output[alpha:beta]
+    assert "    pass: has a readme" in output[beta:]
+    assert "*** FAIL: is a git repository" in output[not_a_project:alpha]
+
+    # A directory that isn't there fails the same way, without losing the other reports.
+    return_code, output = start_process(["-d", "projects/alpha", "-d", "missing", "-v"])
+    assert return_code == 3
+    assert "*** FAIL: is a git repository -- Path {0} doesn't exist.".format(tmpdir.join("missing")) in output
+    assert "Project {0}".format(tmpdir.join("projects", "alpha")) in output
+
+    # Nor does one that git won't work in.
+    tmpdir.mkdir("broken").join(".git").write("garbage")
+    for engine in ("threads", "asyncio"):
+        return_code, output = start_process(["-d", "broken", "-d", "projects/alpha", "--engine", engine,
+                                             "--no-cache"])
+        assert return_code == 3
+        broken = output.index("Project {0}".format(tmpdir.join("broken")))
+        assert output[broken + 1] == "*** FAIL: is a git repository"
+        assert "Project {0}".format(tmpdir.join("projects", "alpha")) in output
+
+
+def test_fail_fast(tmpdir):
+    tmpdir.chdir()
+    for name in ("alpha", "beta", "gamma"):
+        tmpdir.mkdir(name)
+        subprocess.call(["git", "init"],
+                        cwd=name)
+    with open('alpha/README', 'w') as f:
+        f.write("Saluton, Mundo!")
+
+    for engine in ("threads", "asyncio"):
+        return_code, output = start_process(["-d", "gamma", "--fail-fast", "--engine", engine, "--no-cache"])
+        assert return_code == 3
+        assert output == ["*** FAIL: has a readme"]
+
+        return_code, output = start_process(["-d", "alpha", "-d", "beta", "-d", "gamma", "--jobs", "1",
+                                             "--fail-fast", "--stop-on-failure", "--engine", engine,
+                                             "--no-cache"])
+        assert return_code == 3
+        assert "Project {0}".format(tmpdir.join("gamma")) not in output
+
+
+def test_json_lines(tmpdir):
+    tmpdir.chdir()
+    tmpdir.mkdir("projects")
+    for name in ("alpha", "beta"):
+        tmpdir.join("projects").mkdir(name)
+        subprocess.call(["git", "init"],
+                        cwd="projects/" + name)
+    with open('projects/beta/README', 'w') as f:
+        f.write("Saluton, Mundo!")
+
+    written = []
+    return_code, output = start_process(["--root", "projects", "--format", "jsonl", "--no-cache"],
+                                        write=written.append)
+    assert return_code == 3
+    assert output == []
+    records = dict((record["path"], record) for record in map(json.loads, written))
+    assert sorted(records) == [str(tmpdir.join("projects", "alpha")), str(tmpdir.join("projects", "beta"))]
+    alpha = records[str(tmpdir.join("projects", "alpha"))]
+    assert not alpha["passed"]
+    assert {"check": "has a readme",
+            "message": "Either there isn't a file with a name starting with README, or it is empty."} \
+        in alpha["failures"]
+    assert alpha["report"]["has no stash"]["passed"]
+    assert alpha["timings"]["check_git_stash"] >= 0
+    assert alpha["timings"]["total"] >= alpha["timings"]["check_git_stash"]
+
+    return_code, output = start_process(["--root", "projects", "--format", "json", "--no-cache"])
+    assert sorted(record["path"] for record in json.loads("\n".join(output))) == sorted(records)
+
+    return_code, output = start_process(["-d", "projects/beta", "--format", "json", "--no-cache"])
+    record, = json.loads("\n".join(output))
+    assert record["report"]["has a readme"]["passed"]
+
+
+def test_untracked_option(tmpdir):
+    tmpdir.chdir()
+    tmpdir.mkdir("hello_world")
+    subprocess.call(["git", "init"],
+                    cwd="hello_world")
+    with open('hello_world/README', 'w') as f:
+        f.write("Saluton, Mundo!")
+
+    args = ["-d", "hello_world", "--no-cache", "--ignore-no-remotes", "--ignore-unpushed", "--ignore-missing-license"]
+    assert start_process(args)[0] == 3
+    assert start_process(args + ["--untracked", "no"])[0] == 0
+    assert start_process(args + ["--untracked", "no", "--fast-status"])[0] == 0
+    assert start_process(args + ["--fast-status"])[0] == 3
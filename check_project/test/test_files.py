@@ -0,0 +1,62 @@
+import os
+import subprocess
+from check_project import files
+from check_project.files import find_nonempty_files, scan_directory
+from check_project.gitproject import GitProject
+from check_project.instrument import Profiler
+
+
+def test_find_nonempty_files(tmpdir):
+    tmpdir.join("README").write("")
+    tmpdir.join("README.md").write("Saluton, Mundo!")
+    tmpdir.join("LICENCE").write("MIT")
+    tmpdir.mkdir("CONTRIBUTING")
+    tmpdir.join("CHANGELOG.rst").mksymlinkto(tmpdir.join("not_there"))
+    found = find_nonempty_files(scan_directory(str(tmpdir)),
+                                ["README", "LICEN[CS]E*", "LICENSE", "CONTRIBUTING", "CHANGELOG", "*.md"])
+    assert found == {"README": ["README.md"],
+                     "LICEN[CS]E*": ["LICENCE"],
+                     "LICENSE": [],
+                     "CONTRIBUTING": [],
+                     "CHANGELOG": [],
+                     "*.md": ["README.md"]}
+
+
+def test_one_pass_for_every_file_check(tmpdir, monkeypatch):
+    tmpdir.chdir()
+    subprocess.call(["git", "init", "hello_world"])
+    for name in ("README.rst", "LICENSE", "setup.py"):
+        tmpdir.join("hello_world", name).write("Saluton, Mundo!")
+    scans = []
+    scandir = os.scandir
+
+    def counting_scandir(path):
+        scans.append(path)
+        return scandir(path)
+    monkeypatch.setattr(files.os, "scandir", counting_scandir)
+
+    project = GitProject("hello_world")
+    project.take_snapshot()
+    assert project.check_for_nonempty_file("README")[0]
+    assert project.check_for_nonempty_file("LICENSE")[0]
+    assert project.find_nonempty_files(["CONTRIBUTING", "setup"]) == {"CONTRIBUTING": False, "setup": "setup.py"}
+    assert len(scans) == 1
+
+
+def test_tracked_files(tmpdir):
+    tmpdir.chdir()
+    subprocess.call(["git", "init", "hello_world"])
+    for name in ("README.md", "README.rst", "LICENSE"):
+        tmpdir.join("hello_world", name).write("Saluton, Mundo!")
+    subprocess.call(["git", "add", "README.rst"],
+                    cwd="hello_world")
+
+    with GitProject("hello_world") as project:
+        project.take_snapshot()
+        assert project.find_nonempty_files(["README", "LICENSE"]) == {"README": "README.md", "LICENSE": "LICENSE"}
+        with Profiler() as profiler:
+            found = project.find_nonempty_files(["README", "LICENSE"], tracked=True)
+            assert project.check_for_nonempty_file("README", tracked=True)[0]
+        assert found == {"README": "README.rst", "LICENSE": False}
+        assert [event.name for event in profiler.events if event.kind == "git"] == [
+            ('git', 'cat-file', '--batch-check')]
@@ -0,0 +1,97 @@
+import subprocess
+import pytest
+from check_project.gitdir import find_git_dir, read_config_file, UnreadableGitDir
+from check_project.gitproject import GitProject, FilesystemGitProject, GitProjectException
+
+
+def forbid_git(project):
+    def no_git(*args):
+        raise AssertionError("ran git {0}".format(args))
+    project.git = no_git
+
+
+def test_read_config_file(tmpdir):
+    tmpdir.join("included").write('[remote "from-include"]\n\turl = elsewhere\n')
+    tmpdir.join("config").write('[core]\n'
+                                '\tbare = false\n'
+                                '[remote "origin"]  # comment\n'
+                                '\turl = https://example.com/repo.git\n'
+                                '[Remote.legacy]\n'
+                                '\turl = old\n'
+                                '[include]\n'
+                                '\tpath = included\n')
+    entries = read_config_file(str(tmpdir.join("config")))
+    assert ("core", None, "bare", "false") in entries
+    assert ("remote", "origin", "url", "https://example.com/repo.git") in entries
+    assert ("remote", "legacy", "url", "old") in entries
+    assert ("remote", "from-include", "url", "elsewhere") in entries
+
+    tmpdir.join("config").write('[remote "quoted"]\n'
+                                '\turl = "https://host/a#b" ; comment\n'
+                                '\tpushurl = https://host/c\\"d # comment\n'
+                                '\tfetch = " spaced ; out "  \n')
+    entries = read_config_file(str(tmpdir.join("config")))
+    assert ("remote", "quoted", "url", "https://host/a#b") in entries
+    assert ("remote", "quoted", "pushurl", 'https://host/c"d') in entries
+    assert ("remote", "quoted", "fetch", " spaced ; out ") in entries
+
+    tmpdir.join("config").write('[includeIf "gitdir:~/work/"]\n\tpath = included\n')
+    with pytest.raises(UnreadableGitDir):
+        read_config_file(str(tmpdir.join("config")))
+
+
+def test_refs_match_git(tmpdir, make_repo):
+    make_repo()
+    subprocess.call(["git", "branch", "packed"], cwd="hello_world")
+    subprocess.call(["git", "pack-refs", "--all"], cwd="hello_world")
+    subprocess.call(["git", "branch", "loose"], cwd="hello_world")
+    with open('hello_world/README', 'a') as f:
+        f.write("woooooo")
+    subprocess.call(["git", "stash"], cwd="hello_world")
+
+    git_dir = find_git_dir("hello_world")
+    assert git_dir.read_refs((b"refs/heads/", b"refs/remotes/", b"refs/stash")) == \
+        GitProject("hello_world").read_refs()
+
+
+def test_worktrees_share_refs(tmpdir, make_repo):
+    make_repo()
+    subprocess.call(["git", "worktree", "add", "../other_tree"], cwd="hello_world")
+    git_dir = find_git_dir("other_tree")
+    assert git_dir.common_dir == str(tmpdir.join("hello_world", ".git"))
+    assert b"refs/heads/other_tree" in git_dir.read_refs()
+
+
+def test_filesystem_project_needs_no_git_for_cheap_checks(tmpdir, make_repo):
+    make_repo()
+    tmpdir.mkdir("the_remote")
+    subprocess.call(["git", "init", "--bare"],
+                    cwd="the_remote")
+    subprocess.call(["git", "remote", "add", "jrandomremote",
+                     str(tmpdir.join("the_remote"))],
+                    cwd="hello_world")
+    subprocess.call(["git", "push", "jrandomremote", "master"],
+                    cwd="hello_world")
+
+    q = FilesystemGitProject("hello_world")
+    forbid_git(q)
+    assert q.get_remotes() == [b"jrandomremote"]
+    assert q.read_remote_urls() == {b"jrandomremote": str(tmpdir.join("the_remote"))}
+    assert q.check_remotes()[0]
+    assert not q.has_git_stash()
+    assert q.get_commits_not_pushed_to_existing_remotes() == []
+    assert q.check_unpushed_commits()[0]
+
+
+def test_filesystem_project_falls_back_to_git_log(tmpdir, make_repo):
+    make_repo()
+    q = FilesystemGitProject("hello_world")
+    assert len(q.get_commits_not_pushed_to_existing_remotes()) == 1
+    assert not q.check_unpushed_commits()[0]
+
+
+def test_filesystem_project_fails_no_git(tmpdir):
+    tmpdir.chdir()
+    tmpdir.mkdir("hello_world")
+    with pytest.raises(GitProjectException):
+        FilesystemGitProject("hello_world")
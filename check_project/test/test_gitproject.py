@@ -1,7 +1,9 @@
 import os
 import subprocess
 import pytest
-from check_project.gitproject import GitProject, GitProjectException
+from check_project.gitproject import FilesystemGitProject, GitCommandError, GitProject, GitProjectException, \
+    status_arguments
+from check_project.instrument import Profiler
 
 
 # The tests here are a mix between testing git, and testing the program.
@@ -339,6 +341,7 @@ def test_get_remotes(tmpdir):
     subprocess.call(["git", "commit", "-m", "Initial commit."],
                     cwd="hello_world")
     assert not q.get_remotes()
+    assert q.read_remote_urls() == {}
     success = q.check_remotes()[0]
     assert not success
 
@@ -349,7 +352,178 @@ def test_get_remotes(tmpdir):
                      str(tmpdir.join("the_remote"))],
                     cwd="hello_world")
     assert len(q.get_remotes()) == 1 and b"jrandomremote" in q.get_remotes()
+    assert q.read_remote_urls() == {b"jrandomremote": str(tmpdir.join("the_remote"))}
     success = q.check_remotes()[0]
     assert success
 
     # It would probably be better to move the check_* tests to a mock-style.
+
+
+def test_stream_uncommitted_changes(tmpdir):
+    tmpdir.chdir()
+    tmpdir.mkdir("hello_world")
+    subprocess.call(["git", "init"],
+                    cwd="hello_world")
+
+    q = GitProject("hello_world")
+    assert q.stream_uncommitted_changes(limit=2) == []
+    assert not q.has_uncommitted_changes()
+
+    for n in range(5):
+        with open('hello_world/untracked{0}'.format(n), 'w') as f:
+            f.write("woooooo")
+    assert q.stream_uncommitted_changes(limit=2) == [b"untracked0", b"untracked1"]
+    assert len(q.stream_uncommitted_changes()) == 5
+    assert q.has_uncommitted_changes()
+
+    success, message = q.check_uncommitted_changes(sample=2)
+    assert not success
+    assert "untracked0, untracked1." in message
+
+
+def test_stream_uncommitted_changes_stops_git(tmpdir):
+    tmpdir.chdir()
+    tmpdir.mkdir("hello_world")
+    subprocess.call(["git", "init"],
+                    cwd="hello_world")
+    for n in range(5000):
+        with open('hello_world/untracked-build-artifact-with-a-long-name-{0:05d}.o'.format(n), 'w') as f:
+            f.write("woooooo")
+
+    q = GitProject("hello_world")
+    with Profiler() as profiler:
+        records = q.git_records('status', '--porcelain=v2', '-z', separator=b"\0")
+        assert next(records).startswith(b"? untracked-build-artifact")
+        records.close()
+    event, = profiler.events
+    assert event.exit_status != 0  # killed before it could finish writing
+    assert event.output_bytes < 5000 * len(b"? untracked-build-artifact-with-a-long-name-00000.o\0")
+
+    assert len(q.stream_uncommitted_changes(limit=1)) == 1
+
+
+def test_git_records_error(tmpdir):
+    tmpdir.chdir()
+    tmpdir.mkdir("hello_world")
+    subprocess.call(["git", "init"],
+                    cwd="hello_world")
+
+    q = GitProject("hello_world")
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        list(q.git_records('log'))
+    assert b"does not have any commits" in e.value.stderr
+    assert "does not have any commits" in str(e.value)
+
+
+def test_git_warnings_arent_output(tmpdir):
+    tmpdir.chdir()
+    tmpdir.mkdir("hello_world")
+    subprocess.call(["git", "init"],
+                    cwd="hello_world")
+    subprocess.call(["git", "-c", "user.name=My Name", "-c", "user.email=you@example.com",
+                     "commit", "--allow-empty", "-m", "Initial commit."],
+                    cwd="hello_world")
+    # git for-each-ref warns about this on stderr, and carries on.
+    tmpdir.join("hello_world", ".git", "refs", "heads", "broken").write("garbage\n")
+
+    q = GitProject("hello_world")
+    refs = q.read_refs()
+    assert len(refs) == 1 and b"refs/heads/broken" not in refs
+    assert b"warning" not in q.git('for-each-ref')
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        q.git('rev-parse', '--verify', 'no-such-branch')
+    assert e.value.output == b""
+    assert "Needed a single revision" in str(e.value)
+
+
+def test_validate_says_what_git_said(tmpdir):
+    tmpdir.chdir()
+    tmpdir.mkdir("broken").join(".git").write("garbage")
+    with pytest.raises(GitCommandError) as e:
+        GitProject("broken")
+    assert "invalid gitfile format" in str(e.value)
+
+
+def test_status_modes(tmpdir):
+    tmpdir.chdir()
+    tmpdir.mkdir("hello_world")
+    subprocess.call(["git", "init"],
+                    cwd="hello_world")
+    subprocess.call(["git", "config", "user.email", '"you@example.com"'],
+                    cwd="hello_world")
+    subprocess.call(["git", "config", "user.name", '"My Name"'],
+                    cwd="hello_world")
+    subprocess.call(["git", "commit", "--allow-empty", "-m", "Initial commit."],
+                    cwd="hello_world")
+    tmpdir.join("hello_world").mkdir("build")
+    for name in ("untracked", "build/one", "build/two"):
+        tmpdir.join("hello_world", name).write("woooooo")
+
+    assert status_arguments() == ('status', '--porcelain=v2', '-z')
+    q = GitProject("hello_world")
+    assert sorted(q.stream_uncommitted_changes(status=status_arguments("all"))) == [
+        b"build/one", b"build/two", b"untracked"]
+    assert sorted(q.stream_uncommitted_changes(status=status_arguments("normal"))) == [b"build/", b"untracked"]
+    assert q.stream_uncommitted_changes(status=status_arguments("no")) == []
+
+    fast = status_arguments("normal", fast=True)
+    assert fast[:4] == ('-c', 'core.untrackedCache=true', '-c', 'core.splitIndex=true')
+    assert sorted(q.stream_uncommitted_changes(status=fast)) == [b"build/", b"untracked"]
+    with open("hello_world/.git/index", "rb") as f:
+        assert b"UNTR" in f.read()  # the untracked cache, for next time
+
+    q.take_snapshot(status_arguments("no"))
+    assert q.check_uncommitted_changes()[0]
+    q.take_snapshot()
+    assert not q.check_uncommitted_changes()[0]
+
+
+def test_validate_does_not_run_status(tmpdir):
+    tmpdir.chdir()
+    tmpdir.mkdir("hello_world")
+    subprocess.call(["git", "init"],
+                    cwd="hello_world")
+    with Profiler() as profiler:
+        q = GitProject("hello_world")
+    assert [event.name[1] for event in profiler.events] == ['rev-parse']
+    assert q.repository.git_dir == str(tmpdir.join("hello_world", ".git"))
+    assert q.repository.work_tree == str(tmpdir.join("hello_world"))
+    assert not (q.repository.bare or q.repository.is_worktree or q.repository.is_submodule)
+
+    tmpdir.join("hello_world").mkdir("src")
+    assert GitProject("hello_world/src").repository.work_tree == str(tmpdir.join("hello_world"))
+
+
+def test_repository_layouts(tmpdir):
+    tmpdir.chdir()
+    subprocess.call(["git", "init", "--bare", "the_remote"])
+    subprocess.call(["git", "clone", "the_remote", "hello_world"])
+    subprocess.call(["git", "config", "user.email", '"you@example.com"'],
+                    cwd="hello_world")
+    subprocess.call(["git", "config", "user.name", '"My Name"'],
+                    cwd="hello_world")
+    subprocess.call(["git", "commit", "--allow-empty", "-m", "Initial commit."],
+                    cwd="hello_world")
+    subprocess.call(["git", "push", "origin", "HEAD"],
+                    cwd="hello_world")
+    subprocess.call(["git", "worktree", "add", "-b", "feature", "../feature"],
+                    cwd="hello_world")
+    subprocess.call(["git", "-c", "protocol.file.allow=always", "submodule", "add",
+                     str(tmpdir.join("the_remote")), "sub"],
+                    cwd="hello_world")
+
+    for project_class in (GitProject, FilesystemGitProject):
+        bare = project_class("the_remote")
+        assert bare.repository.bare
+        assert bare.repository.git_dir == str(tmpdir.join("the_remote"))
+        assert bare.get_uncommitted_changes() == []
+
+        worktree = project_class("feature").repository
+        assert worktree.is_worktree and not worktree.is_submodule
+        assert worktree.work_tree == str(tmpdir.join("feature"))
+        assert worktree.common_dir == str(tmpdir.join("hello_world", ".git"))
+
+        submodule = project_class("hello_world/sub").repository
+        assert submodule.is_submodule and not submodule.is_worktree
+        assert submodule.superproject == str(tmpdir.join("hello_world"))
+        assert submodule.git_dir == str(tmpdir.join("hello_world", ".git", "modules", "sub"))
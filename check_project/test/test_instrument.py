@@ -0,0 +1,63 @@
+import json
+import subprocess
+import pytest
+from check_project import instrument
+from check_project.cli import main, start_process
+from check_project.gitproject import GitProject
+
+
+def test_listeners_see_git_and_checks(tmpdir, make_repo):
+    make_repo()
+    q = GitProject("hello_world")
+    events = []
+    instrument.add_listener(events.append)
+    try:
+        q.check_remotes()
+        with pytest.raises(subprocess.CalledProcessError):
+            q.git("no-such-command")
+    finally:
+        instrument.remove_listener(events.append)
+    q.check_remotes()
+
+    git_remote, check_remotes, failure = events
+    assert git_remote.kind == "git"
+    assert git_remote.name == ("git", "remote")
+    assert git_remote.exit_status == 0
+    assert git_remote.output_bytes == 0
+    assert git_remote.path == q.path
+    assert check_remotes.kind == "check"
+    assert check_remotes.name == "check_remotes"
+    assert check_remotes.passed is False
+    assert check_remotes.duration >= git_remote.duration
+    assert failure.exit_status != 0
+    assert failure.output_bytes > 0
+
+
+def test_profile_output(tmpdir, make_repo):
+    make_repo()
+    return_code, output = start_process(["-d", "hello_world", "--quiet", "--no-cache",
+                                         "--profile", "--profile-json", "profile.json"])
+    text = "\n".join(output)
+    assert "git status" in text
+    assert "check_for_nonempty_file README" in text
+    assert "slowest projects:" in text
+    assert "has every branch on a remote" not in text  # only run with --verify-remotes
+    assert str(tmpdir.join("hello_world")) in text
+
+    with open("profile.json") as f:
+        events = json.load(f)
+    assert set(event["kind"] for event in events) == set(["git", "check", "category", "project"])
+    assert [(event["name"], event["passed"]) for event in events if event["kind"] == "project"] == \
+        [("check_project", False)]
+
+
+def test_profile_goes_to_stderr(tmpdir, make_repo, capsys):
+    make_repo("alpha")
+    make_repo("beta")
+    for engine in ("threads", "asyncio", "processes"):
+        with pytest.raises(SystemExit):
+            main(["-d", "alpha", "-d", "beta", "--no-cache", "--format", "json", "--profile", "--engine", engine])
+        out, err = capsys.readouterr()
+        assert len(json.loads(out)) == 2
+        assert "check_remotes" in err
+        assert str(tmpdir.join("alpha")) in err.split("slowest projects:")[1]
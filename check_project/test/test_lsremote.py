@@ -0,0 +1,143 @@
+import os
+import subprocess
+import pytest
+from check_project.cli import check_directory, start_process
+from check_project.gitproject import GitProject
+from check_project.lsremote import RemoteTips, resolve_url
+
+
+def make_clone(tmpdir, name, remote="the_remote"):
+    subprocess.call(["git", "clone", "file://" + str(tmpdir.join(remote)), name])
+    subprocess.call(["git", "config", "user.email", '"you@example.com"'],
+                    cwd=name)
+    subprocess.call(["git", "config", "user.name", '"My Name"'],
+                    cwd=name)
+    for filename in ("README", "LICENSE"):
+        tmpdir.join(name, filename).write("Saluton, Mundo!")
+
+
+def make_remote(tmpdir):
+    tmpdir.chdir()
+    subprocess.call(["git", "init", "--bare", "the_remote"])
+    make_clone(tmpdir, "hello_world")
+    subprocess.call(["git", "add", "README", "LICENSE"],
+                    cwd="hello_world")
+    subprocess.call(["git", "commit", "-m", "Initial commit."],
+                    cwd="hello_world")
+    subprocess.call(["git", "push", "origin", "HEAD:refs/heads/master"],
+                    cwd="hello_world")
+
+
+def test_resolve_url(tmpdir):
+    assert resolve_url("https://example.com/project.git", "/src/a") == "https://example.com/project.git"
+    assert resolve_url("git@example.com:project.git", "/src/a") == "git@example.com:project.git"
+    assert resolve_url("../remote", "/src/a") == os.path.normpath("/src/remote")
+    assert resolve_url("/src/remote", "/src/b") == os.path.normpath("/src/remote")
+
+
+def test_verify_remotes(tmpdir):
+    make_remote(tmpdir)
+    return_code, output = start_process(["-d", "hello_world", "--verify-remotes", "--no-cache", "-v"])
+    assert "    pass: has every branch on a remote -- The remotes have every branch." in output
+    assert return_code == 0
+
+    subprocess.call(["git", "checkout", "-b", "feature"],
+                    cwd="hello_world")
+    subprocess.call(["git", "commit", "--allow-empty", "-m", "Not pushed."],
+                    cwd="hello_world")
+    return_code, output = start_process(["-d", "hello_world", "--verify-remotes", "--no-cache", "-v"])
+    assert "*** FAIL: has every branch on a remote -- The remotes don't have feature." in output
+    assert return_code == 3
+
+    return_code, output = start_process(["-d", "hello_world", "--no-cache", "-v"])
+    assert not any("has every branch on a remote" in line for line in output)
+
+
+def test_verify_remotes_sees_past_stale_remote_tracking_branches(tmpdir):
+    make_remote(tmpdir)
+    subprocess.call(["git", "checkout", "-b", "feature"],
+                    cwd="hello_world")
+    subprocess.call(["git", "commit", "--allow-empty", "-m", "Pushed, then deleted."],
+                    cwd="hello_world")
+    subprocess.call(["git", "push", "origin", "feature"],
+                    cwd="hello_world")
+    # Someone else deletes the branch; origin/feature is still here until we fetch.
+    subprocess.call(["git", "branch", "-D", "feature"],
+                    cwd="the_remote")
+
+    return_code, output = start_process(["-d", "hello_world", "--no-cache"])
+    assert return_code == 0
+    return_code, output = start_process(["-d", "hello_world", "--no-cache", "--verify-remotes", "-v"])
+    assert "*** FAIL: has every branch on a remote -- The remotes don't have feature." in output
+
+
+def test_verify_remotes_unfetched_commits(tmpdir):
+    make_remote(tmpdir)
+    make_clone(tmpdir, "other")
+    subprocess.call(["git", "commit", "--allow-empty", "-m", "Pushed from elsewhere."],
+                    cwd="other")
+    subprocess.call(["git", "push", "origin", "HEAD:refs/heads/elsewhere"],
+                    cwd="other")
+    subprocess.call(["git", "checkout", "-b", "feature"],
+                    cwd="hello_world")
+    subprocess.call(["git", "commit", "--allow-empty", "-m", "Not pushed."],
+                    cwd="hello_world")
+
+    report = check_directory("hello_world", [], False, remote_tips=RemoteTips())
+    assert report["has every branch on a remote"] == (
+        False, "Can't tell whether the remotes have feature: the remotes have commits that haven't been fetched.")
+
+
+def test_verify_remotes_shares_ls_remote(tmpdir):
+    make_remote(tmpdir)
+    make_clone(tmpdir, "other")
+    subprocess.call(["git", "remote", "add", "same", "../the_remote"],
+                    cwd="other")
+    subprocess.call(["git", "remote", "add", "missing", str(tmpdir.join("not_there"))],
+                    cwd="other")
+
+    remote_tips = RemoteTips(connections=2)
+    asked = []
+    ls_remote = remote_tips.ls_remote
+
+    def counting_ls_remote(url, path=None):
+        asked.append(url)
+        return ls_remote(url, path)
+    remote_tips.ls_remote = counting_ls_remote
+
+    try:
+        assert check_directory("hello_world", [], False, remote_tips=remote_tips)["has every branch on a remote"][0]
+        report = check_directory("other", [], False, remote_tips=remote_tips)
+    finally:
+        remote_tips.close()
+    assert sorted(asked) == sorted(["file://" + str(tmpdir.join("the_remote")), str(tmpdir.join("the_remote")),
+                                    str(tmpdir.join("not_there"))])
+    # origin has master, so it doesn't matter that missing can't be asked.
+    assert report["has every branch on a remote"] == (True, "The remotes have every branch.")
+
+
+def test_remote_timeout(tmpdir, monkeypatch):
+    tmpdir.chdir()
+    subprocess.call(["git", "init", "hello_world"])
+    subprocess.call(["git", "remote", "add", "slow", "ext::sleep 30"],
+                    cwd="hello_world")
+    subprocess.call(["git", "config", "user.email", '"you@example.com"'],
+                    cwd="hello_world")
+    subprocess.call(["git", "config", "user.name", '"My Name"'],
+                    cwd="hello_world")
+    subprocess.call(["git", "commit", "--allow-empty", "-m", "Initial commit."],
+                    cwd="hello_world")
+    monkeypatch.setenv("GIT_CONFIG_COUNT", "1")
+    monkeypatch.setenv("GIT_CONFIG_KEY_0", "protocol.ext.allow")
+    monkeypatch.setenv("GIT_CONFIG_VALUE_0", "always")
+
+    remote_tips = RemoteTips(timeout=0.5)
+    success, message = GitProject("hello_world").check_remote_branches(remote_tips)
+    assert not success
+    assert message.endswith("slow couldn't be asked: it didn't answer within 0.5 seconds.")
+
+
+def test_verify_remotes_options():
+    for args in (["--verify-remotes", "--engine", "asyncio"], ["--verify-remotes", "--watch"]):
+        with pytest.raises(SystemExit):
+            start_process(args)
@@ -0,0 +1,63 @@
+import json
+import pytest
+from check_project.cli import start_process
+from check_project.processes import RecordLayout, RecordReader, Worker
+
+
+def test_records_round_trip():
+    layout = RecordLayout(["has a readme", "has remotes", "has no stash"])
+    buffer = bytearray(layout.size * 4)
+    reports = {"first": {"has a readme": (True, "README exists and isn't empty."),
+                         "has remotes": (False, "There are no remotes.")},
+               "second": {"has a readme": (True, "README exists and isn't empty."),
+                          "has remotes": (True, "There is at least one remote.")},
+               "third": {"has something new": (True, "It does.")}}
+    worker = Worker(layout, buffer, 3, reports.get)
+    reader = RecordReader(layout, buffer)
+
+    number, new_messages, pickled, events = worker.check(1, ["first", "second", "third"])
+    assert number == 3
+    assert new_messages == ["README exists and isn't empty.", "There are no remotes.",
+                            "There is at least one remote."]
+    assert pickled == {2: reports["third"]}
+    reader.add_messages(number, new_messages)
+    assert reader.read(1) == reports["first"]
+    assert reader.read(2) == reports["second"]
+
+    # The messages have only been sent once, and the same record is read as the same report.
+    assert worker.check(0, ["first"]) == (3, [], {}, [])
+    assert reader.read(0) is reader.read(1)
+
+
+def test_engine_processes(tmpdir, make_repo):
+    for name in ["one", "two", "three"]:
+        make_repo(name)
+    tmpdir.mkdir("not_a_repository")
+    args = ["-d", "one", "-d", "not_a_repository", "-d", "two", "-d", "three", "--no-cache", "-v", "--jobs", "2"]
+    threads = start_process(args)
+    assert threads[0] == 3
+    assert start_process(args + ["--engine", "processes"]) == threads
+
+    return_code, output = start_process(args + ["--engine", "processes", "--format", "jsonl"])
+    assert len(output) == 4
+    # The workers send back how long each check took.
+    timings = dict((record["path"], record["timings"]) for record in map(json.loads, output))
+    assert set(timings[str(tmpdir.join("one"))]) >= set(["check_remotes", "check_for_nonempty_file README", "total"])
+
+
+def test_engine_processes_diff(tmpdir, make_repo):
+    for name in ["one", "two"]:
+        make_repo(name)
+    args = ["-d", "one", "-d", "two", "--no-cache", "--engine", "processes", "--jobs", "1", "--diff",
+            "--state-file", str(tmpdir.join("state.sqlite"))]
+    return_code, output = start_process(args)
+    assert output.count("*** FAIL: has remotes") == 2
+    return_code, output = start_process(args)
+    assert output == []
+
+
+def test_engine_processes_options():
+    for args in (["--engine", "processes", "--verify-remotes"],
+                 ["--engine", "processes", "--batch", "-"]):
+        with pytest.raises(SystemExit):
+            start_process(args)
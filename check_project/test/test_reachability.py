@@ -0,0 +1,127 @@
+import itertools
+import subprocess
+from check_project.commitgraph import load_commit_graph
+from check_project.gitdir import find_git_dir
+from check_project.reachability import ReachabilityCache, unpushed_branches
+
+
+def git(*args):
+    return subprocess.check_output(("git",) + args, cwd="hello_world").strip()
+
+
+def commit(message, *parents):
+    tree = git("write-tree")
+    args = ["commit-tree", tree, "-m", message]
+    for parent in parents:
+        args += ["-p", parent]
+    return git(*args).decode("ascii")
+
+
+def make_history(tmpdir):
+    """A little history with a merge and an octopus merge:
+
+        a - b - c ------- m - o
+             \\       /       /|
+              d - e      f -  g
+    """
+    tmpdir.chdir()
+    tmpdir.mkdir("hello_world")
+    subprocess.call(["git", "init"],
+                    cwd="hello_world")
+    subprocess.call(["git", "config", "user.email", '"you@example.com"'],
+                    cwd="hello_world")
+    subprocess.call(["git", "config", "user.name", '"My Name"'],
+                    cwd="hello_world")
+    commits = {}
+    commits["a"] = commit("a")
+    commits["b"] = commit("b", commits["a"])
+    commits["c"] = commit("c", commits["b"])
+    commits["d"] = commit("d", commits["b"])
+    commits["e"] = commit("e", commits["d"])
+    commits["m"] = commit("m", commits["c"], commits["e"])
+    commits["f"] = commit("f", commits["a"])
+    commits["g"] = commit("g", commits["a"])
+    commits["o"] = commit("o", commits["m"], commits["f"], commits["g"])
+    for name, sha in commits.items():
+        git("update-ref", "refs/heads/" + name, sha)
+    return commits
+
+
+def is_ancestor(ancestor, descendant):
+    return subprocess.call(["git", "merge-base", "--is-ancestor", ancestor, descendant], cwd="hello_world") == 0
+
+
+def test_commit_graph_matches_git(tmpdir):
+    commits = make_history(tmpdir)
+    objects = find_git_dir("hello_world").object_directories()[0]
+    assert load_commit_graph(objects) is None
+
+    git("commit-graph", "write", "--reachable")
+    graph = load_commit_graph(objects)
+    assert graph is load_commit_graph(objects)
+    for ancestor, descendant in itertools.product(commits.values(), repeat=2):
+        assert graph.reaches([descendant], ancestor) == is_ancestor(ancestor, descendant)
+    assert graph.reaches([commits["c"], commits["f"]], commits["a"])
+    assert graph.reaches([commits["c"], "0" * 40], commits["e"]) is None
+    assert graph.reaches([commits["o"]], "0" * 40) is None
+
+
+def test_split_commit_graph(tmpdir):
+    commits = make_history(tmpdir)
+    git("commit-graph", "write", "--reachable", "--split")
+    later = commit("later", commits["o"], commits["e"])
+    git("update-ref", "refs/heads/later", later)
+    git("commit-graph", "write", "--reachable", "--split=no-merge")
+
+    graph = load_commit_graph(find_git_dir("hello_world").object_directories()[0])
+    assert len(graph.files) == 2
+    assert graph.reaches([later], commits["g"])
+    assert not graph.reaches([commits["m"]], later)
+    assert not graph.reaches([commits["e"]], commits["c"])
+
+
+def test_unpushed_branches(tmpdir):
+    commits = make_history(tmpdir)
+    refs = {b"refs/heads/master": commits["c"].encode("ascii"),
+            b"refs/heads/topic": commits["e"].encode("ascii"),
+            b"refs/heads/done": commits["a"].encode("ascii"),
+            b"refs/remotes/origin/master": commits["m"].encode("ascii")}
+    directories = find_git_dir("hello_world").object_directories()
+    asked = []
+
+    def ask_git(unpushed):
+        def ask():
+            asked.append(unpushed)
+            return unpushed
+        return ask
+
+    answers = ReachabilityCache()
+    assert unpushed_branches(refs, directories, ask_git(set()), answers) == []
+    assert len(asked) == 1
+
+    # The same question in another clone is answered from memory.
+    assert unpushed_branches(refs, directories, ask_git(set()), answers) == []
+    assert len(asked) == 1
+
+    # So is one about more remote-tracking branches.
+    refs[b"refs/remotes/origin/f"] = commits["f"].encode("ascii")
+    assert unpushed_branches(refs, directories, ask_git(set()), answers) == []
+    assert len(asked) == 1
+
+    # And with a commit-graph, git isn't needed at all.
+    git("commit-graph", "write", "--reachable")
+    refs[b"refs/heads/g"] = commits["g"].encode("ascii")
+    assert unpushed_branches(refs, directories, ask_git(set()), answers) == [b"refs/heads/g"]
+    assert len(asked) == 1
+
+
+def test_unpushed_branches_with_alternates(tmpdir):
+    commits = make_history(tmpdir)
+    git("commit-graph", "write", "--reachable")
+    subprocess.call(["git", "clone", "--shared", "hello_world", "clone"])
+    directories = find_git_dir("clone").object_directories()
+    assert len(directories) == 2
+
+    refs = {b"refs/heads/master": commits["e"].encode("ascii"),
+            b"refs/remotes/origin/master": commits["o"].encode("ascii")}
+    assert unpushed_branches(refs, directories, None, ReachabilityCache()) == []
@@ -0,0 +1,66 @@
+import json
+import pickle
+from check_project.gitproject import stash_result, uncommitted_changes_result
+from check_project.report import as_pairs, CheckId, CheckResult, Report
+
+
+class Counted(object):
+    formatted = 0
+
+    def __format__(self, spec):
+        Counted.formatted += 1
+        return "counted"
+
+
+def test_check_result_is_like_a_tuple():
+    result = CheckResult(False, "There are no remotes.")
+    success, message = result
+    assert (success, message) == (False, "There are no remotes.")
+    assert result == (False, "There are no remotes.")
+    assert (False, "There are no remotes.") == result
+    assert result != (True, "There are no remotes.")
+    assert result[0] is False and result[1] == "There are no remotes."
+    assert hash(result) == hash((False, "There are no remotes."))
+
+
+def test_messages_are_formatted_when_read():
+    Counted.formatted = 0
+    result = CheckResult(True, "{0} exists and isn't empty.", Counted())
+    assert Counted.formatted == 0
+    assert result.message == "counted exists and isn't empty."
+    assert Counted.formatted == 1
+
+    result = uncommitted_changes_result([b"a", b"b", b"c"], sample=2)
+    assert result == (False, "Run `git status` to see the uncommitted changes, which include a, b.")
+
+
+def test_report_is_like_a_dict():
+    report = Report()
+    report["has remotes"] = (False, "There are no remotes.")
+    report["has no stash"] = stash_result(False)
+    report["is fine"] = (True, "Fine.")
+    assert report == {"has remotes": (False, "There are no remotes."),
+                      "has no stash": (True, "The git stash is empty."),
+                      "is fine": (True, "Fine.")}
+    assert report[CheckId.HAS_REMOTES].passed is False
+    assert sorted(report) == ["has no stash", "has remotes", "is fine"]
+    assert len(report) == 3
+    assert "has a readme" not in report
+    assert report.get("has a readme") is None
+
+    del report["has remotes"]
+    del report["is fine"]
+    assert list(report.items()) == [("has no stash", (True, "The git stash is empty."))]
+    # The same result is shared, not copied.
+    assert report["has no stash"] is stash_result(False)
+
+
+def test_report_round_trips():
+    report = Report([("has remotes", (False, "There are no remotes.")),
+                     ("has a readme", CheckResult(True, "{0} exists and isn't empty.", "README.md")),
+                     ("is fine", (True, "Fine."))])
+    assert pickle.loads(pickle.dumps(report)) == report
+    assert json.loads(json.dumps(as_pairs(report), sort_keys=True)) == {
+        "has remotes": [False, "There are no remotes."],
+        "has a readme": [True, "README.md exists and isn't empty."],
+        "is fine": [True, "Fine."]}
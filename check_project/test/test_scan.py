@@ -0,0 +1,86 @@
+import os
+import threading
+import time
+from check_project.discover import find_repositories
+from check_project.scan import scan_directories
+
+
+def test_scan_keeps_input_order():
+    def check(delay):
+        time.sleep(delay)
+        return delay
+
+    delays = [0.05, 0.0, 0.03, 0.01, 0.0, 0.02]
+    results = list(scan_directories(delays, check, jobs=3))
+    assert results == [(delay, delay) for delay in delays]
+
+
+def test_scan_unordered_yields_results_as_they_finish():
+    def check(delay):
+        time.sleep(delay)
+        return delay
+
+    results = list(scan_directories([0.3, 0.0, 0.0], check, jobs=3, ordered=False))
+    assert sorted(results) == [(0.0, 0.0), (0.0, 0.0), (0.3, 0.3)]
+    assert results[-1] == (0.3, 0.3)
+
+
+def test_scan_accepts_generators():
+    results = list(scan_directories((str(n) for n in range(20)), len, jobs=2))
+    assert [directory for directory, _ in results] == [str(n) for n in range(20)]
+
+
+def test_find_repositories(tmpdir):
+    tmpdir.mkdir("b").mkdir(".git")
+    tmpdir.mkdir("a").mkdir("nested").mkdir(".git")
+    tmpdir.join("a", "nested").mkdir("inner").mkdir(".git")
+    tmpdir.mkdir("worktree").join(".git").write("gitdir: /somewhere/else")
+    tmpdir.mkdir("not_a_repo")
+
+    found = list(find_repositories(str(tmpdir)))
+    assert found == [os.path.join(str(tmpdir), "a", "nested"),
+                     os.path.join(str(tmpdir), "b"),
+                     os.path.join(str(tmpdir), "worktree")]
+
+
+def test_find_repositories_options(tmpdir):
+    outer = tmpdir.mkdir("outer")
+    outer.mkdir(".git")
+    outer.mkdir("submodule").join(".git").write("gitdir: ../.git/modules/submodule")
+    outer.mkdir("build").mkdir("vendored").mkdir(".git")
+    tmpdir.mkdir("deep").mkdir("er").mkdir("est").mkdir(".git")
+    os.symlink(str(outer), str(tmpdir.join("link_to_outer")))
+
+    def found(**kwargs):
+        return [os.path.relpath(path, str(tmpdir)) for path in find_repositories(str(tmpdir), **kwargs)]
+
+    assert found() == ["deep/er/est", "outer"]
+    assert found(nested=True) == ["deep/er/est", "outer", "outer/build/vendored", "outer/submodule"]
+    assert found(nested=True, exclude=["build"]) == ["deep/er/est", "outer", "outer/submodule"]
+    assert found(nested=True, exclude=["outer/sub*"]) == ["deep/er/est", "outer", "outer/build/vendored"]
+    assert found(max_depth=2) == ["outer"]
+    assert found(max_depth=3) == ["deep/er/est", "outer"]
+
+
+def test_find_repositories_is_lazy(tmpdir):
+    tmpdir.mkdir("a").mkdir(".git")
+    tmpdir.mkdir("b").mkdir(".git")
+    repositories = find_repositories(str(tmpdir))
+    assert next(repositories) == str(tmpdir.join("a"))
+    tmpdir.join("b").remove()
+    assert list(repositories) == []
+
+
+def test_scan_stops_starting_checks():
+    stop = threading.Event()
+    started = []
+
+    def check(directory):
+        started.append(directory)
+        if directory == 2:
+            stop.set()
+        return directory
+
+    results = list(scan_directories(range(100), check, jobs=1, stop=stop))
+    assert [directory for directory, _ in results] == [0, 1, 2]
+    assert len(started) < 10
@@ -0,0 +1,92 @@
+import pytest
+from check_project.checks import check_groups, skipped_by_options
+from check_project.cli import parse_args, start_process
+from check_project.instrument import Event
+from check_project.schedule import Durations, plan
+
+GROUPS = [["has a readme", "has a license"], ["has no uncommitted changes"], ["has no unpushed commits"]]
+
+
+def test_check_groups():
+    assert check_groups() == [["has a readme", "has a license"], ["has no stash"], ["has no uncommitted changes"],
+                              ["has remotes", "has no unpushed commits"], ["has every branch on a remote"]]
+    assert ["has no unpushed commits"] in check_groups(["ignore_remotes"])
+    # Without --verify-remotes, there's no part to hand out for the remotes.
+    assert ["has every branch on a remote"] not in check_groups(skipped_by_options(parse_args([])))
+
+
+def test_plan():
+    remembered = {"/src/big": {"total": 9.0, "has a readme": 0.1, "has a license": 0.1,
+                               "has no uncommitted changes": 6.0, "has no unpushed commits": 2.8},
+                  "/src/small": {"total": 1.0},
+                  "/src/medium": {"total": 2.0}}
+    directories = ["/src/small", "/src/new", "/src/medium", "/src/big"]
+
+    # One worker: longest first, with the new project guessed at the average.
+    assert plan(directories, remembered, GROUPS, 1) == [
+        (3, "/src/big", None), (1, "/src/new", None), (2, "/src/medium", None), (0, "/src/small", None)]
+
+    # Two workers: big is more than half of everything, so it's split.
+    assert plan(directories, remembered, GROUPS, 2) == [
+        (3, "/src/big", frozenset(["has no uncommitted changes"])),
+        (1, "/src/new", None),
+        (3, "/src/big", frozenset(["has no unpushed commits", "has a readme", "has a license"])),
+        (2, "/src/medium", None), (0, "/src/small", None)]
+
+    # Unless the cache already has its report, or fail-fast keeps its checks together.
+    assert (3, "/src/big", None) in plan(directories, remembered, GROUPS, 2, lambda d: d == "/src/big")
+    assert (3, "/src/big", None) in plan(directories, remembered, [sum(GROUPS, [])], 2)
+
+
+def test_durations(tmpdir):
+    filename = str(tmpdir.join("durations.sqlite"))
+
+    def event(kind, name, duration):
+        event = Event(kind, name, "/src/a")
+        event.duration = duration
+        return event
+
+    durations = Durations(filename)
+    durations(event("category", "has a readme", 1.0))
+    durations(event("project", "check_project", 2.0))
+    durations(event("project", "check_project", 1.0))
+    durations(event("git", ("git", "status"), 5.0))
+    durations.close()
+
+    durations = Durations(filename)
+    assert durations.remembered() == {"/src/a": {"has a readme": 1.0, "total": 3.0}}
+    durations(event("project", "check_project", 1.0))
+    durations.close()
+    assert Durations(filename).remembered(["/src/a", "/src/b"]) == {"/src/a": {"has a readme": 1.0, "total": 2.0}}
+    assert Durations(filename).remembered(["/src/b"]) == {}
+
+
+def test_schedule(tmpdir, make_repo):
+    for name in ["one", "two", "three"]:
+        make_repo(name)
+    tmpdir.mkdir("not_a_repository")
+    durations_file = str(tmpdir.join("durations.sqlite"))
+    args = ["-d", "one", "-d", "not_a_repository", "-d", "two", "-d", "three", "--no-cache", "-v", "--jobs", "2"]
+    expected = start_process(args)
+    assert expected[0] == 3
+
+    scheduled = args + ["--schedule", "--durations-file", durations_file]
+    assert start_process(scheduled) == expected
+    remembered = Durations(durations_file).remembered()
+    assert sorted(remembered) == [str(tmpdir.join(name)) for name in ["one", "three", "two"]]
+    assert set(remembered[str(tmpdir.join("one"))]) >= set(["total", "has a readme", "has no uncommitted changes"])
+
+    # Make two look slow enough to split, and it still gets the same report, in the same place.
+    durations = Durations(durations_file)
+    with durations.connection:
+        durations.connection.execute("UPDATE durations SET seconds = 10 WHERE directory = ?",
+                                     (str(tmpdir.join("two")),))
+    durations.connection.close()
+    assert start_process(scheduled) == expected
+    assert start_process(scheduled + ["--format", "jsonl"])[0] == 3
+
+
+def test_schedule_options():
+    for args in (["--schedule", "--engine", "processes"], ["--schedule", "--watch"]):
+        with pytest.raises(SystemExit):
+            start_process(args)
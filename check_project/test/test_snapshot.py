@@ -0,0 +1,98 @@
+import subprocess
+from check_project.cli import check_project
+from check_project.gitproject import GitProject
+from check_project.snapshot import parse_porcelain_v2
+
+
+def count_git_calls(project):
+    calls = []
+    git = project.git
+    git_records = project.git_records
+
+    def counting_git(*args):
+        calls.append(args)
+        return git(*args)
+
+    def counting_git_records(*args, **kwargs):
+        calls.append(args)
+        return git_records(*args, **kwargs)
+
+    project.git = counting_git
+    project.git_records = counting_git_records
+    return calls
+
+
+def test_parse_porcelain_v2():
+    output = (b"1 .M N... 100644 100644 100644 abc abc modified file\0"
+              b"2 R. N... 100644 100644 100644 abc abc R100 new name\0old name\0"
+              b"u UU N... 100644 100644 100644 100644 abc abc abc conflicted\0"
+              b"? untracked\0")
+    assert parse_porcelain_v2(output) == [b"modified file", b"new name", b"conflicted", b"untracked"]
+    assert parse_porcelain_v2(b"") == []
+    # Kinds of record we don't know are skipped, not taken for paths.
+    assert parse_porcelain_v2(b"z something new\0? untracked\0") == [b"untracked"]
+
+
+def test_snapshot_matches_live_answers(tmpdir, make_repo):
+    make_repo()
+    q = GitProject("hello_world")
+    tmpdir.mkdir("the_remote")
+    subprocess.call(["git", "init", "--bare"],
+                    cwd="the_remote")
+    subprocess.call(["git", "remote", "add", "jrandomremote",
+                     str(tmpdir.join("the_remote"))],
+                    cwd="hello_world")
+    with open('hello_world/untracked', 'w') as f:
+        f.write("woooooo")
+
+    live = (q.get_uncommitted_changes(), q.has_git_stash(),
+            q.get_remotes(), len(q.get_commits_not_pushed_to_existing_remotes()))
+    q.take_snapshot()
+    assert live == (q.get_uncommitted_changes(), q.has_git_stash(),
+                    q.get_remotes(), len(q.get_commits_not_pushed_to_existing_remotes()))
+
+    subprocess.call(["git", "push", "jrandomremote", "master"],
+                    cwd="hello_world")
+    subprocess.call(["git", "stash", "-u"],
+                    cwd="hello_world")
+    q.take_snapshot()
+    assert q.get_uncommitted_changes() == []
+    assert q.has_git_stash()
+    assert q.get_commits_not_pushed_to_existing_remotes() == []
+
+
+def test_check_project_asks_git_once_per_fact(tmpdir, make_repo):
+    make_repo()
+    q = GitProject("hello_world")
+    calls = count_git_calls(q)
+    check_project(q, skip_checks=[], ignore_unpushed_if_no_remotes=False)
+    commands = [args[0] for args in calls]
+    # With no remote-tracking branches, nothing's been pushed, so there's no history to look at.
+    assert sorted(commands) == ['for-each-ref', 'remote', 'status']
+
+    tmpdir.mkdir("the_remote")
+    subprocess.call(["git", "init", "--bare"],
+                    cwd="the_remote")
+    subprocess.call(["git", "remote", "add", "jrandomremote",
+                     str(tmpdir.join("the_remote"))],
+                    cwd="hello_world")
+    subprocess.call(["git", "push", "jrandomremote", "master"],
+                    cwd="hello_world")
+    del calls[:]
+    report = check_project(q, skip_checks=[], ignore_unpushed_if_no_remotes=True)
+    assert report["has no unpushed commits"][0]
+    assert sorted(args[0] for args in calls) == ['for-each-ref', 'remote', 'status']
+
+    subprocess.call(["git", "commit", "--allow-empty", "-m", "Not pushed."],
+                    cwd="hello_world")
+    del calls[:]
+    report = check_project(q, skip_checks=[], ignore_unpushed_if_no_remotes=True)
+    assert not report["has no unpushed commits"][0]
+    assert sorted(args[0] for args in calls) == ['for-each-ref', 'remote', 'rev-list', 'status']
+    assert q.get_commits_not_pushed_to_existing_remotes() == [b"refs/heads/master"]
+
+    # Asking again, even in a fresh snapshot, is answered from memory.
+    del calls[:]
+    report = check_project(q, skip_checks=[], ignore_unpushed_if_no_remotes=True)
+    assert not report["has no unpushed commits"][0]
+    assert 'rev-list' not in [args[0] for args in calls]
@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+import check_project
+
+__author__ = 'wolf'
+
+# Generous, so a busy machine doesn't fail it; it's there to catch something heavy creeping back in.
+STARTUP_BUDGET_MS = 200
+
+# Only some ways of running need these, so they're imported where they're used.
+IMPORTED_LATER = ["asyncio", "concurrent.futures", "ctypes", "hashlib", "json", "mmap", "multiprocessing",
+                  "sqlite3", "subprocess", "check_project.asyncproject", "check_project.commitgraph",
+                  "check_project.processes", "check_project.schedule", "check_project.state",
+                  "check_project.watch"]
+
+
+def import_times(module):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.path.dirname(os.path.dirname(os.path.abspath(check_project.__file__)))
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                            stderr=subprocess.PIPE, env=env, check=True).stderr.decode("utf-8")
+    times = {}
+    for line in output.splitlines():
+        if line.startswith("import time:") and "self [us]" not in line:
+            own, cumulative, name = line[len("import time:"):].split("|")
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_cli_imports_only_what_it_needs():
+    times = import_times("check_project.cli")
+    assert [name for name in IMPORTED_LATER if name in times] == []
+
+
+def test_cli_imports_quickly():
+    best = min(import_times("check_project.cli")["check_project.cli"] for _ in range(3))
+    assert best / 1000.0 < STARTUP_BUDGET_MS
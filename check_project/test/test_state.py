@@ -0,0 +1,67 @@
+import json
+import subprocess
+from check_project.cli import start_process
+from check_project.state import compare, RunState
+
+
+def test_compare():
+    previous = {"has a readme": (True, "Yes."), "has no stash": (False, "Stashed."),
+                "has remotes": (False, "None."), "has a license": (False, "No.")}
+    report = {"has a readme": (False, "No."), "has no stash": (True, "Empty."),
+              "has remotes": (False, "Still none."), "has no uncommitted changes": (False, "Dirty.")}
+    assert compare(previous, report) == (["has a readme", "has no uncommitted changes"], ["has no stash"])
+    assert compare(None, report) == (["has a readme", "has no uncommitted changes", "has remotes"], [])
+
+
+def test_run_state_scopes(tmpdir):
+    filename = str(tmpdir.join("state.sqlite"))
+    state = RunState(filename, "mine")
+    assert state.previous() == {}
+    state.save({"/src/a": {"has a readme": (True, "Yes.")}})
+    state.close()
+
+    assert RunState(filename, "theirs").previous() == {}
+    state = RunState(filename, "mine")
+    assert state.previous() == {"/src/a": {"has a readme": (True, "Yes.")}}
+    state.save({"/src/b": {}})
+    assert state.previous() == {"/src/b": {}}
+
+
+def test_diff(tmpdir, make_repo):
+    tmpdir.chdir()
+    for name in ("alpha", "beta", "gamma"):
+        make_repo(name)
+    args = ["--root", ".", "--diff", "--state-file", "state.sqlite", "--ignore-no-remotes",
+            "--ignore-unpushed", "--ignore-missing-license"]
+
+    return_code, output = start_process(args)
+    assert return_code == 0
+    assert output == ["Project {0} (new)".format(tmpdir.join(name)) for name in ("alpha", "beta", "gamma")]
+
+    return_code, output = start_process(args)
+    assert (return_code, output) == (0, [])
+
+    tmpdir.join("alpha", "README").write("")
+    subprocess.call(["git", "stash"],
+                    cwd="alpha")  # stash the emptied README, and fail the stash check instead
+    tmpdir.join("beta", "scratch").write("uncommitted")
+    tmpdir.join("gamma").remove()
+    return_code, output = start_process(args + ["--verbose"])
+    assert return_code == 3
+    assert output == ["Project {0}".format(tmpdir.join("alpha")),
+                      "*** FAIL: has no stash -- Run `git stash list` to see the stashes.",
+                      "Project {0}".format(tmpdir.join("beta")),
+                      "*** FAIL: has no uncommitted changes -- Run `git status` to see the uncommitted changes.",
+                      "Project {0} (gone)".format(tmpdir.join("gamma"))]
+
+    # Still failing, but nothing new.
+    return_code, output = start_process(args + ["--new-failures-only"])
+    assert (return_code, output) == (0, [])
+    return_code, output = start_process(args)
+    assert (return_code, output) == (3, [])
+
+    tmpdir.join("beta", "scratch").remove()
+    return_code, output = start_process(args + ["--format", "jsonl"])
+    assert [json.loads(line) for line in output] == [
+        {"path": str(tmpdir.join("beta")), "change": "changed", "passed": True, "new_failures": [],
+         "fixed": [{"check": "has no uncommitted changes", "message": "There are no uncommitted changes."}]}]
@@ -0,0 +1,155 @@
+import ctypes
+import errno
+import subprocess
+import pytest
+from check_project.cli import check_project
+from check_project.checks import Check, register, unregister
+from check_project.watch import checks_for_change, GIT_DIR, WORK_TREE, \
+    InotifyWatcher, PollingWatcher, Watch
+
+
+def test_checks_for_change():
+    assert checks_for_change(GIT_DIR, "refs/stash") == {"has no stash", "has every branch on a remote"}
+    assert checks_for_change(GIT_DIR, "index") == {"has no uncommitted changes"}
+    assert checks_for_change(GIT_DIR, "index.lock") == set()
+    assert checks_for_change(GIT_DIR, "refs/heads/feature/x") == {"has no unpushed commits",
+                                                                  "has every branch on a remote"}
+    assert checks_for_change(GIT_DIR, "config") == {"has remotes", "has no unpushed commits",
+                                                    "has every branch on a remote"}
+    assert checks_for_change(GIT_DIR, "objects") == set()
+    assert checks_for_change(WORK_TREE, "README.md") == {"has a readme", "has a license",
+                                                         "has no uncommitted changes"}
+    assert checks_for_change(WORK_TREE, "setup.py") == checks_for_change(WORK_TREE, "README.md")
+    assert checks_for_change(WORK_TREE, ".git") == set()
+    assert len(checks_for_change(WORK_TREE, None)) == 7
+
+
+def test_checks_for_change_added_checks():
+    register(Check("has no stale branches", lambda project, options: None, needs=["refs"]))
+    try:
+        assert checks_for_change(GIT_DIR, "refs/heads/old") == {"has no stale branches", "has no unpushed commits",
+                                                                "has every branch on a remote"}
+        assert checks_for_change(GIT_DIR, "index") == {"has no uncommitted changes"}
+    finally:
+        unregister("has no stale branches")
+
+
+def make_project(tmpdir):
+    tmpdir.chdir()
+    tmpdir.mkdir("hello_world")
+    subprocess.call(["git", "init"],
+                    cwd="hello_world")
+    subprocess.call(["git", "config", "user.email", '"you@example.com"'],
+                    cwd="hello_world")
+    subprocess.call(["git", "config", "user.name", '"My Name"'],
+                    cwd="hello_world")
+    with open('hello_world/README.rst', 'w') as f:
+        f.write("Saluton, Mundo!")
+    subprocess.call(["git", "add", "README.rst"],
+                    cwd="hello_world")
+    subprocess.call(["git", "commit", "-m", "Initial commit."],
+                    cwd="hello_world")
+    return str(tmpdir.join("hello_world"))
+
+
+def make_watcher(kind):
+    if kind == "inotify":
+        try:
+            return InotifyWatcher()
+        except OSError:
+            pytest.skip("inotify isn't available here.")
+    return PollingWatcher(interval=0.01)
+
+
+@pytest.fixture(params=["inotify", "polling"])
+def watched(request, tmpdir, monkeypatch):
+    monkeypatch.setenv("GIT_OPTIONAL_LOCKS", "0")
+    directory = make_project(tmpdir)
+    runs = []
+
+    def check(project, only):
+        runs.append(only)
+        return check_project(project, [], False, only=only)
+
+    watch = Watch([directory], check, watcher=make_watcher(request.param))
+    assert watch.start() == [directory]
+    assert runs == [None]
+    del runs[:]
+    yield directory, watch, runs
+    watch.close()
+
+
+def test_watch_stash(watched):
+    directory, watch, runs = watched
+    assert watch.reports[directory]["has no stash"][0]
+
+    with open('hello_world/README.rst', 'a') as f:
+        f.write("More.")
+    assert watch.step(timeout=5) == [directory]
+    assert runs == [{"has a readme", "has a license", "has no uncommitted changes"}]
+    assert not watch.reports[directory]["has no uncommitted changes"][0]
+
+    sha = subprocess.check_output(["git", "stash", "create"], cwd="hello_world").strip()
+    watch.step(timeout=0.5)  # git stash create refreshes the index
+    del runs[:]
+
+    subprocess.call(["git", "stash", "store", "-m", "Later.", sha],
+                    cwd="hello_world")
+    assert watch.step(timeout=5) == [directory]
+    assert runs == [{"has no stash", "has every branch on a remote"}]
+    assert not watch.reports[directory]["has no stash"][0]
+    assert watch.reports[directory]["has a readme"][0]
+
+
+def test_watch_index(watched):
+    directory, watch, runs = watched
+
+    with open('hello_world/LICENSE.txt', 'w') as f:
+        f.write("insert MIT license text here")
+    assert watch.step(timeout=5) == [directory]
+    assert not watch.reports[directory]["has no uncommitted changes"][0]
+    del runs[:]
+
+    subprocess.call(["git", "add", "LICENSE.txt"],
+                    cwd="hello_world")
+    subprocess.call(["git", "commit", "-m", "License it."],
+                    cwd="hello_world")
+    watch.step(timeout=5)
+    assert "has a license" not in set().union(*runs)
+    assert watch.reports[directory]["has no uncommitted changes"][0]
+    assert watch.reports[directory]["has a license"][0]
+
+    assert watch.step(timeout=0.2) == []
+
+
+def test_watch_reports_broken_repositories(tmpdir):
+    directory = make_project(tmpdir)
+    tmpdir.mkdir("broken").join(".git").write("garbage")
+    broken = str(tmpdir.join("broken"))
+    watch = Watch([broken, directory], lambda project, only: check_project(project, [], False, only=only),
+                  watcher=PollingWatcher(interval=0.01))
+    try:
+        assert watch.start() == [broken, directory]
+        assert not watch.reports[broken]["is a git repository"][0]
+        assert "has no stash" in watch.reports[directory]
+    finally:
+        watch.close()
+
+
+def test_inotify_falls_back_to_polling(tmpdir):
+    watcher = make_watcher("inotify")
+
+    class OutOfWatches(object):
+        def inotify_add_watch(self, fd, path, mask):
+            ctypes.set_errno(errno.ENOSPC)
+            return -1
+
+    watcher.libc = OutOfWatches()
+    watcher.interval = 0.01
+    try:
+        watcher.watch("project", str(tmpdir), WORK_TREE)
+        assert watcher.changes(timeout=0.05) == []
+        tmpdir.join("README").write("Saluton, Mundo!")
+        assert watcher.changes(timeout=5) == [("project", WORK_TREE, "README")]
+    finally:
+        watcher.close()
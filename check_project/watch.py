@@ -0,0 +1,321 @@
+"""Keep checking projects as they change.
+
+A Watch checks every project once, then waits for something in a
+project's git directory or at the top of its working tree to change, and
+re-runs just the checks that need facts about the project that might have
+changed: a new stash only re-runs the stash check, a rewritten index only
+the uncommitted changes check, and so on.
+
+Changes are noticed with inotify on Linux, and by looking at the files
+every so often everywhere else.  Only the top of the working tree is
+watched, so an edit further down is noticed the next time git touches
+the index (or, when polling, the next time a file is added to or removed
+from a directory at the top).
+"""
+import collections
+import ctypes
+import ctypes.util
+import errno
+import fnmatch
+import os
+import select
+import struct
+import subprocess
+import time
+from check_project.checks import checks_needing, CHECKS
+from check_project.gitdir import find_git_dir, UnreadableGitDir
+from check_project.gitproject import GitProject, GitProjectException
+from check_project.report import CheckId, CheckResult, Report
+
+__author__ = 'wolf'
+
+GIT_DIR = "git dir"
+WORK_TREE = "work tree"
+
+# Which facts (see checks.py) might be different when something changes,
+# by where it changed.  A change can match more than one pattern.
+GIT_DIR_TRIGGERS = [
+    ("index", ["uncommitted_changes"]),
+    ("HEAD", ["uncommitted_changes"]),
+    ("refs/stash", ["refs", "has_stash"]),
+    ("refs/heads/*", ["refs", "unpushed_commits"]),
+    ("refs/remotes/*", ["refs", "unpushed_commits"]),
+    ("packed-refs", ["refs", "has_stash", "unpushed_commits"]),
+    ("config", ["remotes", "remote_urls"]),
+]
+
+WORK_TREE_TRIGGERS = [
+    ("*", ["listing", "uncommitted_changes"]),
+]
+
+
+def facts_changed(where, name):
+    """Return the set of facts that might be different when name, in the GIT_DIR or the WORK_TREE, changes.
+
+    name is relative to where, with / between directories.
+    """
+    if name.endswith(".lock") or (where == WORK_TREE and name == ".git"):
+        return set()  # git's own comings and goings
+    triggers = GIT_DIR_TRIGGERS if where == GIT_DIR else WORK_TREE_TRIGGERS
+    return set(fact
+               for pattern, facts in triggers if fnmatch.fnmatchcase(name, pattern)
+               for fact in facts)
+
+
+def checks_for_change(where, name):
+    """Return the set of checks to re-run when name, in the GIT_DIR or the WORK_TREE, changes.
+
+    A name of None means we lost track of what changed, so everything is
+    re-run.
+    """
+    if name is None:
+        return set(check.category for check in CHECKS)
+    return checks_needing(facts_changed(where, name))
+
+
+def directories_to_watch(path):
+    """Return (directory, where, prefix, recursive) for everything to watch for the project at path.
+
+    Changes in directory are reported relative to where, with prefix in
+    front.  For a linked worktree, the refs, packed-refs and config are in
+    the common directory, not the worktree's own git directory.
+    """
+    watched = [(path, WORK_TREE, "", False)]
+    try:
+        git_dir = find_git_dir(path)
+    except (IOError, OSError, UnreadableGitDir):
+        git_dir = None
+    if git_dir is None:
+        return watched
+    watched.append((git_dir.git_dir, GIT_DIR, "", False))
+    if git_dir.common_dir != git_dir.git_dir:
+        watched.append((git_dir.common_dir, GIT_DIR, "", False))
+    watched.append((os.path.join(git_dir.common_dir, "refs"), GIT_DIR, "refs/", True))
+    return watched
+
+
+class PollingWatcher(object):
+    """Find changes by looking at every watched directory every interval seconds."""
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.watched = []
+        self.listings = []
+
+    def watch(self, key, directory, where, prefix="", recursive=False):
+        self.watched.append((key, directory, where, prefix, recursive))
+        self.listings.append(list_directory(directory, recursive))
+
+    def changes(self, timeout=None):
+        """Wait up to timeout seconds (forever if None) for changes, and return them as (key, where, name)."""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            found = []
+            for n, (key, directory, where, prefix, recursive) in enumerate(self.watched):
+                listing = list_directory(directory, recursive)
+                previous, self.listings[n] = self.listings[n], listing
+                for name in set(previous) | set(listing):
+                    if previous.get(name) != listing.get(name):
+                        found.append((key, where, prefix + name))
+            if found:
+                return found
+            if deadline is not None and time.time() + self.interval > deadline:
+                return found
+            time.sleep(self.interval)
+
+    def close(self):
+        pass
+
+
+def list_directory(directory, recursive=False, relative=""):
+    """Return {name: (inode, size, mtime)} for directory's entries, and their entries if recursive."""
+    listing = {}
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return listing
+    for entry in entries:
+        name = relative + entry.name
+        try:
+            stat = entry.stat(follow_symlinks=False)
+        except OSError:
+            continue
+        listing[name] = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if recursive and entry.is_dir(follow_symlinks=False):
+            listing.update(list_directory(entry.path, True, name + "/"))
+    return listing
+
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyWatcher(object):
+    """Find changes with Linux's inotify, through ctypes.
+
+    Raises OSError if inotify isn't available.  Changes are gathered for
+    settle seconds after the first one, since git changes several files
+    at once.  A directory inotify won't watch, say because there are
+    already max_user_watches, is looked at every interval seconds instead,
+    as PollingWatcher does.
+    """
+
+    def __init__(self, settle=0.05, interval=1.0):
+        self.settle = settle
+        self.interval = interval
+        self.polling = None
+        name = ctypes.util.find_library("c")
+        if name is None:
+            raise OSError(errno.ENOSYS, "Can't find the C library.")
+        self.libc = ctypes.CDLL(name, use_errno=True)
+        if not hasattr(self.libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "This system doesn't have inotify.")
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed.")
+        self.watches = {}  # watch descriptor to (key, directory, where, prefix, recursive)
+
+    def watch(self, key, directory, where, prefix="", recursive=False):
+        descriptor = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if descriptor < 0:
+            if ctypes.get_errno() in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                return  # not there (yet), or not ours to look at
+            if self.polling is None:
+                self.polling = PollingWatcher(self.interval)
+            self.polling.watch(key, directory, where, prefix, recursive)
+            return
+        self.watches[descriptor] = (key, directory, where, prefix, recursive)
+        if recursive:
+            for entry in list(os.scandir(directory)):
+                if entry.is_dir(follow_symlinks=False):
+                    self.watch(key, entry.path, where, prefix + entry.name + "/", True)
+
+    def changes(self, timeout=None):
+        """Wait up to timeout seconds (forever if None) for changes, and return them as (key, where, name)."""
+        if self.polling is None:
+            return self.inotify_changes(timeout)
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            found = self.polling.changes(0)
+            wait = self.interval if deadline is None else max(0.0, min(self.interval, deadline - time.time()))
+            found.extend(self.inotify_changes(wait))
+            if found or (deadline is not None and time.time() >= deadline):
+                return found
+
+    def inotify_changes(self, timeout):
+        found = []
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        while readable:
+            found.extend(self.read_events())
+            readable, _, _ = select.select([self.fd], [], [], self.settle)
+        return found
+
+    def read_events(self):
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+        found = []
+        offset = 0
+        while offset < len(data):
+            descriptor, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                found.extend((key, where, None) for key, _, where, _, _ in self.watches.values())
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(descriptor, None)
+                continue
+            if descriptor not in self.watches:
+                continue
+            key, directory, where, prefix, recursive = self.watches[descriptor]
+            if recursive and mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                self.watch(key, os.path.join(directory, name), where, prefix + name + "/", True)
+            found.append((key, where, prefix + name))
+        return found
+
+    def close(self):
+        os.close(self.fd)
+
+
+def make_watcher(interval=1.0):
+    """Return an InotifyWatcher if we can, or else a PollingWatcher checking every interval seconds."""
+    try:
+        return InotifyWatcher(interval=interval)
+    except (OSError, AttributeError):
+        return PollingWatcher(interval)
+
+
+class Watch(object):
+    """Keep a report for each project up to date, re-running only the checks whose inputs change.
+
+    check(project, only) runs the checks in only (all of them if None) on
+    a project and returns the report.  The projects are made once, with
+    project_class, and kept for as long as the Watch is.
+    """
+
+    def __init__(self, directories, check, project_class=GitProject, watcher=None):
+        self.directories = [os.path.abspath(os.path.expanduser(directory)) for directory in directories]
+        self.check = check
+        self.project_class = project_class
+        self.watcher = watcher or make_watcher()
+        self.projects = {}
+        self.reports = collections.OrderedDict()
+
+    def start(self):
+        """Check every project, start watching them, and return the directories checked."""
+        for directory in self.directories:
+            try:
+                project = self.project_class(directory)
+            except (GitProjectException, subprocess.CalledProcessError) as e:
+                self.reports[directory] = Report([(CheckId.IS_A_GIT_REPOSITORY, CheckResult(False, str(e)))])
+                continue
+            try:
+                report = self.check(project, None)
+            except subprocess.CalledProcessError as e:
+                # Git won't work here at all, so there's nothing worth watching.
+                project.close()
+                self.reports[directory] = Report([(CheckId.IS_A_GIT_REPOSITORY, CheckResult(False, str(e)))])
+                continue
+            self.projects[directory] = project
+            for watched, where, prefix, recursive in directories_to_watch(directory):
+                self.watcher.watch(directory, watched, where, prefix, recursive)
+            self.reports[directory] = report
+        return list(self.reports)
+
+    def step(self, timeout=None):
+        """Wait for changes, re-run the checks they affect, and return the directories whose reports changed."""
+        rerun = collections.OrderedDict()
+        for directory, where, name in self.watcher.changes(timeout):
+            rerun.setdefault(directory, set()).update(checks_for_change(where, name))
+
+        changed = []
+        for directory, categories in rerun.items():
+            if not categories:
+                continue
+            report = Report(self.reports[directory])
+            for category in categories:
+                report.pop(category, None)
+            report.update(self.check(self.projects[directory], categories))
+            if report != self.reports[directory]:
+                self.reports[directory] = report
+                changed.append(directory)
+        return changed
+
+    def close(self):
+        self.watcher.close()
+        for project in self.projects.values():
+            project.close()
@@ -1,4 +1,4 @@
-from distutils.core import setup
+from setuptools import setup
 
 from setuptools.command.test import test as TestCommand
 import sys
@@ -34,6 +34,7 @@ setup(
     description='Check project directories for uncommitted or unpushed work and for files like README and LICENSE.',
     long_description=open('README.rst').read(),
     install_requires=[],
+    python_requires='>=3.8',
     entry_points={
         'console_scripts': ['check_project = check_project.cli:main']
     },
@@ -41,9 +42,13 @@ setup(
     classifiers=[
         'Development Status :: 3 - Alpha',
         'License :: OSI Approved :: GNU General Public License v2 (GPLv2)',
-        'Programming Language :: Python :: 2',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
+        'Programming Language :: Python :: 3.12',
         'Environment :: Console',
         'Intended Audience :: Developers',
     ],